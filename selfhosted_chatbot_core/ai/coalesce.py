@@ -0,0 +1,266 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils.rate_limit import TokenBucket
+
+class UpstreamBusy(Exception):
+    """Không lấy được lượt gọi upstream trong thời gian chờ cho phép."""
+
+class _Flight:
+    __slots__ = ("event", "result", "error", "followers")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+class SingleFlight:
+    """Gộp các lời gọi trùng key đang chạy: chỉ leader gọi upstream, follower nhận chung kết quả."""
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def begin(self, key: str) -> Tuple[bool, _Flight]:
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self.coalesced += 1
+                return False, flight
+            flight = self._flights[key] = _Flight()
+            self.leaders += 1
+            return True, flight
+
+    def finish(self, key: str, flight: _Flight, result: Any, error: Optional[BaseException] = None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.result = result
+        flight.error = error
+        flight.event.set()
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        leader, flight = self.begin(key)
+        if leader:
+            result, error = None, None
+            try:
+                result = fn()
+                return result
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                self.finish(key, flight, result, error)
+        # Leader xong → follower nhận đúng kết quả/lỗi của leader (kể cả fallback), không gọi lại upstream;
+        # chỉ tự gọi khi chờ quá lâu
+        if flight.event.wait(timeout):
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        return fn()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"inflight_keys": len(self._flights), "leaders": self.leaders, "coalesced": self.coalesced}
+
+class AsyncSingleFlight:
+    """Bản asyncio của SingleFlight (dùng trong một event loop)."""
+
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, coro_fn: Callable[[], Any]) -> Any:
+        fut = self._flights.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fut)
+        fut = self._flights[key] = asyncio.get_running_loop().create_future()
+        self.leaders += 1
+        try:
+            result = await coro_fn()
+            fut.set_result(result)
+            return result
+        except BaseException as e:
+            fut.set_exception(e)
+            # Tránh cảnh báo "exception was never retrieved" khi không có follower
+            fut.exception()
+            raise
+        finally:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"inflight_keys": len(self._flights), "leaders": self.leaders, "coalesced": self.coalesced}
+
+class UpstreamLimiter:
+    """Giới hạn số lời gọi AI đồng thời + token bucket theo hạn mức (quota) của Gemini.
+
+    Chờ quá `max_wait` giây → UpstreamBusy, thay vì dồn thêm request để rồi nhận 429.
+    """
+
+    def __init__(self, max_concurrency: int = 4, rate_per_minute: float = 60, burst: float = 10,
+                 max_wait: float = 20.0):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_wait = max_wait
+        self.bucket = TokenBucket(rate_per_minute / 60.0, max(1.0, burst))
+        self._sem = threading.BoundedSemaphore(self.max_concurrency)
+        self._asem: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.inflight = 0
+        self.max_waiting = 0
+        self.rejected = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._recent_waits = deque(maxlen=512)
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "UpstreamLimiter":
+        return cls(
+            max_concurrency=int(cfg.get("max_concurrency", 4)),
+            rate_per_minute=float(cfg.get("rate_per_minute", 60)),
+            burst=float(cfg.get("burst", 10)),
+            max_wait=float(cfg.get("max_wait_seconds", 20)),
+        )
+
+    def _enter_wait(self):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def _leave_wait(self, waited: float, ok: bool):
+        with self._lock:
+            self.waiting -= 1
+            if ok:
+                self.inflight += 1
+                self.wait_count += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+                self._recent_waits.append(waited)
+            else:
+                self.rejected += 1
+
+    def _done(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def run(self, fn: Callable[[], Any], max_wait: Optional[float] = None) -> Any:
+        with self.hold(max_wait):
+            return fn()
+
+    def hold(self, max_wait: Optional[float] = None):
+        """Context manager giữ một lượt gọi (dùng cho stream, nơi fn() là cả vòng lặp đọc).
+
+        `max_wait` (nếu có) chỉ được rút ngắn hơn cấu hình, ví dụ theo deadline của request.
+        """
+        return _Hold(self, self.max_wait if max_wait is None else min(max_wait, self.max_wait))
+
+    async def arun(self, coro_fn: Callable[[], Any], max_wait: Optional[float] = None) -> Any:
+        if self._asem is None:
+            self._asem = asyncio.Semaphore(self.max_concurrency)
+        max_wait = self.max_wait if max_wait is None else min(max_wait, self.max_wait)
+        t0 = time.monotonic()
+        self._enter_wait()
+        ok = False
+        try:
+            delay = self.bucket.reserve(max_wait=max_wait)
+            if delay is not None:
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                try:
+                    await asyncio.wait_for(self._asem.acquire(),
+                                           max(0.0, max_wait - (time.monotonic() - t0)))
+                    ok = True
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._leave_wait(time.monotonic() - t0, ok)
+        if not ok:
+            raise UpstreamBusy("AI đang quá tải, vui lòng thử lại sau")
+        try:
+            return await coro_fn()
+        finally:
+            self._asem.release()
+            self._done()
+
+    # --- lượt thêm cho bản hedge: không chờ; hết slot đồng thời hoặc hết token → không hedge ---
+    def try_extra(self) -> bool:
+        if not self._sem.acquire(blocking=False):
+            return False
+        if not self.bucket.try_acquire():
+            self._sem.release()
+            return False
+        with self._lock:
+            self.inflight += 1
+        return True
+
+    def release_extra(self):
+        self._sem.release()
+        self._done()
+
+    async def atry_extra(self) -> bool:
+        sem = self._asem
+        if sem is None or sem.locked():
+            return False
+        await sem.acquire()  # còn chỗ → trả về ngay, không nhường event loop
+        if not self.bucket.try_acquire():
+            sem.release()
+            return False
+        with self._lock:
+            self.inflight += 1
+        return True
+
+    def arelease_extra(self):
+        self._asem.release()
+        self._done()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = sorted(self._recent_waits)
+            p95 = recent[max(0, math.ceil(len(recent) * 0.95) - 1)] if recent else 0.0  # nearest-rank
+            return {
+                "queue_depth": self.waiting,
+                "max_queue_depth": self.max_waiting,
+                "inflight": self.inflight,
+                "rejected": self.rejected,
+                "wait_avg_ms": round(self.wait_total / self.wait_count * 1000, 1) if self.wait_count else 0.0,
+                "wait_p95_ms": round(p95 * 1000, 1),
+                "wait_max_ms": round(self.wait_max * 1000, 1),
+            }
+
+class _Hold:
+    def __init__(self, limiter: UpstreamLimiter, max_wait: float):
+        self.limiter = limiter
+        self.max_wait = max_wait
+
+    def __enter__(self):
+        lim = self.limiter
+        t0 = time.monotonic()
+        lim._enter_wait()
+        ok = False
+        try:
+            delay = lim.bucket.reserve(max_wait=self.max_wait)
+            if delay is not None:
+                if delay > 0:
+                    time.sleep(delay)
+                ok = lim._sem.acquire(timeout=max(0.0, self.max_wait - (time.monotonic() - t0)))
+        finally:
+            lim._leave_wait(time.monotonic() - t0, ok)
+        if not ok:
+            raise UpstreamBusy("AI đang quá tải, vui lòng thử lại sau")
+        return self
+
+    def __exit__(self, *exc):
+        self.limiter._sem.release()
+        self.limiter._done()
+        return False
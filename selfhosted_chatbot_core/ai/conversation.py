@@ -0,0 +1,108 @@
+import sys
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Mapping, Optional
+
+USER, MODEL = "user", "model"
+
+# Ước lượng chi phí cố định (byte) của một Turn (__slots__) và của một chat (deque + entry OrderedDict)
+_TURN_OVERHEAD = 64
+_CHAT_OVERHEAD = 700
+
+def estimate_tokens(text: str) -> int:
+    # Tiếng Việt ~3 ký tự/token với tokenizer của Gemini; chỉ cần ước lượng để cắt lịch sử
+    return len(text) // 3 + 1
+
+class Turn:
+    # Lưu UTF-8 bytes: str tiếng Việt có dấu trong CPython tốn 2 byte/ký tự, bytes ~1.1
+    __slots__ = ("role", "data", "tokens")
+
+    def __init__(self, role: str, text: str):
+        self.role = role
+        self.data = text.encode("utf-8")
+        self.tokens = estimate_tokens(text)
+
+    @property
+    def text(self) -> str:
+        return self.data.decode("utf-8")
+
+    def size(self) -> int:
+        return _TURN_OVERHEAD + sys.getsizeof(self.data)
+
+class ConversationStore:
+    """Lịch sử hội thoại theo thread_id cho ngữ cảnh nhiều lượt của AI.
+
+    Mỗi chat là ring buffer `max_turns` lượt; chat ít dùng nhất bị loại khi vượt
+    `max_chats` hoặc tổng bộ nhớ ước lượng vượt `max_bytes`.
+    """
+
+    def __init__(self, max_turns: int = 8, max_chats: int = 50000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_turns = max(2, int(max_turns))
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self._chats: "OrderedDict[str, Deque[Turn]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evicted_chats = 0
+
+    @classmethod
+    def from_config(cls, cfg: Mapping[str, Any]) -> Optional["ConversationStore"]:
+        # Mặc định tắt: câu hỏi có ngữ cảnh bỏ qua cache + single-flight (xem README)
+        if not cfg.get("enabled", False):
+            return None
+        return cls(
+            max_turns=int(cfg.get("max_turns", 8)),
+            max_chats=int(cfg.get("max_chats", 50000)),
+            max_bytes=int(float(cfg.get("max_mb", 64)) * 1024 * 1024),
+        )
+
+    def add_exchange(self, thread_id: str, user_text: str, reply: str):
+        with self._lock:
+            turns = self._chats.get(thread_id)
+            if turns is None:
+                turns = self._chats[thread_id] = deque(maxlen=self.max_turns)
+                self._bytes += _CHAT_OVERHEAD
+            else:
+                self._chats.move_to_end(thread_id)
+            for turn in (Turn(USER, user_text), Turn(MODEL, reply)):
+                if len(turns) == turns.maxlen:
+                    self._bytes -= turns[0].size()
+                turns.append(turn)
+                self._bytes += turn.size()
+            self._evict()
+
+    def _evict(self):
+        while self._chats and (len(self._chats) > self.max_chats or self._bytes > self.max_bytes):
+            _, turns = self._chats.popitem(last=False)
+            self._bytes -= _CHAT_OVERHEAD + sum(t.size() for t in turns)
+            self.evicted_chats += 1
+
+    def history(self, thread_id: str, token_budget: int) -> List[Dict[str, Any]]:
+        """Các lượt gần nhất vừa `token_budget`, ở dạng `contents` của Gemini (cũ → mới)."""
+        with self._lock:
+            turns = self._chats.get(thread_id)
+            if not turns:
+                return []
+            self._chats.move_to_end(thread_id)
+            picked: List[Turn] = []
+            used = 0
+            for turn in reversed(turns):
+                if used + turn.tokens > token_budget:
+                    break
+                picked.append(turn)
+                used += turn.tokens
+        picked.reverse()
+        # Gemini yêu cầu lịch sử bắt đầu bằng lượt của user
+        while picked and picked[0].role != USER:
+            picked.pop(0)
+        return [{"role": t.role, "parts": [{"text": t.text}]} for t in picked]
+
+    def forget(self, thread_id: str):
+        with self._lock:
+            turns = self._chats.pop(thread_id, None)
+            if turns is not None:
+                self._bytes -= _CHAT_OVERHEAD + sum(t.size() for t in turns)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"chats": len(self._chats), "approx_bytes": self._bytes, "evicted_chats": self.evicted_chats}
@@ -0,0 +1,253 @@
+import time
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional
+
+from .coalesce import AsyncSingleFlight, SingleFlight, UpstreamBusy, UpstreamLimiter
+from .gemini_client import GeminiClient, agenerate, error_reply, get_client, is_error_reply
+from .resilience import CircuitBreaker, DeadlineExceeded, ResilientCaller
+from .response_cache import ResponseCache
+
+class AnswerStream:
+    """Các đoạn câu trả lời của answer_stream; `complete` = True khi đã nhận đủ câu trả lời
+    (không đứt giữa chừng vì lỗi upstream) — chỉ khi đó mới nên lưu vào ngữ cảnh hội thoại."""
+
+    def __init__(self, gen_fn: Callable[["AnswerStream"], Iterator[str]]):
+        self.complete = False
+        self._gen = gen_fn(self)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        return next(self._gen)
+
+    def close(self):
+        self._gen.close()
+
+class AIGateway:
+    """Điểm vào duy nhất của bot tới AI.
+
+    Thứ tự: cache câu trả lời → gộp câu hỏi trùng đang chờ (single-flight)
+    → circuit breaker → giới hạn đồng thời + token bucket theo quota
+    → deadline/hedging → GeminiClient.
+    `cfg` là dict do bot.get_ai_config() trả về (api_url, model, api_key, system_prompt...).
+    Khi breaker mở hoặc hết deadline, trả `fallback` ngay (nếu có) thay vì chuỗi lỗi.
+    `history` (ngữ cảnh hội thoại) khác nhau theo từng chat → câu hỏi có history
+    đi thẳng tới breaker/limiter, không qua cache và single-flight.
+    """
+
+    def __init__(self, client: Optional[GeminiClient] = None, cache: Optional[ResponseCache] = None,
+                 limiter: Optional[UpstreamLimiter] = None, resilience: Optional[ResilientCaller] = None,
+                 deadline: float = 20.0):
+        self.client = client or get_client()
+        self.cache = cache
+        self.limiter = limiter or UpstreamLimiter()
+        self.resilience = resilience or ResilientCaller(slots=self.limiter)
+        self.breaker: CircuitBreaker = self.resilience.breaker
+        self.deadline = deadline
+        self.flights = SingleFlight()
+        self.aflights = AsyncSingleFlight()
+        # Follower chờ leader tối đa bằng thời gian leader có thể mất
+        self.follower_timeout = deadline + 1.0
+
+    @classmethod
+    def from_settings(cls, ai_settings: Mapping[str, Any], base_dir: str) -> "AIGateway":
+        limiter = UpstreamLimiter.from_config(ai_settings.get("upstream", {}))
+        breaker_cfg = ai_settings.get("breaker", {})
+        hedge_cfg = ai_settings.get("hedge", {})
+        resilience = ResilientCaller(
+            breaker=CircuitBreaker(
+                failure_threshold=int(breaker_cfg.get("failure_threshold", 5)),
+                reset_timeout=float(breaker_cfg.get("reset_seconds", 30)),
+            ),
+            hedge=bool(hedge_cfg.get("enabled", False)),
+            hedge_min_delay=float(hedge_cfg.get("min_delay_seconds", 0.5)),
+            slots=limiter,
+        )
+        return cls(
+            cache=ResponseCache.from_config(ai_settings.get("cache", {}), base_dir),
+            limiter=limiter,
+            resilience=resilience,
+            deadline=float(ai_settings.get("deadline_seconds", 20)),
+        )
+
+    @staticmethod
+    def _key(prompt: str, cfg: Mapping[str, Any]) -> str:
+        return ResponseCache.make_key(prompt, cfg["model"], cfg.get("system_prompt", ""))
+
+    def _cache_get(self, prompt: str, cfg: Mapping[str, Any]) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return self.cache.get(prompt, cfg["model"], cfg.get("system_prompt", ""))
+
+    def _cache_put(self, prompt: str, cfg: Mapping[str, Any], reply: str):
+        # Chuỗi lỗi "(Lỗi gọi Gemini…)" chỉ là placeholder → không bao giờ cache
+        if self.cache is not None and not is_error_reply(reply):
+            self.cache.put(prompt, cfg["model"], cfg.get("system_prompt", ""), reply)
+
+    @staticmethod
+    def _unavailable(fallback: Optional[str], e: Exception) -> str:
+        return fallback if fallback is not None else error_reply(e)
+
+    def answer(self, prompt: str, cfg: Mapping[str, Any], fallback: Optional[str] = None,
+               history: Optional[List[dict]] = None) -> str:
+        if history:
+            return self._upstream(prompt, cfg, fallback, history)
+        cached = self._cache_get(prompt, cfg)
+        if cached is not None:
+            return cached
+        return self.flights.do(self._key(prompt, cfg), lambda: self._upstream(prompt, cfg, fallback),
+                               timeout=self.follower_timeout)
+
+    def _upstream(self, prompt: str, cfg: Mapping[str, Any], fallback: Optional[str],
+                  history: Optional[List[dict]] = None) -> str:
+        if not self.breaker.allow():
+            return self._unavailable(fallback, RuntimeError("circuit breaker đang mở"))
+        deadline = time.monotonic() + self.deadline
+        recorded = False  # resilience đã ghi success/failure cho breaker
+        try:
+            reply = self.limiter.run(
+                lambda: self.resilience.call(
+                    lambda timeout: self.client.generate(prompt, cfg["api_url"], cfg["model"], cfg["api_key"],
+                                                         cfg.get("system_prompt", ""), timeout=timeout,
+                                                         history=history),
+                    deadline),
+                max_wait=self.deadline)
+            recorded = True
+        except UpstreamBusy as e:
+            return error_reply(e)
+        except DeadlineExceeded as e:
+            recorded = True
+            return self._unavailable(fallback, e)
+        finally:
+            if not recorded:
+                # Không có kết quả (limiter từ chối, bị ngắt giữa chừng) → trả lượt thử half-open
+                self.breaker.abandon()
+        if not history:
+            self._cache_put(prompt, cfg, reply)
+        return reply
+
+    def answer_stream(self, prompt: str, cfg: Mapping[str, Any], fallback: Optional[str] = None,
+                      history: Optional[List[dict]] = None) -> AnswerStream:
+        return AnswerStream(lambda out: self._stream(out, prompt, cfg, fallback, history))
+
+    def _stream(self, out: AnswerStream, prompt: str, cfg: Mapping[str, Any], fallback: Optional[str],
+                history: Optional[List[dict]]) -> Iterator[str]:
+        if not history:
+            cached = self._cache_get(prompt, cfg)
+            if cached is not None:
+                out.complete = True
+                yield cached
+                return
+            key = self._key(prompt, cfg)
+            leader, flight = self.flights.begin(key)
+        else:
+            key, leader, flight = None, False, None
+        if flight is not None and not leader:
+            # Câu hỏi trùng đang được stream cho người khác → nhận nguyên câu trả lời khi xong
+            if flight.event.wait(self.follower_timeout) and flight.result is not None:
+                out.complete = True
+                yield flight.result
+                return
+        result = None
+        try:
+            if not self.breaker.allow():
+                result = self._unavailable(fallback, RuntimeError("circuit breaker đang mở"))
+                yield result
+                return
+            deadline = time.monotonic() + self.deadline
+            parts = []
+            released = False  # đã ghi kết quả / trả lượt cho breaker
+            try:
+                with self.limiter.hold(max_wait=self.deadline):
+                    # timeout: thời hạn chờ đoạn đầu tiên / giữa hai đoạn; deadline: hạn cho cả stream
+                    # (không hedge: đoạn đầu đã hiện cho người dùng thì không đổi sang bản khác được)
+                    for chunk in self.client.stream(prompt, cfg["api_url"], cfg["model"], cfg["api_key"],
+                                                    cfg.get("system_prompt", ""), raise_errors=True,
+                                                    timeout=max(1.0, deadline - time.monotonic()),
+                                                    history=history, deadline=deadline):
+                        parts.append(chunk)
+                        yield chunk
+                released = True
+                self.breaker.record_success()
+            except UpstreamBusy as e:
+                released = True
+                self.breaker.abandon()
+                result = error_reply(e)
+                yield result
+                return
+            except Exception as e:
+                released = True
+                # Câu trả lời dở dang không được cache
+                if parts:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+                    result = self._unavailable(fallback, e)
+                    yield result
+                return
+            finally:
+                if not released:
+                    # Người đọc bỏ dở stream (GeneratorExit) hoặc bị ngắt → không có kết quả, trả lượt thử half-open
+                    self.breaker.abandon()
+            result = "".join(parts)
+            out.complete = True
+            if not history:
+                self._cache_put(prompt, cfg, result)
+        finally:
+            if leader:
+                self.flights.finish(key, flight, result)
+
+    async def aanswer(self, prompt: str, cfg: Mapping[str, Any], http, fallback: Optional[str] = None,
+                      history: Optional[List[dict]] = None) -> str:
+        if history:
+            return await self._aupstream(prompt, cfg, http, fallback, history)
+        cached = self._cache_get(prompt, cfg)
+        if cached is not None:
+            return cached
+        return await self.aflights.do(self._key(prompt, cfg), lambda: self._aupstream(prompt, cfg, http, fallback))
+
+    async def _aupstream(self, prompt: str, cfg: Mapping[str, Any], http, fallback: Optional[str],
+                         history: Optional[List[dict]] = None) -> str:
+        if not self.breaker.allow():
+            return self._unavailable(fallback, RuntimeError("circuit breaker đang mở"))
+        deadline = time.monotonic() + self.deadline
+        recorded = False
+        try:
+            reply = await self.limiter.arun(
+                lambda: self.resilience.acall(
+                    lambda timeout: agenerate(prompt, cfg["api_url"], cfg["model"], cfg["api_key"],
+                                              cfg.get("system_prompt", ""), http=http, timeout=timeout,
+                                              history=history),
+                    deadline),
+                max_wait=self.deadline)
+            recorded = True
+        except UpstreamBusy as e:
+            return error_reply(e)
+        except DeadlineExceeded as e:
+            recorded = True
+            return self._unavailable(fallback, e)
+        finally:
+            if not recorded:
+                # CancelledError (client bỏ đi, task bị huỷ) cũng không được để lượt thử half-open treo mãi
+                self.breaker.abandon()
+        if not history:
+            self._cache_put(prompt, cfg, reply)
+        return reply
+
+    def stats(self) -> Dict[str, Any]:
+        sync_f, async_f = self.flights.stats(), self.aflights.stats()
+        return {
+            "cache": self.cache.stats() if self.cache else None,
+            "upstream": self.limiter.stats(),
+            "singleflight": {
+                "inflight_keys": sync_f["inflight_keys"] + async_f["inflight_keys"],
+                "leaders": sync_f["leaders"] + async_f["leaders"],
+                "coalesced": sync_f["coalesced"] + async_f["coalesced"],
+            },
+            "breaker": self.breaker.stats(),
+            "hedge": self.resilience.stats(),
+        }
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
@@ -1,28 +1,161 @@
+import json
+import threading
+import time
+from typing import Iterator, List, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
 
-def generate(prompt: str, api_url: str, model: str, api_key: str, system_prompt: str = "") -> str:
-    """Gọi Gemini generateContent API"""
-    if not (api_url and model and api_key):
-        return "(AI chưa cấu hình đầy đủ: thiếu api_url/model/api_key)"
+NO_REPLY_TEXT = "Xin lỗi, hiện chưa có phản hồi phù hợp."
+NOT_CONFIGURED_TEXT = "(AI chưa cấu hình đầy đủ: thiếu api_url/model/api_key)"
 
-    endpoint = f"{api_url.rstrip('/')}/{model}:generateContent?key={api_key}"
-    body = {
-        "contents": [
+def _endpoint(api_url: str, model: str, api_key: str, method: str = "generateContent") -> str:
+    return f"{api_url.rstrip('/')}/{model}:{method}?key={api_key}"
+
+def _body(prompt: str, system_prompt: str, history: Optional[List[dict]] = None) -> dict:
+    # history: các lượt trước (ai.conversation.ConversationStore.history), cũ → mới
+    return {
+        "contents": list(history or []) + [
             {
                 "role": "user",
                 "parts": [{"text": f"{system_prompt}\n\n{prompt}"}]
             }
         ]
     }
+
+def _extract_text(data: dict) -> str:
+    return (
+        data.get("candidates", [{}])[0]
+            .get("content", {})
+            .get("parts", [{}])[0]
+            .get("text", NO_REPLY_TEXT)
+    )
+
+ERROR_PREFIX = "(Lỗi gọi Gemini"
+
+def error_reply(e: Exception) -> str:
+    return f"{ERROR_PREFIX}: {str(e) or type(e).__name__})"
+
+def is_error_reply(text: str) -> bool:
+    """True nếu `text` là chuỗi lỗi/placeholder mà client trả thay cho câu trả lời thật."""
+    return not text or text.startswith(ERROR_PREFIX) or text in (NOT_CONFIGURED_TEXT, NO_REPLY_TEXT)
+
+def _chunk_text(data: dict) -> str:
+    # Mỗi sự kiện SSE của streamGenerateContent mang phần text mới (delta)
+    parts = (data.get("candidates") or [{}])[0].get("content", {}).get("parts", [])
+    return "".join(p.get("text", "") for p in parts)
+
+class GeminiClient:
+    """Client Gemini giữ một requests.Session (pool keep-alive) dùng chung giữa các thread."""
+
+    def __init__(self, session: Optional[requests.Session] = None, timeout: float = 30, pool_maxsize: int = 20):
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.s = session
+        self.timeout = timeout
+
+    def generate(self, prompt: str, api_url: str, model: str, api_key: str, system_prompt: str = "",
+                 timeout: Optional[float] = None, history: Optional[List[dict]] = None) -> str:
+        """Gọi Gemini generateContent API"""
+        if not (api_url and model and api_key):
+            return NOT_CONFIGURED_TEXT
+        try:
+            r = self.s.post(_endpoint(api_url, model, api_key), json=_body(prompt, system_prompt, history),
+                            timeout=timeout or self.timeout)
+            r.raise_for_status()
+            return _extract_text(r.json())
+        except Exception as e:
+            return error_reply(e)
+
+    def stream(self, prompt: str, api_url: str, model: str, api_key: str, system_prompt: str = "",
+               raise_errors: bool = False, timeout: Optional[float] = None,
+               history: Optional[List[dict]] = None, deadline: Optional[float] = None) -> Iterator[str]:
+        """Gọi streamGenerateContent (SSE), yield từng đoạn text ngay khi tới.
+
+        Lỗi trước khi có đoạn nào → yield chuỗi lỗi như generate(); lỗi giữa chừng → dừng, giữ phần đã nhận.
+        raise_errors=True → ném exception cho bên gọi tự xử lý.
+        `deadline` (time.monotonic()): hạn cho CẢ stream — `timeout` chỉ tính cho từng lần đọc nên upstream
+        nhỏ giọt từng đoạn giữ kết nối mãi; quá hạn thì đóng response và dừng (TimeoutError).
+        """
+        if not (api_url and model and api_key):
+            yield NOT_CONFIGURED_TEXT
+            return
+        got_any = False
+        try:
+            url = _endpoint(api_url, model, api_key, "streamGenerateContent") + "&alt=sse"
+            with self.s.post(url, json=_body(prompt, system_prompt, history), timeout=timeout or self.timeout,
+                         stream=True) as r:
+                r.raise_for_status()
+                # Lần đọc đang chờ lúc hết hạn → cắt socket từ thread hẹn giờ để nó thoát ngay
+                # (urllib3 >= 2.3 có shutdown(); bản cũ chỉ close được, thoát chậm hơn)
+                timer = None
+                if deadline is not None:
+                    timer = threading.Timer(max(0.0, deadline - time.monotonic()),
+                                            getattr(r.raw, "shutdown", r.close))
+                    timer.daemon = True
+                    timer.start()
+                try:
+                    # Tự decode UTF-8: text/event-stream không khai charset thì requests đoán latin-1;
+                    # chunk_size=None: nhận đoạn nào xử lý đoạn đó, không chờ đủ 512 byte
+                    for raw in r.iter_lines(chunk_size=None):
+                        if deadline is not None and time.monotonic() >= deadline:
+                            raise TimeoutError("Gemini stream quá deadline")
+                        line = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+                        if not line.startswith("data:"):
+                            continue
+                        text = _chunk_text(json.loads(line[5:].strip()))
+                        if text:
+                            got_any = True
+                            yield text
+                except Exception as e:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError("Gemini stream quá deadline") from e
+                    raise
+                finally:
+                    if timer is not None:
+                        timer.cancel()
+        except Exception as e:
+            if raise_errors:
+                raise
+            if not got_any:
+                yield error_reply(e)
+            return
+        if not got_any:
+            yield NO_REPLY_TEXT
+
+_default_client: Optional[GeminiClient] = None
+_default_lock = threading.Lock()
+
+def get_client() -> GeminiClient:
+    global _default_client
+    if _default_client is None:
+        with _default_lock:
+            if _default_client is None:
+                _default_client = GeminiClient()
+    return _default_client
+
+def generate(prompt: str, api_url: str, model: str, api_key: str, system_prompt: str = "") -> str:
+    """Gọi Gemini generateContent API (qua client mặc định, tái sử dụng kết nối)"""
+    return get_client().generate(prompt, api_url, model, api_key, system_prompt)
+
+def stream(prompt: str, api_url: str, model: str, api_key: str, system_prompt: str = "") -> Iterator[str]:
+    return get_client().stream(prompt, api_url, model, api_key, system_prompt)
+
+async def agenerate(prompt: str, api_url: str, model: str, api_key: str, system_prompt: str = "",
+                    http=None, timeout: float = 30, history: Optional[List[dict]] = None) -> str:
+    """Bản asyncio của generate(); `http` là utils.async_http.AsyncHTTPClient dùng chung."""
+    if not (api_url and model and api_key):
+        return NOT_CONFIGURED_TEXT
+    if http is None:
+        raise ValueError("agenerate cần một AsyncHTTPClient")
+
     try:
-        r = requests.post(endpoint, json=body, timeout=30)
+        r = await http.post(_endpoint(api_url, model, api_key), json=_body(prompt, system_prompt, history),
+                            timeout=timeout)
         r.raise_for_status()
-        data = r.json()
-        return (
-            data.get("candidates", [{}])[0]
-                .get("content", {})
-                .get("parts", [{}])[0]
-                .get("text", "Xin lỗi, hiện chưa có phản hồi phù hợp.")
-        )
+        return _extract_text(r.json())
     except Exception as e:
-        return f"(Lỗi gọi Gemini: {e})"
+        return error_reply(e)
@@ -0,0 +1,240 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .gemini_client import ERROR_PREFIX, error_reply
+
+class DeadlineExceeded(Exception):
+    """Hết ngân sách thời gian của một lời gọi AI."""
+
+def is_failure(reply: str) -> bool:
+    return reply.startswith(ERROR_PREFIX)
+
+class CircuitBreaker:
+    """closed → (N lỗi liên tiếp) → open → (sau reset_timeout) → half_open → 1 lượt thử → closed/open."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_inflight = False
+        self._lock = threading.Lock()
+        self.opened_count = 0
+        self.short_circuited = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_inflight = False
+            if self.state == self.HALF_OPEN and not self._trial_inflight:
+                self._trial_inflight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def abandon(self):
+        """Lượt được allow() nhưng không gọi upstream (ví dụ bị limiter từ chối)."""
+        with self._lock:
+            self._trial_inflight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_inflight = False
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_inflight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened_count += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "opened_count": self.opened_count,
+                "short_circuited": self.short_circuited,
+            }
+
+class LatencyTracker:
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            data = sorted(self._samples)
+        # nearest-rank: phần tử thứ ceil(q·n) (đánh số từ 1)
+        return data[min(len(data) - 1, max(0, math.ceil(len(data) * q) - 1))]
+
+    def __len__(self):
+        return len(self._samples)
+
+class ResilientCaller:
+    """Deadline cho từng lời gọi + hedged request (gửi bản thứ hai sau độ trễ ~p95) + circuit breaker.
+
+    `fn(timeout)` trả về chuỗi trả lời; chuỗi bắt đầu bằng ERROR_PREFIX được tính là lỗi.
+    """
+
+    def __init__(self, breaker: Optional[CircuitBreaker] = None, hedge: bool = False,
+                 hedge_min_delay: float = 0.5, hedge_min_samples: int = 20, max_workers: int = 32,
+                 slots=None):
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyTracker()
+        # slots: nơi cấp lượt cho bản hedge (UpstreamLimiter: slot đồng thời + token, không chờ) —
+        # bản gốc đã giữ một lượt, bản hedge phải giữ lượt riêng để không vượt max_concurrency
+        self.slots = slots
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-call") if hedge else None
+        self._lock = threading.Lock()
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge or len(self.latency) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latency.percentile(0.95) or 0.0)
+
+    def _hedged(self, fn: Callable[[float], str], timeout: float) -> str:
+        try:
+            return fn(timeout)
+        finally:
+            self.slots.release_extra()
+
+    async def _ahedged(self, coro_fn: Callable[[float], Awaitable[str]], timeout: float) -> str:
+        try:
+            return await coro_fn(timeout)
+        finally:
+            self.slots.arelease_extra()
+
+    def _finish(self, reply: Optional[str], started: float, hedged_win: bool = False):
+        if reply is None:
+            with self._lock:
+                self.deadline_exceeded += 1
+            self.breaker.record_failure()
+            raise DeadlineExceeded("AI không trả lời kịp thời hạn")
+        if is_failure(reply):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+            self.latency.add(time.monotonic() - started)
+            if hedged_win:
+                with self._lock:
+                    self.hedge_wins += 1
+        return reply
+
+    def call(self, fn: Callable[[float], str], deadline: float) -> str:
+        started = time.monotonic()
+        remaining = deadline - started
+        if remaining <= 0:
+            return self._finish(None, started)
+        delay = self.hedge_delay()
+        if delay is None or delay >= remaining:
+            try:
+                reply = fn(remaining)
+            except Exception as e:
+                reply = error_reply(e)
+            if time.monotonic() > deadline and is_failure(reply):
+                reply = None
+            return self._finish(reply, started)
+
+        primary = self._pool.submit(fn, remaining)
+        done, _ = wait([primary], timeout=delay)
+        futures = [primary]
+        if not done and (self.slots is None or self.slots.try_extra()):
+            with self._lock:
+                self.hedges_sent += 1
+            futures.append(self._pool.submit(fn if self.slots is None else partial(self._hedged, fn),
+                                             max(0.0, deadline - time.monotonic())))
+        last = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for f in done:
+                try:
+                    reply = f.result()
+                except Exception as e:
+                    reply = error_reply(e)
+                if not is_failure(reply):
+                    return self._finish(reply, started, hedged_win=f is not primary)
+                last = reply
+        return self._finish(last, started)
+
+    async def acall(self, coro_fn: Callable[[float], Awaitable[str]], deadline: float) -> str:
+        started = time.monotonic()
+        remaining = deadline - started
+        if remaining <= 0:
+            return self._finish(None, started)
+        primary = asyncio.ensure_future(coro_fn(remaining))
+        tasks = [primary]
+        # Bị huỷ ở bất kỳ await nào (kể cả lúc chờ hedge) → huỷ mọi task con; breaker do bên gọi trả lượt
+        try:
+            delay = self.hedge_delay()
+            if delay is not None and delay < remaining:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and (self.slots is None or await self.slots.atry_extra()):
+                    with self._lock:
+                        self.hedges_sent += 1
+                    timeout = max(0.0, deadline - time.monotonic())
+                    tasks.append(asyncio.ensure_future(
+                        coro_fn(timeout) if self.slots is None else self._ahedged(coro_fn, timeout)))
+            last = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for t in done:
+                    try:
+                        reply = t.result()
+                    except Exception as e:
+                        reply = error_reply(e)
+                    if not is_failure(reply):
+                        return self._finish(reply, started, hedged_win=t is not primary)
+                    last = reply
+        finally:
+            for t in tasks:
+                t.cancel()  # task đã xong → no-op
+        return self._finish(last, started)
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency.percentile(0.95)
+        with self._lock:
+            return {
+                "hedging": self.hedge,
+                "hedges_sent": self.hedges_sent,
+                "hedge_wins": self.hedge_wins,
+                "hedge_win_rate": round(self.hedge_wins / self.hedges_sent, 3) if self.hedges_sent else 0.0,
+                "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "deadline_exceeded": self.deadline_exceeded,
+            }
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.textnorm import normalize
+
+# Chi phí ước lượng mỗi entry ngoài phần text (key, tuple, node OrderedDict)
+_ENTRY_OVERHEAD = 200
+
+class ResponseCache:
+    """Cache câu trả lời AI theo (prompt đã chuẩn hoá, model, system_prompt).
+
+    Loại bỏ theo LRU, TTL và giới hạn bộ nhớ; có thể lưu ra đĩa để giữ qua lần khởi động lại.
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: float = 86400, max_bytes: int = 16 * 1024 * 1024,
+                 persist_path: Optional[str] = None, persist_interval: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.max_bytes = max_bytes
+        self.persist_path = persist_path
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stop = threading.Event()
+        self._thr = None
+        if persist_path:
+            self._load()
+            self._thr = threading.Thread(target=self._persist_loop, args=(persist_interval,),
+                                         name="ai-cache-persist", daemon=True)
+            self._thr.start()
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any], base_dir: str) -> Optional["ResponseCache"]:
+        if not cfg.get("enabled", True):
+            return None
+        path = cfg.get("persist_path") or None
+        if path and not os.path.isabs(path):
+            path = os.path.join(base_dir, path)
+        return cls(
+            max_entries=int(cfg.get("max_entries", 5000)),
+            ttl_seconds=float(cfg.get("ttl_seconds", 86400)),
+            max_bytes=int(float(cfg.get("max_mb", 16)) * 1024 * 1024),
+            persist_path=path,
+        )
+
+    @staticmethod
+    def make_key(prompt: str, model: str, system_prompt: str) -> str:
+        raw = f"{model}\x00{system_prompt}\x00{normalize(prompt)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _cost(reply: str) -> int:
+        return len(reply.encode("utf-8")) + _ENTRY_OVERHEAD
+
+    def get(self, prompt: str, model: str, system_prompt: str) -> Optional[str]:
+        key = self.make_key(prompt, model, system_prompt)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, reply = item
+            if expires <= time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return reply
+
+    def put(self, prompt: str, model: str, system_prompt: str, reply: str):
+        cost = self._cost(reply)
+        if cost > self.max_bytes:
+            return
+        key = self.make_key(prompt, model, system_prompt)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.time() + self.ttl, reply)
+            self._bytes += cost
+            self._dirty = True
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        _, reply = self._data.pop(key)
+        self._bytes -= self._cost(reply)
+        self._dirty = True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+    # --- Lưu/đọc đĩa ---
+    def _load(self):
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+            entries = doc.get("entries", []) if isinstance(doc, dict) else []
+        except (OSError, ValueError):
+            return
+        if not isinstance(entries, list):
+            return
+        now = time.time()
+        with self._lock:
+            for entry in entries:
+                # File hỏng/sửa tay: bỏ qua từng mục sai dạng, không làm bot không khởi động được
+                try:
+                    key, expires, reply = entry
+                    if not isinstance(key, str) or not isinstance(reply, str) or float(expires) <= now:
+                        continue
+                except (TypeError, ValueError):
+                    continue
+                if key in self._data:
+                    self._remove(key)
+                self._data[key] = (float(expires), reply)
+                self._bytes += self._cost(reply)
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+            self._dirty = False
+
+    def save(self):
+        if not self.persist_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            now = time.time()
+            entries = [[k, exp, reply] for k, (exp, reply) in self._data.items() if exp > now]
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.persist_path) or ".", exist_ok=True)
+        tmp = f"{self.persist_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"v": 1, "entries": entries}, f, ensure_ascii=False)
+        os.replace(tmp, self.persist_path)
+
+    def _persist_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.save()
+            except OSError:
+                pass
+
+    def close(self):
+        self._stop.set()
+        self.save()
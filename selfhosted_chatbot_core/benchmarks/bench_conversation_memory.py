@@ -0,0 +1,65 @@
+"""Đo bộ nhớ của ai.conversation.ConversationStore cho 100k chat, so với cách lưu ngây thơ
+(dict thread_id → list các dict {"role", "parts": [{"text"}]} không giới hạn).
+
+Chạy từ thư mục gốc dự án:  python benchmarks/bench_conversation_memory.py [số_chat] [số_lượt_mỗi_chat]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.conversation import ConversationStore  # noqa: E402
+
+QUESTION = "Cho mình hỏi shop có giao hàng tới Đà Nẵng không, phí bao nhiêu vậy ạ? #{}"
+ANSWER = "Dạ có ạ, shop giao toàn quốc; phí ship tới Đà Nẵng khoảng 30.000đ, 2-3 ngày nhận hàng. #{}"
+
+def _fill_naive(chats: int, exchanges: int):
+    store = {}
+    for c in range(chats):
+        turns = store.setdefault(str(c), [])
+        for i in range(exchanges):
+            turns.append({"role": "user", "parts": [{"text": QUESTION.format(i)}]})
+            turns.append({"role": "model", "parts": [{"text": ANSWER.format(i)}]})
+    return store
+
+def _fill_store(chats: int, exchanges: int, **kw):
+    store = ConversationStore(max_chats=chats, max_bytes=1 << 40, **kw)
+    for c in range(chats):
+        for i in range(exchanges):
+            store.add_exchange(str(c), QUESTION.format(i), ANSWER.format(i))
+    return store
+
+def _measure(label, fn, chats):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = fn()
+    elapsed = time.perf_counter() - t0
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<36} {current / 1024 / 1024:8.1f} MB  {current / chats:7.0f} B/chat  ({elapsed:.1f}s)")
+    return obj, current
+
+def main():
+    chats = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    exchanges = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    print(f"{chats} chat x {exchanges} lượt hỏi-đáp:")
+    _, naive = _measure("naive dict/list/dict (không giới hạn)", lambda: _fill_naive(chats, exchanges), chats)
+    store, compact = _measure("ConversationStore(max_turns=8)", lambda: _fill_store(chats, exchanges), chats)
+    print(f"  ước lượng nội bộ: {store.stats()['approx_bytes'] / 1024 / 1024:.1f} MB, tiết kiệm x{naive / compact:.1f}")
+
+    # Giới hạn toàn cục: 100k chat nhưng chỉ cho 32 MB → các chat cũ nhất bị loại
+    capped = ConversationStore(max_bytes=32 * 1024 * 1024, max_chats=chats)
+    for c in range(chats):
+        for i in range(exchanges):
+            capped.add_exchange(str(c), QUESTION.format(i), ANSWER.format(i))
+    print(f"  với max_mb=32: {capped.stats()}")
+
+    t = time.perf_counter()
+    for c in range(0, chats, 10):
+        store.history(str(c), 2000)
+    print(f"  history(token_budget=2000): {(time.perf_counter() - t) / (chats // 10) * 1e6:.1f} us/lần")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Chạy FacebookGraphAPIConnector cục bộ với Graph API giả lập (không cần Meta), end to end.
+
+Kiểm tra: bắt tay verify-token, sai chữ ký X-Hub-Signature-256 → 401, entry[].messaging[] được bóc
+thành Message (bỏ echo), tin trùng mid → bỏ qua, hàng đợi đầy → 429; tin trả lời tới đúng người.
+Đo: WORKERS thread trả lời cùng lúc (như pool xử lý tin của bot) — mỗi thread tự gọi Send API
+(session chung) so với gộp batch. Graph giả mất GRAPH_SECONDS mỗi lần gọi, gọi batch cũng vậy;
+Graph thật giới hạn theo số lần gọi và số kết nối, nên số lần gọi là con số chính.
+
+Chạy từ thư mục gốc dự án:  python benchmarks/bench_facebook_webhook.py
+"""
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connectors.facebook_graph_api import SIGNATURE_HEADER, FacebookGraphAPIConnector  # noqa: E402
+
+APP_SECRET = "bench-app-secret"
+VERIFY_TOKEN = "bench-verify"
+GRAPH_SECONDS = 0.03
+REPLIES = 400
+WORKERS = 16
+
+class FakeGraph:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.delivered = []   # (recipient, text)
+        self.calls = 0
+        api = self
+
+        class H(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *a):
+                pass
+
+            def _reply(self, data, status=200):
+                raw = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_GET(self):
+                self._reply({"id": "page", "name": "Fake page"})
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                time.sleep(GRAPH_SECONDS)
+                with api.lock:
+                    api.calls += 1
+                if self.path.split("?")[0].endswith("/me/messages"):
+                    body = json.loads(raw)
+                    self._reply(api._deliver(body["recipient"]["id"], body["message"]["text"]))
+                    return
+                form = {k: v[-1] for k, v in parse_qs(raw.decode()).items()}
+                out = []
+                for req in json.loads(form["batch"]):
+                    b = {k: v[-1] for k, v in parse_qs(req["body"]).items()}
+                    res = api._deliver(json.loads(b["recipient"])["id"], json.loads(b["message"])["text"])
+                    out.append({"code": 200, "headers": [], "body": json.dumps(res)})
+                self._reply(out)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), H)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def _deliver(self, recipient, text):
+        with self.lock:
+            self.delivered.append((recipient, text))
+            return {"recipient_id": recipient, "message_id": f"m_{len(self.delivered)}"}
+
+def _event(psid, mid, text, echo=False):
+    return {"sender": {"id": psid}, "recipient": {"id": "page"}, "timestamp": 1760000000000,
+            "message": {"mid": mid, "text": text, **({"is_echo": True} if echo else {})}}
+
+def _post(conn, path, payload, secret=APP_SECRET):
+    body = json.dumps(payload).encode()
+    sig = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    conn.request("POST", path, body=body, headers={SIGNATURE_HEADER: sig, "Content-Type": "application/json"})
+    r = conn.getresponse()
+    r.read()
+    return r.status
+
+def _get(conn, path):
+    conn.request("GET", path)
+    r = conn.getresponse()
+    return r.status, r.read().decode()
+
+def _blast(graph, send):
+    graph.delivered.clear()
+    graph.calls = 0
+    t = time.perf_counter()
+    with ThreadPoolExecutor(WORKERS) as pool:
+        list(pool.map(lambda i: send(f"psid{i % 40}", f"trả lời {i}"), range(REPLIES)))
+    elapsed = time.perf_counter() - t
+    assert len(graph.delivered) == REPLIES
+    return elapsed, graph.calls
+
+def main():
+    graph = FakeGraph()
+    fb = FacebookGraphAPIConnector("PAGE_TOKEN", "page", app_secret=APP_SECRET, verify_token=VERIFY_TOKEN,
+                                   host="127.0.0.1", port=0, queue_size=3, graph_base=graph.base)
+    fb.start()
+    host, port = fb.server.address
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    path = fb.path
+
+    # --- đúng/sai ---
+    assert _get(conn, f"{path}?hub.mode=subscribe&hub.verify_token={VERIFY_TOKEN}&hub.challenge=42") == (200, "42")
+    assert _get(conn, f"{path}?hub.mode=subscribe&hub.verify_token=wrong&hub.challenge=42")[0] == 403
+    payload = {"object": "page", "entry": [
+        {"id": "page", "time": 1, "messaging": [_event("u1", "m1", "chào shop"), _event("page", "m0", "echo", echo=True)]},
+        {"id": "page", "time": 2, "messaging": [_event("u2", "m2", "giá bao nhiêu")]},
+    ]}
+    assert _post(conn, path, payload, secret="wrong") == 401
+    assert _post(conn, path, payload) == 200
+    assert _post(conn, path, payload) == 200  # Meta gửi lại → bỏ qua
+    msgs = fb.get_new_messages()
+    assert [(m.thread_id, m.text) for m in msgs] == [("u1", "chào shop"), ("u2", "giá bao nhiêu")], msgs
+    assert fb.counters["duplicates"] == 2
+    full = {"object": "page", "entry": [{"id": "page", "time": 3, "messaging": [
+        _event(f"u{i}", f"q{i}", "hi") for i in range(5)]}]}
+    assert _post(conn, path, full) == 429   # hàng đợi 3 chỗ
+    fb.get_new_messages()
+    assert _post(conn, path, full) == 200   # gửi lại: 3 tin đầu đã nhận, chỉ thêm 2 tin còn lại
+    assert len(fb.get_new_messages()) == 2
+    fb.send_message("u1", "xin chào")
+    assert graph.delivered[-1] == ("u1", "xin chào")
+    print("verify-token, 401 sai chữ ký, bóc entry/messaging, bỏ echo + trùng mid, 429 khi đầy, gửi trả lời: OK")
+
+    # --- gửi: từng tin vs gộp batch ---
+    print(f"{REPLIES} tin trả lời từ {WORKERS} thread, Graph giả {GRAPH_SECONDS * 1000:.0f} ms/lần gọi:")
+    for label, send in (("từng tin", fb._send_one), ("gộp batch", fb.send_message)):
+        elapsed, calls = _blast(graph, send)
+        print(f"  {label:<12} {elapsed:5.2f} s  {REPLIES / elapsed:6.0f} tin/s  {calls} lần gọi Graph")
+    print(f"  {fb.stats()}")
+    fb.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark BotLogic.find_match với 10k intents.
+
+Chạy từ thư mục gốc dự án:  python benchmarks/bench_find_match.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_logic import BotLogic, _tokenize  # noqa: E402
+
+N_INTENTS = 10_000
+N_MESSAGES = 2_000
+
+def _legacy_find_match(intents, fallback, text):
+    # Bản cũ: tokenize lại mọi keyword của mọi intent cho mỗi tin nhắn
+    user_tokens = _tokenize(text or "")
+    for intent in intents:
+        for kw in intent.get("match", []):
+            kw_tokens = _tokenize(kw)
+            if kw_tokens and kw_tokens.issubset(user_tokens):
+                return intent.get("reply", fallback)
+    return None
+
+def _make_corpus(rng):
+    syllables = ["gia", "ban", "mua", "ship", "đơn", "hàng", "tư", "vấn", "bảo", "hành",
+                 "đổi", "trả", "khuyến", "mãi", "size", "màu", "cửa", "hàng", "giờ", "mở"]
+    intents = []
+    for i in range(N_INTENTS):
+        kws = []
+        for _ in range(rng.randint(1, 4)):
+            words = rng.sample(syllables, rng.randint(1, 2)) + [f"sp{i}"]
+            kws.append(" ".join(words))
+        intents.append({"match": kws, "reply": f"reply {i}"})
+    messages = []
+    for _ in range(N_MESSAGES):
+        words = rng.sample(syllables, rng.randint(2, 6))
+        if rng.random() < 0.5:
+            words.append(f"sp{rng.randrange(N_INTENTS)}")
+        messages.append(" ".join(words))
+    return {"intents": intents, "fallback": "fb"}, messages
+
+def main():
+    rng = random.Random(42)
+    cfg, messages = _make_corpus(rng)
+
+    t0 = time.perf_counter()
+    logic = BotLogic(cfg)
+    build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    fast = [logic.find_match(m) for m in messages]
+    fast_s = time.perf_counter() - t0
+
+    sample = messages[:100]
+    t0 = time.perf_counter()
+    slow = [_legacy_find_match(cfg["intents"], cfg["fallback"], m) for m in sample]
+    slow_s = (time.perf_counter() - t0) * len(messages) / len(sample)
+
+    assert fast[:len(sample)] == slow, "compiled matcher khác kết quả bản cũ"
+    print(f"intents={N_INTENTS} messages={N_MESSAGES}")
+    print(f"build index:        {build * 1000:8.1f} ms")
+    print(f"compiled matcher:   {fast_s / len(messages) * 1e6:8.1f} us/msg")
+    print(f"legacy linear scan: {slow_s / len(messages) * 1e6:8.1f} us/msg (ước lượng từ {len(sample)} msg)")
+    print(f"speedup: x{slow_s / fast_s:.0f}")
+
+if __name__ == "__main__":
+    main()
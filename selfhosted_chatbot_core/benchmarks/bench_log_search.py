@@ -0,0 +1,118 @@
+"""Đọc log cho dashboard: readlines()[-50:] (cũ) so với tail_lines (đọc ngược), và tìm một hội thoại
+bằng LogIndex so với quét cả file. Log giả lập giống bot.py ghi (nhận/trả lời/traceback), nhiều chat.
+
+Kiểm tra: tail_lines khớp readlines()[-50:], kết quả tìm theo chat_id/thời gian khớp quét toàn bộ,
+chỉ mục cập nhật đúng khi log được ghi thêm và lập lại khi file bị xoay vòng.
+
+Chạy từ thư mục gốc dự án:  python benchmarks/bench_log_search.py [số MB, mặc định 200] [json]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.log_reader import LogIndex, parse_line, tail_lines  # noqa: E402
+
+CHATS = 5000
+T0 = 1757000000
+
+def _ts(i):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(T0 + i // 4))
+
+def _lines(i, as_json):
+    chat = str(100000 + (i * 7919) % CHATS)
+    ts = _ts(i)
+    if as_json:
+        yield json.dumps({"ts": ts, "level": "INFO", "msg": f"💬 Tin nhắn mới từ {chat} ({chat}): câu hỏi số {i}",
+                          "chat_id": chat, "stage": "inbound"}, ensure_ascii=False)
+        yield json.dumps({"ts": ts, "level": "INFO", "msg": f"📤 Đã trả lời {chat}: trả lời cho câu {i}",
+                          "chat_id": chat, "stage": "reply", "latency_ms": 42.0}, ensure_ascii=False)
+        return
+    yield f"[{ts}] [INFO] 💬 Tin nhắn mới từ {chat} ({chat}): câu hỏi số {i} còn hàng không shop ơi?"
+    yield f"[{ts}] [INFO] 📤 Đã trả lời {chat}: Dạ còn hàng ạ, giá 250.000đ, ship 2-3 ngày (câu {i})."
+    if i % 500 == 0:
+        yield f"[{ts}] [ERROR] Lỗi xử lý tin nhắn từ {chat}: timeout"
+        yield "Traceback (most recent call last):"
+        yield '  File "bot.py", line 240, in handle_message'
+        yield "TimeoutError: timeout"
+
+def _write(path, mb, as_json, start=0):
+    i = start
+    with open(path, "a", encoding="utf-8") as f:
+        while f.tell() < mb * 1024 * 1024:
+            f.write("\n".join(_lines(i, as_json)) + "\n")
+            i += 1
+    return i
+
+def _scan(path, chat=None, since=None, until=None):
+    # Cách không có chỉ mục: đọc cả file (như tải /download/log rồi tìm)
+    out, keep = [], False
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            ts, c = parse_line(line)
+            if ts is not None:
+                keep = (not chat or c == chat) and (not since or ts >= since) and (not until or ts <= until + "~")
+            if keep:
+                out.append(line.rstrip("\n"))
+    return out
+
+def _t(fn):
+    t = time.perf_counter()
+    res = fn()
+    return res, time.perf_counter() - t
+
+def main():
+    mb = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    as_json = "json" in sys.argv[2:]
+    with tempfile.TemporaryDirectory() as tmp:
+        log, idx_path = os.path.join(tmp, "bot.log"), os.path.join(tmp, "log_index.sqlite")
+        n = _write(log, mb, as_json)
+        print(f"log {os.path.getsize(log) / 2**20:.0f} MB ({'JSON lines' if as_json else 'text'}), {CHATS} chat:")
+
+        old, t_old = _t(lambda: open(log, encoding="utf-8").readlines()[-50:])
+        new, t_new = _t(lambda: tail_lines(log, 50))
+        assert new == old
+        print(f"  50 dòng cuối: readlines {t_old * 1000:8.1f} ms   tail_lines {t_new * 1000:6.2f} ms")
+
+        idx = LogIndex(log, idx_path)
+        _, t_build = _t(idx.refresh)
+        size = sum(os.path.getsize(p) for p in (idx_path, idx_path + "-wal") if os.path.exists(p))
+        print(f"  lập chỉ mục lần đầu {t_build:.1f} s, {size / 2**20:.1f} MB, {idx.stats()}")
+
+        chat = "100042"
+        full, t_scan = _t(lambda: _scan(log, chat))
+        res, t_idx = _t(lambda: idx.search(chat_id=chat, limit=10**6))
+        assert [l["text"] for l in res["lines"]] == full, (len(res["lines"]), len(full))
+        print(f"  tìm chat {chat} ({len(full)} dòng): quét cả file {t_scan:.2f} s   chỉ mục {t_idx * 1000:.1f} ms "
+              f"(đọc {res['scanned_bytes'] / 2**20:.1f} MB)")
+
+        # Nửa giờ ở giữa log; until dạng tiền tố phút → tính cả các giây trong phút đó
+        since, until = _ts(n // 2)[:16], _ts(n // 2 + 4 * 1800)[:16]
+        full, t_scan = _t(lambda: _scan(log, since=since, until=until))
+        res, t_idx = _t(lambda: idx.search(since=since, until=until, limit=10**6))
+        assert full and [l["text"] for l in res["lines"]] == full
+        print(f"  tìm {since} → {until} ({len(full)} dòng): quét {t_scan:.2f} s   chỉ mục {t_idx * 1000:.1f} ms")
+
+        page = idx.search(chat_id=chat, limit=5)
+        page2 = idx.search(chat_id=chat, limit=5, after=page["next"])
+        assert [l["text"] for l in page["lines"] + page2["lines"]] == _scan(log, chat)[:10]
+
+        # Ghi thêm → chỉ phần mới được đọc
+        _write(log, mb + 1, as_json, start=n)
+        _, t_inc = _t(idx.refresh)
+        assert [l["text"] for l in idx.search(chat_id=chat, limit=10**6)["lines"]] == _scan(log, chat)
+        print(f"  ghi thêm ~1 MB → cập nhật chỉ mục {t_inc * 1000:.0f} ms")
+
+        # Xoay vòng: file mới → lập lại
+        os.replace(log, log + ".1")
+        _write(log, 1, as_json, start=10**7)
+        idx.refresh()
+        assert [l["text"] for l in idx.search(chat_id=chat, limit=10**6)["lines"]] == _scan(log, chat)
+        print("  xoay vòng file → chỉ mục lập lại cho file mới: OK")
+        idx.close()
+
+if __name__ == "__main__":
+    main()
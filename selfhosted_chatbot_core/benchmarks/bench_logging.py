@@ -0,0 +1,101 @@
+"""Chi phí ghi log trên đường trả lời tin nhắn: trước (StreamHandler + FileHandler đồng bộ, f-string)
+so với sau (%-format lười, QueueHandler/QueueListener, tùy chọn JSON lines).
+
+Mỗi "tin nhắn" ghi như BotRunner.handle_message: 2 dòng INFO (nhận/trả lời) + 1 dòng DEBUG (quyết định,
+bị tắt ở mức INFO). Console giả lập terminal chậm: thỉnh thoảng khựng STALL_MS (cuộn màn hình,
+PowerShell, SSH chậm...). File ghi vào thư mục tạm, xoay vòng theo kích thước.
+Đo thời gian các lệnh log chiếm trên thread xử lý tin: trung bình, p99, max.
+
+Chạy từ thư mục gốc dự án:  python benchmarks/bench_logging.py
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.logger as logmod  # noqa: E402
+
+MESSAGES = 20000
+STALL_EVERY = 500   # cứ chừng này lần ghi console thì khựng một lần
+STALL_MS = 20
+
+class SlowConsole(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        if self.writes % STALL_EVERY == 0:
+            time.sleep(STALL_MS / 1000)
+        return len(s)
+
+class Msg:
+    def __init__(self, i):
+        self.thread_id = str(100000 + i % 300)
+        self.sender_id = self.thread_id
+        self.text = f"cho mình hỏi giá sản phẩm số {i} còn hàng không?"
+
+def before(log, m, reply):
+    log.info(f"💬 Tin nhắn mới từ {m.sender_id} ({m.thread_id}): {m.text}")
+    log.debug(f"Decision: SCENARIO -> {reply!r}")
+    log.info(f"📤 Đã trả lời {m.thread_id}: {reply}")
+
+def after(log, m, reply):
+    log.info("💬 Tin nhắn mới từ %s (%s): %s", m.sender_id, m.thread_id, m.text,
+             extra={"chat_id": m.thread_id, "stage": "inbound"})
+    log.debug("Decision: SCENARIO -> %r", reply, extra={"chat_id": m.thread_id, "stage": "route"})
+    log.info("📤 Đã trả lời %s: %s", m.thread_id, reply,
+             extra={"chat_id": m.thread_id, "stage": "reply", "latency_ms": 12.5})
+
+def _run(label, config, fn, tmp):
+    logmod.LOGS_DIR = os.path.join(tmp, label.replace(" ", "_"))
+    real_stderr, sys.stderr = sys.stderr, SlowConsole()  # StreamHandler() lấy sys.stderr lúc tạo
+    try:
+        log = logmod.setup_logger("bench", "INFO", config)
+    finally:
+        sys.stderr = real_stderr
+    msgs = [Msg(i) for i in range(MESSAGES)]
+    reply = "Dạ sản phẩm còn hàng ạ, giá 250.000đ, ship toàn quốc 2-3 ngày."
+    times = []
+    wall = time.perf_counter()
+    for m in msgs:
+        t = time.perf_counter_ns()
+        fn(log, m, reply)
+        times.append(time.perf_counter_ns() - t)
+    hot = time.perf_counter() - wall
+    logmod.shutdown_logger("bench")  # chờ thread ghi log xử lý nốt
+    drained = time.perf_counter() - wall
+    times.sort()
+    path = os.path.join(logmod.LOGS_DIR, "bot.log")
+    with open(path, encoding="utf-8") as f:
+        last = f.readlines()[-1]
+    stats = logmod.logger_stats("bench")
+    print(f"  {label:<22} trung bình {sum(times) / len(times) / 1000:6.1f} µs   p99 {times[int(len(times) * 0.99)] / 1000:7.1f} µs"
+          f"   max {times[-1] / 1e6:6.1f} ms   ({hot:.2f} s trên thread tin nhắn, ghi xong sau {drained:.2f} s)")
+    for h in list(log.handlers):
+        log.removeHandler(h)
+        h.close()
+    return last, stats
+
+def main():
+    print(f"{MESSAGES} tin nhắn × (2 INFO + 1 DEBUG tắt), console khựng {STALL_MS} ms mỗi {STALL_EVERY} dòng:")
+    rotate = {"when": "size", "max_bytes": 2 * 1024 * 1024, "backup_count": 3}
+    with tempfile.TemporaryDirectory() as tmp:
+        _run("trước (đồng bộ)", {"rotate": {"when": "none"}}, before, tmp)
+        _run("lazy, đồng bộ", {"rotate": rotate}, after, tmp)
+        _run("lazy + queue", {"async": True, "queue_size": 100000, "rotate": rotate}, after, tmp)
+        last, _ = _run("lazy + queue + JSON", {"async": True, "queue_size": 100000, "format": "json",
+                                                 "rotate": rotate}, after, tmp)
+        rec = json.loads(last)
+        assert rec["stage"] == "reply" and rec["chat_id"] and rec["latency_ms"] == 12.5, rec
+        print(f"  dòng JSON cuối: {last.strip()}")
+        files = sorted(os.listdir(os.path.join(tmp, "lazy_+_queue")))
+        print(f"  xoay vòng (2 MB × 3): {files}")
+
+if __name__ == "__main__":
+    main()
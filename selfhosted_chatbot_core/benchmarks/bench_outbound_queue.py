@@ -0,0 +1,139 @@
+"""Gửi tin qua OutboundQueue so với gửi thẳng bằng pool thread (FIFO, gặp 429 thì ngủ retry_after).
+
+Bot API giả lập cục bộ áp giới hạn như Telegram: ~30 tin/s toàn bot, ~1 tin/s mỗi chat (cho phép
+dồn 3 tin), vượt → 429 kèm parameters.retry_after; mỗi sendMessage mất SEND_SECONDS.
+Kịch bản: một tick nhắc nhở đổ BURST tin (3 tin/chat) cùng lúc, trong khi người dùng nhắn tới
+và cần được trả lời (INTERACTIVE tin, rải đều).
+Đo: độ trễ trả lời người dùng (enqueue → gửi xong), thời gian gửi hết đợt nhắc nhở, số 429.
+
+Chạy từ thư mục gốc dự án:  python benchmarks/bench_outbound_queue.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connectors.outbound import BULK, INTERACTIVE, RetryAfter  # noqa: E402
+from connectors.telegram_connector import TelegramConnector  # noqa: E402
+from utils.rate_limit import TokenBucket  # noqa: E402
+
+BURST = 150           # tin nhắc nhở của một tick (50 chat × 3)
+INTERACTIVE_MSGS = 20
+INTERACTIVE_EVERY = 0.1
+SEND_SECONDS = 0.02
+WORKERS = 8
+
+class FakeBotAPI:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.global_bucket = TokenBucket(30, 30)
+        self.chat_buckets = {}
+        self.sent = {}            # text → thời điểm gửi xong
+        self.rejected = 0
+        api = self
+
+        class H(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *a):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(SEND_SECONDS)
+                with api.lock:
+                    chat = api.chat_buckets.setdefault(body["chat_id"], TokenBucket(1, 3))
+                    ok = chat.try_acquire() and api.global_bucket.try_acquire()
+                    if ok:
+                        api.sent[body["text"]] = time.perf_counter()
+                    else:
+                        api.rejected += 1
+                if ok:
+                    status, data = 200, {"ok": True, "result": {"message_id": 1}}
+                else:
+                    status, data = 429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 1}}
+                raw = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), H)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def reset(self):
+        with self.lock:
+            self.global_bucket = TokenBucket(30, 30)
+            self.chat_buckets = {}
+            self.sent = {}
+            self.rejected = 0
+
+def _workload(tag):
+    reminders = [(f"r{i % 50}", f"{tag}-nhắc-{i}") for i in range(BURST)]
+    replies = [(f"u{i}", f"{tag}-trả lời-{i}") for i in range(INTERACTIVE_MSGS)]
+    return reminders, replies
+
+def _direct(api, tg):
+    """Cách cũ: gửi thẳng theo thứ tự đến, 429 → ngủ retry_after rồi thử lại (chiếm luôn thread)."""
+    reminders, replies = _workload("direct")
+    pool = ThreadPoolExecutor(WORKERS)
+
+    def send(chat, text):
+        while True:
+            try:
+                return tg._post_message(chat, text)
+            except RetryAfter as e:
+                time.sleep(e.seconds)
+
+    return _drive(api, reminders, replies, lambda chat, text, prio: pool.submit(send, chat, text))
+
+def _queued(api, tg):
+    reminders, replies = _workload("queue")
+    return _drive(api, reminders, replies, lambda chat, text, prio: tg.outbound.enqueue(chat, text, prio))
+
+def _drive(api, reminders, replies, submit):
+    started = time.perf_counter()
+    for chat, text in reminders:
+        submit(chat, text, BULK)
+    enqueued = {}
+    for chat, text in replies:
+        enqueued[text] = time.perf_counter()
+        submit(chat, text, INTERACTIVE)
+        time.sleep(INTERACTIVE_EVERY)
+    texts = [t for _, t in reminders] + [t for _, t in replies]
+    deadline = time.perf_counter() + 60
+    while time.perf_counter() < deadline and not all(t in api.sent for t in texts):
+        time.sleep(0.05)
+    lat = sorted(api.sent[t] - enqueued[t] for t in enqueued if t in api.sent)
+    drained = max(api.sent[t] for _, t in reminders) - started
+    return lat, drained, api.rejected
+
+def _report(label, res):
+    lat, drained, rejected = res
+    print(f"  {label:<14} trả lời p50 {lat[len(lat) // 2] * 1000:7.1f} ms  p95 {lat[int(len(lat) * 0.95)] * 1000:7.1f} ms"
+          f"   hết đợt nhắc {drained:5.2f} s   429: {rejected}")
+
+def main():
+    api = FakeBotAPI()
+    print(f"{BURST} tin nhắc nhở (50 chat) + {INTERACTIVE_MSGS} câu trả lời, {WORKERS} thread gửi, "
+          f"Bot API giả: 30 tin/s, 1 tin/s/chat (dồn 3), {SEND_SECONDS * 1000:.0f} ms/lần gửi")
+    tg = TelegramConnector("T", api_base=api.base)
+    tg.enable_outbound(workers=WORKERS)
+    _report("gửi thẳng", _direct(api, tg))
+    api.reset()
+    tg.start()
+    _report("OutboundQueue", _queued(api, tg))
+    print(f"  {tg.outbound.stats()}")
+    tg.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Độ trễ nhận tin: vòng lặp polling cũ (getUpdates → xử lý → ngủ poll_interval) so với
+TelegramPrefetchConnector (một getUpdates luôn chờ sẵn trong thread nền, không ngủ).
+
+Bot API giả lập cục bộ: getUpdates long-poll thật (chờ tới khi có update hoặc hết timeout),
+tôn trọng offset/limit. Tin đến đều đặn; mỗi tin bot xử lý mất PROCESS_SECONDS.
+Độ trễ = từ lúc tin tới "server" tới lúc bot bắt đầu xử lý nó.
+
+Chạy từ thư mục gốc dự án:  python benchmarks/bench_prefetch_ingest.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connectors.telegram_connector import TelegramConnector, TelegramPrefetchConnector  # noqa: E402
+
+MESSAGES = 40
+ARRIVAL_EVERY = 0.15
+PROCESS_SECONDS = 0.05
+POLL_INTERVAL = 1.0   # settings.json mặc định 3 s; giảm để benchmark chạy nhanh
+
+class FakeBotAPI:
+    def __init__(self):
+        self.updates = []          # (update_id, arrived_at, update)
+        self.cv = threading.Condition()
+        self.requests = []         # query của từng lần getUpdates
+        api = self
+
+        class H(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *a):
+                pass
+
+            def do_GET(self):
+                q = {k: v[-1] for k, v in parse_qs(urlsplit(self.path).query).items()}
+                api.requests.append(q)
+                offset = int(q.get("offset", 0))
+                limit = int(q.get("limit", 100))
+                deadline = time.monotonic() + float(q.get("timeout", 0))
+                with api.cv:
+                    while True:
+                        pending = [u for uid, _, u in api.updates if uid >= offset]
+                        left = deadline - time.monotonic()
+                        if pending or left <= 0:
+                            break
+                        api.cv.wait(left)
+                body = json.dumps({"ok": True, "result": pending[:limit]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), H)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def feed(self, start_id):
+        for i in range(MESSAGES):
+            uid = start_id + i
+            upd = {"update_id": uid, "message": {"text": str(uid), "chat": {"id": 1 + i % 5}, "from": {"id": 1}}}
+            with self.cv:
+                self.updates.append((uid, time.perf_counter(), upd))
+                self.cv.notify_all()
+            time.sleep(ARRIVAL_EVERY)
+
+    def arrived(self, uid):
+        return next(t for u, t, _ in self.updates if u == uid)
+
+def _run(api, connector, start_id, sleep_between):
+    lat = []
+    feeder = threading.Thread(target=api.feed, args=(start_id,))
+    connector.start()
+    feeder.start()
+    while len(lat) < MESSAGES:
+        for m in connector.get_new_messages():
+            lat.append(time.perf_counter() - api.arrived(int(m.text)))
+            time.sleep(PROCESS_SECONDS)
+        if sleep_between:
+            time.sleep(POLL_INTERVAL)
+    feeder.join()
+    connector.close()
+    lat.sort()
+    return lat
+
+def _report(label, lat):
+    print(f"  {label:<22} p50 {lat[len(lat) // 2] * 1000:7.1f} ms   p95 {lat[int(len(lat) * 0.95)] * 1000:7.1f} ms   "
+          f"max {lat[-1] * 1000:7.1f} ms")
+
+def main():
+    api = FakeBotAPI()
+    print(f"{MESSAGES} tin, mỗi {ARRIVAL_EVERY * 1000:.0f} ms một tin, xử lý {PROCESS_SECONDS * 1000:.0f} ms/tin, "
+          f"poll_interval {POLL_INTERVAL:.0f} s:")
+    legacy = TelegramConnector("T", api_base=api.base)
+    _report("polling + ngủ", _run(api, legacy, 1, sleep_between=True))
+    prefetch = TelegramPrefetchConnector("T", api_base=api.base, queue_size=100)
+    prefetch.offset = legacy.offset
+    _report("prefetch", _run(api, prefetch, 1001, sleep_between=False))
+    q = api.requests[-1]
+    print(f"  getUpdates gửi: limit={q.get('limit')} allowed_updates={q.get('allowed_updates')}")
+    print(f"  {prefetch.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Kiểm tra + đo reminders.grammar trên bộ câu nhắc nhở thực tế (Việt/Anh, có/không dấu, NFD).
+
+Phần 1: mọi câu trong CORPUS phải cho đúng kết quả mong đợi (sai → thoát mã 1).
+Phần 2: tốc độ so với _parse cũ (ghép chuỗi regex mỗi lần gọi, tới 3 lượt re.search với .*?)
+trên luồng tin thường (đa số không phải lệnh nhắc) và trên riêng các lệnh nhắc.
+
+Chạy từ thư mục gốc dự án:  python benchmarks/bench_reminder_grammar.py
+"""
+import datetime
+import os
+import re
+import sys
+import timeit
+import unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reminders import grammar  # noqa: E402
+from utils.textnorm import _fold  # noqa: E402
+
+TODAY = datetime.date(2026, 10, 18)
+
+def C(time, date=None, repeat="once_today", text=""):
+    return {"action": "create", "time": time, "date": date, "repeat": repeat, "text": text}
+
+def X(time):
+    return {"action": "cancel", "time": time}
+
+NONE = {"action": "none"}
+
+CORPUS = [
+    # --- tạo ---
+    ("nhắc 7h uống nước", C("07:00", text="uống nước")),
+    ("Nhắc tôi lúc 7h30 sáng: uống thuốc", C("07:30", text="uống thuốc")),
+    ("nhắc nhở lúc 21:15 \"tắt bếp\"", C("21:15", text="tắt bếp")),
+    ("nhắc mình 9h tối mỗi ngày: đọc sách 30 phút", C("21:00", repeat="daily", text="đọc sách 30 phút")),
+    ("nhắc nhở vào 6 giờ 45 hằng ngày với nội dung tập thể dục", C("06:45", repeat="daily", text="tập thể dục")),
+    ("nhắc tôi 8h ngày 20/10: mua hoa tặng mẹ", C("08:00", "2026-10-20", "once", "mua hoa tặng mẹ")),
+    ("nhắc tôi ngày 20/10 lúc 8h: mua hoa", C("08:00", "2026-10-20", "once", "mua hoa")),
+    ("nhắc 10h sáng 5/1 nộp thuế", C("10:00", "2027-01-05", "once", "nộp thuế")),
+    ("nhắc 10h 5/1/2027: nộp thuế", C("10:00", "2027-01-05", "once", "nộp thuế")),
+    ("nhắc tôi 3h chiều mai gọi cho khách", C("15:00", "2026-10-19", "once", "gọi cho khách")),
+    ("nhắc e 7h mai “đi khám răng”", C("07:00", "2026-10-19", "once", "đi khám răng")),
+    ("nhắc tôi 2pm tomorrow: team meeting", C("14:00", "2026-10-19", "once", "team meeting")),
+    ("ê bot, nhắc tôi 11h đêm: đi ngủ", C("23:00", text="đi ngủ")),
+    ("nhắc 12h trưa every day: ăn trưa", C("12:00", repeat="daily", text="ăn trưa")),
+    ("nhắc 1h trưa daily - nghỉ trưa", C("13:00", repeat="daily", text="nghỉ trưa")),
+    ("nhắc nhở 6h mỗi ngày", C("06:00", repeat="daily")),
+    ("nhắc 8:00 ngày 25 tháng 12: mua quà", C("08:00", "2026-12-25", "once", "mua quà")),
+    ("NHẮC TÔI 5H CHIỀU: ĐÓN CON", C("17:00", text="ĐÓN CON")),
+    ("nhắc 7h: \"họp: chuẩn bị slide\"", C("07:00", text="họp: chuẩn bị slide")),
+    ("nhắc tôi 9h gọi chị Mai", C("09:00", text="gọi chị Mai")),
+    ("nhắc 6h30p sáng chạy bộ", C("06:30", text="chạy bộ")),
+    (unicodedata.normalize("NFD", "nhắc tôi 7h uống nước"), C("07:00", text="uống nước")),
+    # --- tắt ---
+    ("tắt nhắc nhở lúc 7h", X("07:00")),
+    ("Tắt hết nhắc nhở lúc 21:15", X("21:15")),
+    ("hủy nhắc 6h30", X("06:30")),
+    ("xoá nhắc nhở 9h tối", X("21:00")),
+    # --- không phải lệnh / sai ---
+    ("nhắc 25h uống nước", NONE),
+    ("nhắc 8h ngày 31/2: ???", NONE),
+    ("bạn nhắc lại được không", NONE),
+    ("tắt đèn giúp mình", NONE),
+    ("remind me at 7am to drink water", NONE),
+    ("nhac toi 7h uong nuoc", NONE),
+    # --- chuyện phiếm có "nhắc" + con số (chạy trên mọi tin đến) ---
+    ("nhắc 10 phút nữa uống nước", NONE),
+    ("mình nhắc 2 lần rồi mà", NONE),
+    ("nhắc 2 tiếng nữa đi đón con", NONE),
+    ("nhắc tôi 2 giờ nữa gọi lại", NONE),
+    ("nhắc 3 người rồi chưa ai trả lời", NONE),
+    ("shop nhắc 5 bận mà vẫn chưa giao", NONE),
+    ("nhắc 7: uống thuốc", C("07:00", text="uống thuốc")),
+    ("nhắc 7 mỗi ngày: uống thuốc", C("07:00", repeat="daily", text="uống thuốc")),
+    ("", NONE),
+]
+
+CHATTER = [
+    "chào shop", "giá bao nhiêu vậy ạ", "ship về Đà Nẵng mất mấy ngày?", "hello", "thanks!",
+    "Cho mình hỏi còn size L màu đỏ không, mình muốn đặt 2 cái", "ok", "cảm ơn bạn nhiều nha",
+    "what are your opening hours?", "mai mình qua lấy hàng lúc 3h chiều được không",
+    "tắt máy rồi à?", "có giao hàng tận nơi không", "👍", "bao giờ có hàng lại vậy shop",
+]
+
+# --- _parse cũ (trước khi có grammar) để so tốc độ ---
+TIME_PAT = r"(\d{1,2}(?::\d{2})?)(?:\s*h?)?"
+DATE_PAT = r"(\d{1,2})\s*(?:th|/|-)\s*(\d{1,2})"
+DAILY_PAT = r"(hằng\s*ngày|mỗi\s*ngày|every\s*day)"
+TEXT_PAT = r"\"([^\"]+)\"|:([\s\S]+)$"
+
+def _legacy_parse(msg: str):
+    # normalize() không cache (tin thật hiếm khi lặp lại; timeit thì lặp lại cùng một luồng)
+    if "nhac" not in _fold(msg):
+        return {"action": "none"}
+    m = re.search(r"tắt\s+nhắc\s*nhở\s*lúc\s*" + TIME_PAT, msg, flags=re.I)
+    if m:
+        return {"action": "cancel", "time": m.group(1)}
+    m = re.search(r"nhắc(?:\s*nhở)?(?:\s+vào|\s+lúc)?\s*" + TIME_PAT + r"(?:\s+" + DATE_PAT + ")?(?:\s*(" + DAILY_PAT
+                  + "))?.*?(?:với\s*nội\s*dung\s*" + TEXT_PAT + "|" + TEXT_PAT + ")", msg, flags=re.I)
+    if not m:
+        m = re.search(r"nhắc(?:\s*nhở)?\s*" + TIME_PAT + r"(?:\s+" + DATE_PAT + ")?(?:\s*(" + DAILY_PAT + "))?\s*"
+                      + TEXT_PAT, msg, flags=re.I)
+    if m:
+        return {"action": "create", "time": m.group(1), "text": (m.group(5) or m.group(6) or "").strip()}
+    return {"action": "none"}
+
+def _bench(label, fn, msgs, number):
+    t = timeit.timeit(lambda: fn(msgs), number=number)
+    per_msg = t / (number * len(msgs)) * 1e6
+    print(f"  {label:<26} {per_msg:7.2f} us/tin")
+    return per_msg
+
+def main():
+    bad = 0
+    for msg, want in CORPUS:
+        got = grammar.parse(msg, TODAY)
+        if got != want:
+            bad += 1
+            print(f"SAI  {msg!r}\n     được  {got}\n     muốn  {want}")
+    commands = [m for m, want in CORPUS if want != NONE]
+    print(f"{len(CORPUS) - bad}/{len(CORPUS)} câu đúng")
+
+    # Tin thật hiếm khi lặp lại nguyên văn → mỗi tin khác nhau (không trúng cache của normalize)
+    stream = [f"{m} ({i})" for i in range(20) for m in CHATTER] + commands  # ~8% là lệnh nhắc
+    print(f"luồng tin thường ({len(stream)} tin, {len(commands)} lệnh nhắc):")
+    old = _bench("_parse cũ", lambda ms: [_legacy_parse(m) for m in ms], stream, 200)
+    new = _bench("grammar.parse_many", lambda ms: grammar.parse_many(ms, TODAY), stream, 200)
+    print(f"  speedup x{old / new:.1f}")
+    print(f"chỉ lệnh nhắc ({len(commands)} tin):")
+    old = _bench("_parse cũ", lambda ms: [_legacy_parse(m) for m in ms], commands, 500)
+    new = _bench("grammar.parse_many", lambda ms: grammar.parse_many(ms, TODAY), commands, 500)
+    print(f"  speedup x{old / new:.1f}")
+    if bad:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""So sánh scheduler heap (reminders.scheduler) với vòng quét 30 s cũ trên 100k nhắc nhở.
+
+Đo: dựng heap lúc khởi động, chi phí một lần thức khi chưa có gì đến hạn (so với một lượt
+quét toàn bộ như `_tick` cũ), và thời gian xử lý 1000 nhắc nhở cùng đến hạn 08:00.
+Dùng SQLite trong RAM và đồng hồ giả; hàm gửi không làm gì.
+Tiếp: 200 nhắc nhở cùng đến hạn, mỗi lần gửi giả lập 50 ms mạng (một lần treo quá
+send_timeout) — gửi tuần tự so với pool `send_workers` thread.
+Cuối: nhắc nhở hằng ngày 23:59 bị lỡ qua nửa đêm (tick trễ / khởi động lại lúc 00:00:20 và 00:15)
+phải được gửi bù trong misfire_grace hoặc tính là misfired, không mất dấu.
+
+Chạy từ thư mục gốc dự án:  python benchmarks/bench_reminder_scheduler.py [số_nhắc_nhở]
+"""
+import datetime
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reminders import scheduler as sch  # noqa: E402
+from reminders.store import SQLiteReminderStore  # noqa: E402
+
+def _legacy_scan(reminders, cycles, now):
+    # Phần quét của _tick cũ: duyệt mọi reminder + cycle mỗi 30 s
+    due = 0
+    for rid, r in reminders.items():
+        t = sch.parse_hhmm(r.get("time", "08:00"))
+        day = datetime.date.fromisoformat(r["date"]) if r.get("date") else now.date()
+        target = datetime.datetime.combine(day, t)
+        if now >= target and (now - target).total_seconds() <= 60:
+            due += 1
+    for c in cycles.values():
+        datetime.datetime.fromisoformat(c["t0"])
+    return due
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    burst = 1000
+    rnd = random.Random(1)
+    clock = [datetime.datetime(2026, 1, 5, 7, 0, 0)]
+    sch.now_local = lambda: clock[0]
+
+    store = SQLiteReminderStore(":memory:")
+    rows = []
+    for i in range(n):
+        at_eight = i < burst
+        rows.append({
+            "id": f"r{i}", "platform": "telegram", "user_id": f"u{i % 5000}", "chat_id": f"c{i % 5000}",
+            "time": "08:00" if at_eight else f"{rnd.choice([h for h in range(24) if h != 8]):02d}:{rnd.randrange(60):02d}",
+            "date": None if i % 3 else "2026-01-%02d" % rnd.randrange(6, 28),
+            "repeat": "daily" if i % 3 else "once", "text": "uống nước",
+        })
+    store.add_many(rows)
+    legacy_doc = {r["id"]: r for r in rows}
+    print(f"{n} nhắc nhở ({burst} cùng lúc 08:00)")
+
+    sent = []
+    s = sch.ReminderScheduler(lambda chat_id, text, meta: sent.append(meta), store=store, resync_interval=0)
+    t = time.perf_counter()
+    s.resync()
+    build = time.perf_counter() - t
+    tracemalloc.start()
+    s.resync()
+    heap_mem, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  dựng heap:                 {build * 1000:8.1f} ms   ({heap_mem / 1024 / 1024:.1f} MB, {s.stats()['scheduled']} sự kiện)")
+
+    # Lần thức đầu xử lý các nhắc nhở 00:00–06:59 hôm nay đã lỡ (misfire → bỏ qua, lên lịch ngày mai)
+    t = time.perf_counter()
+    s._tick()
+    s._tick()  # lên lịch lại các reminder vừa ghi last_missed (qua listener)
+    print(f"  xử lý lỡ hạn khi khởi động: {(time.perf_counter() - t) * 1000:7.1f} ms   ({s.counters['misfired']} bỏ qua)")
+
+    loops = 2000
+    t = time.perf_counter()
+    for _ in range(loops):
+        s._tick()
+    idle = (time.perf_counter() - t) / loops
+    t = time.perf_counter()
+    _legacy_scan(legacy_doc, {}, clock[0])
+    legacy = time.perf_counter() - t
+    print(f"  thức khi chưa đến hạn:     {idle * 1e6:8.1f} us   (quét kiểu cũ: {legacy * 1000:.1f} ms/lượt, mỗi 30 s)")
+
+    clock[0] = datetime.datetime(2026, 1, 5, 7, 59, 59)
+    s._tick()
+    sent.clear()
+    clock[0] = datetime.datetime(2026, 1, 5, 8, 0, 1)
+    t = time.perf_counter()
+    s._tick()
+    fire = time.perf_counter() - t
+    print(f"  xử lý {len(sent)} nhắc nhở 08:00:    {fire * 1000:8.1f} ms   ({fire / max(1, len(sent)) * 1e6:.0f} us/nhắc nhở, gồm ghi SQLite)")
+    print(f"  {s.stats()}")
+
+    print("200 nhắc nhở cùng lúc, gửi 50 ms/lần:")
+    for workers in (1, 8, 32):
+        _fanout(workers)
+    _midnight()
+
+def _fanout(workers: int, n: int = 200, latency: float = 0.05, send_timeout: float = 1.0):
+    clock = [datetime.datetime(2026, 1, 5, 7, 59, 59)]
+    sch.now_local = lambda: clock[0]
+    store = SQLiteReminderStore(":memory:")
+    store.add_many([{"id": f"f{i}", "platform": "telegram", "user_id": f"u{i}", "chat_id": f"c{i}",
+                     "time": "08:00", "date": None, "repeat": "daily", "text": "uống nước"} for i in range(n)])
+
+    def send(chat_id, text, meta):
+        time.sleep(latency * 40 if chat_id == "c0" else latency)
+
+    s = sch.ReminderScheduler(send, store=store, resync_interval=0, send_workers=workers, send_timeout=send_timeout)
+    s.resync()
+    s._tick()
+    clock[0] = datetime.datetime(2026, 1, 5, 8, 0, 1)
+    t = time.perf_counter()
+    s._tick()
+    elapsed = time.perf_counter() - t
+    tick = s.last_tick
+    print(f"  send_workers={workers:<3} {elapsed * 1000:8.0f} ms/tick   p95 {tick['send_ms_p95']} ms, "
+          f"timeout {tick['timeouts']}, gửi muộn {tick['late']}")
+    s.stop()
+
+def _midnight():
+    print("nhắc nhở 23:59 hằng ngày, lỡ qua nửa đêm (grace 600 s):")
+    for restart, at, expect in ((False, (0, 0, 20), "sent"), (True, (0, 0, 20), "sent"), (True, (0, 15, 0), "misfired")):
+        clock = [datetime.datetime(2026, 1, 5, 23, 58, 0)]
+        sch.now_local = lambda: clock[0]
+        store = SQLiteReminderStore(":memory:")
+        store.add_many([{"id": "m", "platform": "telegram", "user_id": "u", "chat_id": "c", "time": "23:59",
+                         "date": None, "repeat": "daily", "text": "uống thuốc", "last_fired": "2026-01-04"}])
+        sent = []
+        s = sch.ReminderScheduler(lambda chat_id, text, meta: sent.append(meta), store=store, resync_interval=0,
+                                  misfire_grace=600, send_workers=1)
+        s.resync()
+        clock[0] = datetime.datetime(2026, 1, 6, *at)
+        if restart:
+            s = sch.ReminderScheduler(lambda chat_id, text, meta: sent.append(meta), store=store,
+                                      resync_interval=0, misfire_grace=600, send_workers=1)
+            s.resync()
+        s._tick()
+        got = "sent" if sent else "misfired" if s.counters["misfired"] else "mất"
+        r = store.get_reminder("m")
+        print(f"  {'khởi động lại' if restart else 'tick trễ':13} lúc {clock[0].time()}: {got:8} "
+              f"(last_fired {r.get('last_fired')}, last_missed {r.get('last_missed')})")
+        assert got == expect, got
+        s.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Chạy nhiều process scheduler trên một kho SQLite (reminders.sharding): mỗi bước nhắc gửi đúng một lần.
+
+300 nhắc nhở cùng đến hạn 08:00, 3 process worker chia 8 shard qua LeaseManager (lease 3 s).
+Đồng hồ giả chạy nhanh gấp 60 lần (1 s thật = 1 phút) nên cả ba bước (0', 10', 20') diễn ra
+trong ~20 s. Worker w1 chết (os._exit) sau bước 1 → shard của nó phải được w2/w3 nhận trước
+bước 2. Mỗi lần gửi ghi một dòng "rid step" vào log của worker; cuối cùng đếm: phải đủ
+300 × 3 = 900 lần gửi, không lần nào trùng.
+
+Chạy từ thư mục gốc dự án:  python benchmarks/bench_reminder_sharding.py
+"""
+import collections
+import datetime
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reminders import scheduler as sch  # noqa: E402
+from reminders.lease import LeaseManager  # noqa: E402
+from reminders.store import SQLiteReminderStore  # noqa: E402
+
+N = 300
+WORKERS = ("w1", "w2", "w3")
+DIE_AFTER = {"w1": 4.0}  # giây thật kể từ lúc bắt đầu (~08:04 giờ giả)
+RUN_SECONDS = 26.0
+SPEED = 60  # giây giả / giây thật
+BASE = datetime.datetime(2026, 1, 5, 7, 59, 50)
+
+def worker(workdir: str, name: str, t0: float, die_after: float):
+    sch.now_local = lambda: BASE + datetime.timedelta(seconds=(time.time() - t0) * SPEED)
+    sch.MAX_SLEEP = 0.1
+    store = SQLiteReminderStore(os.path.join(workdir, "reminders.db"))
+    out = open(os.path.join(workdir, f"{name}.log"), "a", buffering=1)
+
+    def send(chat_id, text, meta):
+        out.write(f"{meta['reminder_id']} {meta['step']}\n")
+
+    lease = LeaseManager(os.path.join(workdir, "leases.db"), shards=8, lease_seconds=3.0, worker_id=name)
+    s = sch.ReminderScheduler(send, store=store, resync_interval=0, misfire_grace=600, lease=lease)
+    s.poll_interval = 0.2
+    s.start()
+    end = t0 + RUN_SECONDS
+    while time.time() < end:
+        time.sleep(0.1)
+        if die_after and time.time() - t0 > die_after:
+            os._exit(1)  # chết đột ngột: không trả lease, không flush
+    s.stop()
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        store = SQLiteReminderStore(os.path.join(workdir, "reminders.db"))
+        store.add_many([{"id": f"r{i}", "time": "08:00", "date": None, "repeat": "daily",
+                         "chat_id": f"c{i}", "text": "uống thuốc"} for i in range(N)])
+        store.close()
+        t0 = time.time()
+        procs = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", workdir, name,
+                                   str(t0), str(DIE_AFTER.get(name, 0))]) for name in WORKERS]
+        for p in procs:
+            p.wait()
+        sends, per_worker = collections.Counter(), {}
+        for path in sorted(glob.glob(os.path.join(workdir, "*.log"))):
+            with open(path) as f:
+                lines = [line.strip() for line in f if line.strip()]
+            per_worker[os.path.basename(path)[:-4]] = len(lines)
+            sends.update(lines)
+        dups = sum(1 for v in sends.values() if v > 1)
+        steps = collections.Counter(k.split()[1] for k in sends)
+        print(f"{N} nhắc nhở × 3 bước, {len(WORKERS)} worker (w1 chết lúc {DIE_AFTER['w1']:.0f} s), "
+              f"{time.time() - t0:.1f} s")
+        print(f"  gửi theo worker: {per_worker}")
+        print(f"  theo bước: {dict(sorted(steps.items()))}   tổng {sum(sends.values())}, trùng {dups}")
+        assert sum(sends.values()) == 3 * N and dups == 0, "không đúng một lần mỗi bước"
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(sys.argv[2], sys.argv[3], float(sys.argv[4]), float(sys.argv[5]))
+    else:
+        main()
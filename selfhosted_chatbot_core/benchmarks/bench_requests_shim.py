@@ -0,0 +1,163 @@
+"""utils.requests_shim (http.client + keep-alive) so với cách cũ (urllib.request.urlopen mỗi lần gọi)
+và requests.Session (nếu đã cài), trên server HTTP/1.1 cục bộ trả JSON (gzip nếu client xin).
+
+Kiểm tra: gzip được giải nén, JSON/POST form/params đúng, timeout → ReadTimeout, 503 + Retry → thử lại,
+raise_for_status → HTTPError, server đóng kết nối rảnh → tự mở lại. Đo: request/giây tuần tự và
+8 thread dùng chung một Session, số kết nối TCP server phải mở.
+Với https, mỗi kết nối mới còn tốn thêm một lần bắt tay TLS (vài chục tới vài trăm ms qua Internet),
+nên chênh lệch thật lớn hơn số đo cục bộ này.
+
+Chạy từ thư mục gốc dự án:  python benchmarks/bench_requests_shim.py
+"""
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.requests_shim import Retry, requests as shim  # noqa: E402
+
+try:
+    import requests as real_requests
+except ModuleNotFoundError:
+    real_requests = None
+
+N = 1000
+THREADS = 8
+PAYLOAD = {"ok": True, "result": [{"update_id": i, "message": {"text": "xin chào " * 8}} for i in range(20)]}
+
+class Server:
+    def __init__(self):
+        self.connections = 0
+        self.flaky = 0  # còn bao nhiêu lần trả 503 trước khi trả 200
+        srv = self
+
+        class H(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                srv.connections += 1
+
+            def log_message(self, *a):
+                pass
+
+            def _reply(self, status, data, headers=None):
+                raw = json.dumps(data).encode()
+                gz = "gzip" in self.headers.get("Accept-Encoding", "")
+                if gz:
+                    raw = gzip.compress(raw)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                if gz:
+                    self.send_header("Content-Encoding", "gzip")
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                try:
+                    self.wfile.write(raw)
+                except BrokenPipeError:
+                    pass  # client đã bỏ đi (kiểm tra timeout)
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                q = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+                if parts.path == "/slow":
+                    time.sleep(float(q.get("s", 1)))
+                if parts.path == "/flaky" and srv.flaky > 0:
+                    srv.flaky -= 1
+                    return self._reply(503, {"ok": False}, {"Retry-After": "0"})
+                if parts.path == "/missing":
+                    return self._reply(404, {"ok": False})
+                if parts.path == "/close":
+                    self.close_connection = True
+                self._reply(200, dict(PAYLOAD, query=q))
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                ctype = self.headers.get("Content-Type", "")
+                data = json.loads(body) if "json" in ctype else {k: v[-1] for k, v in parse_qs(body.decode()).items()}
+                self._reply(200, {"ok": True, "echo": data})
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), H)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+def _urlopen_get(url):
+    # Cách cũ của shim: một kết nối mới cho mỗi lần gọi
+    with urllib.request.urlopen(urllib.request.Request(url), timeout=10) as r:
+        return json.loads(r.read().decode("utf-8"))
+
+def _check(srv):
+    s = shim.Session()
+    r = s.get(srv.base + "/x", params={"offset": 5, "allowed_updates": '["message"]'}, timeout=5)
+    assert r.headers.get("content-encoding") == "gzip" and r.json()["result"] == PAYLOAD["result"]
+    assert r.json()["query"] == {"offset": "5", "allowed_updates": '["message"]'}
+    assert s.post(srv.base + "/p", json={"chat_id": 1, "text": "chào"}, timeout=5).json()["echo"]["text"] == "chào"
+    assert s.post(srv.base + "/p", data={"batch": "[1]"}, timeout=5).json()["echo"] == {"batch": "[1]"}
+    try:
+        s.get(srv.base + "/slow?s=0.5", timeout=0.1)
+        raise AssertionError("phải timeout")
+    except shim.exceptions.Timeout as e:
+        assert isinstance(e, shim.exceptions.ReadTimeout)
+    try:
+        s.get(srv.base + "/missing", timeout=5).raise_for_status()
+        raise AssertionError("phải HTTPError")
+    except shim.exceptions.HTTPError as e:
+        assert e.response.status_code == 404
+    retrying = shim.Session()
+    retrying.mount("http://", shim.adapters.HTTPAdapter(max_retries=Retry(total=3, status_forcelist=[503],
+                                                                          raise_on_status=False)))
+    srv.flaky = 2
+    assert retrying.get(srv.base + "/flaky", timeout=5).status_code == 200
+    for _ in range(3):  # server đóng kết nối sau mỗi response → lần sau tự mở mới
+        assert s.get(srv.base + "/close", timeout=5).status_code == 200
+    try:
+        shim.get("http://127.0.0.1:9/", timeout=1)
+        raise AssertionError("phải ConnectionError")
+    except shim.exceptions.ConnectionError:
+        pass
+    print("gzip, params/json/form, ReadTimeout, HTTPError, Retry 503, kết nối bị đóng, ConnectionError: OK")
+
+def _bench(srv, label, get):
+    url = srv.base + "/bot/getUpdates"
+    before = srv.connections
+    t = time.perf_counter()
+    for _ in range(N):
+        get(url)
+    seq = N / (time.perf_counter() - t)
+    t = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(lambda _: get(url), range(N)))
+    par = N / (time.perf_counter() - t)
+    print(f"  {label:<26} {seq:7,.0f} req/s tuần tự   {par:7,.0f} req/s {THREADS} thread   "
+          f"{srv.connections - before:5d} kết nối")
+
+def main():
+    srv = Server()
+    _check(srv)
+    print(f"{N} GET (JSON ~{len(json.dumps(PAYLOAD)) // 1024} KB) mỗi cách:")
+    _bench(srv, "urlopen mỗi lần (cũ)", _urlopen_get)
+    session = shim.Session()
+    session.mount("http://", shim.adapters.HTTPAdapter(pool_maxsize=THREADS))
+    _bench(srv, "requests_shim.Session", lambda u: session.get(u, timeout=10).json())
+    _bench(srv, "requests_shim.get", lambda u: shim.get(u, timeout=10).json())
+    if real_requests is not None:
+        rs = real_requests.Session()
+        rs.mount("http://", real_requests.adapters.HTTPAdapter(pool_maxsize=THREADS))
+        _bench(srv, "requests.Session", lambda u: rs.get(u, timeout=10).json())
+    else:
+        print("  (requests chưa cài — bỏ qua so sánh)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Micro-benchmark: utils.textnorm.normalize so với _normalize cũ (NFD + lọc Mn theo từng ký tự).
+
+Chạy từ thư mục gốc dự án:  python benchmarks/bench_textnorm.py
+"""
+import os
+import re
+import sys
+import timeit
+import unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import textnorm  # noqa: E402
+
+def _legacy_normalize(s: str) -> str:
+    s = (s or "").lower().strip()
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+    s = re.sub(r"\s+", " ", s)
+    return s
+
+SHORT = ["chào", "giá", "Xin chào", "hỗ trợ", "báo giá", "hello", "cảm ơn", "đặt hàng"]
+LONG = ("Cho mình hỏi giá sản phẩm này bao nhiêu vậy ạ, có giao hàng tận nơi ở Đà Nẵng "
+        "không, mình muốn đặt 2 cái màu đỏ size L. Cảm ơn shop nhiều!")
+
+def _bench(label, fn, inputs, number):
+    t = timeit.timeit(lambda: [fn(x) for x in inputs], number=number)
+    per_call = t / (number * len(inputs)) * 1e6
+    print(f"  {label:<24} {per_call:7.2f} us/call")
+    return per_call
+
+def main():
+    # Kết quả phải khớp bản cũ, trừ đ/Đ (bản cũ bỏ sót) giờ thành d
+    for s in SHORT + [LONG, "  Đường   ĐI  ", "Tiếng Việt có dấu: ạ ằ ẫ ệ ỗ ử ỹ"]:
+        assert textnorm.normalize(s) == _legacy_normalize(s).replace("đ", "d"), s
+
+    print("short inputs (lặp lại, trúng cache):")
+    old = _bench("legacy _normalize", _legacy_normalize, SHORT, 20000)
+    new = _bench("textnorm.normalize", textnorm.normalize, SHORT, 20000)
+    print(f"  speedup x{old / new:.1f}")
+
+    print("long input (không cache, 1 lượt translate):")
+    old = _bench("legacy _normalize", _legacy_normalize, [LONG], 20000)
+    new = _bench("textnorm.normalize", textnorm.normalize, [LONG], 20000)
+    print(f"  speedup x{old / new:.1f}")
+    print(textnorm.cache_info())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Chạy TelegramWebhookConnector cục bộ (không cần Telegram) và POST các update đã ghi lại.
+
+Kiểm tra: sai secret → 401, update trùng → bỏ qua, hàng đợi đầy → 429 rồi gửi lại được nhận.
+Đo: độ trễ từ lúc POST tới lúc vòng lặp bot lấy được tin, và số update/giây khi 8 kết nối gửi song song.
+So sánh: chế độ polling chờ thêm trung bình poll_interval_seconds/2 (mặc định 1.5 s) mỗi tin.
+
+Chạy từ thư mục gốc dự án:
+    python benchmarks/bench_webhook_ingest.py [updates.json|updates.jsonl]
+File update: danh sách JSON hoặc mỗi dòng một update (như `result` của getUpdates).
+"""
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connectors.telegram_connector import SECRET_HEADER, TelegramWebhookConnector  # noqa: E402
+
+SECRET = "bench-secret"
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = f.read()
+    data = data.strip()
+    if data.startswith("["):
+        return json.loads(data)
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+def _synthetic(n, start=1000):
+    texts = ["chào shop", "giá bao nhiêu", "nhắc tôi 7h uống nước", "ship mấy ngày?", "cảm ơn"]
+    return [{"update_id": start + i,
+             "message": {"message_id": i, "date": 1760000000 + i, "text": texts[i % len(texts)],
+                         "chat": {"id": 100 + i % 50, "type": "private"}, "from": {"id": 100 + i % 50}}}
+            for i in range(n)]
+
+def _post(conn, path, upd, secret=SECRET):
+    body = json.dumps(upd).encode("utf-8")
+    conn.request("POST", path, body=body, headers={SECRET_HEADER: secret, "Content-Type": "application/json"})
+    r = conn.getresponse()
+    r.read()
+    return r.status
+
+def main():
+    updates = _load(sys.argv[1]) if len(sys.argv) > 1 else _synthetic(4000)
+    tg = TelegramWebhookConnector("TOKEN", SECRET, host="127.0.0.1", port=0, queue_size=256)
+    tg.start()
+    host, port = tg.server.address
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    path = tg.path
+
+    # --- đúng/sai ---
+    assert _post(conn, path, updates[0], secret="wrong") == 401
+    assert _post(conn, path, updates[0]) == 200
+    assert _post(conn, path, updates[0]) == 200  # gửi lại → bỏ qua
+    assert len(tg.get_new_messages()) == 1 and tg.counters["duplicates"] == 1
+    # Không ai lấy tin → đầy hàng đợi → 429; lấy bớt rồi gửi lại thì được nhận
+    statuses = [_post(conn, path, u) for u in updates[1:tg.queue.maxsize + 2]]
+    assert statuses[-1] == 429, statuses[-3:]
+    tg.get_new_messages()
+    assert _post(conn, path, updates[tg.queue.maxsize + 1]) == 200
+    while tg.get_new_messages():
+        pass
+    print("401 sai secret, bỏ update trùng, 429 khi đầy + nhận lại khi gửi lại: OK")
+
+    # --- độ trễ + thông lượng ---
+    # Mỗi tin mang "#update_id" ở cuối để tra thời điểm gửi
+    rest = [dict(u, update_id=u["update_id"] + 10_000_000) for u in updates]
+    for u in rest:
+        u["message"] = dict(u["message"], text=f'{u["message"].get("text", "")}#{u["update_id"]}')
+    sent_at = {}
+    lat = []
+    done = threading.Event()
+
+    def consume():
+        got = 0
+        while got < len(rest):
+            for m in tg.get_new_messages():
+                lat.append(time.perf_counter() - sent_at[int(m.text.rsplit("#", 1)[1])])
+                got += 1
+        done.set()
+
+    threading.Thread(target=consume, daemon=True).start()
+    senders = 8
+    chunks = [rest[i::senders] for i in range(senders)]
+
+    def send(chunk):
+        c = http.client.HTTPConnection(host, port, timeout=10)
+        for u in chunk:
+            sent_at[u["update_id"]] = time.perf_counter()
+            while _post(c, path, u) == 429:
+                time.sleep(0.005)
+        c.close()
+
+    t = time.perf_counter()
+    threads = [threading.Thread(target=send, args=(ch,)) for ch in chunks]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    done.wait(30)
+    elapsed = time.perf_counter() - t
+    lat.sort()
+    print(f"{len(rest)} update qua {senders} kết nối: {len(rest) / elapsed:,.0f} update/s")
+    print(f"  độ trễ POST → vòng lặp bot: p50 {lat[len(lat) // 2] * 1000:.2f} ms, "
+          f"p95 {lat[int(len(lat) * 0.95)] * 1000:.2f} ms, max {lat[-1] * 1000:.2f} ms")
+    print(f"  (polling: + trung bình {3 / 2:.1f} s ngủ mỗi vòng với poll_interval_seconds=3)")
+    print(f"  {tg.stats()}")
+    tg.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import os
 import json
 import time
+import asyncio
+from collections import deque
 
 # APScheduler là tùy chọn — để chạy không cần lib ngoài
 try:
@@ -8,73 +10,199 @@ try:
 except Exception:
     BackgroundScheduler = None
 
-from utils.logger import setup_logger
+from utils.logger import logger_stats, setup_logger, shutdown_logger
+from utils.hot_reload import HotReloader
+from utils.config_cache import load_cached, freeze
+from utils.worker_pool import ShardedWorkerPool
+from utils.async_http import AsyncHTTPClient
+from utils.runtime_status import StatusPublisher
+from utils import metrics
 from bot_logic import BotLogic
 from connectors.base import BaseConnector
-from connectors.mock_connector import MockConnector
-from connectors.telegram_connector import TelegramConnector
+from connectors.mock_connector import MockConnector, AsyncMockConnector
+from connectors.telegram_connector import TelegramConnector, TelegramPrefetchConnector, TelegramWebhookConnector
 from connectors.facebook_graph_api import FacebookGraphAPIConnector
-from ai.gemini_client import generate as gemini_generate  # ✨ thêm Gemini client
+from connectors.async_base import AsyncBaseConnector, SyncConnectorAdapter
+from connectors.async_telegram_connector import AsyncTelegramConnector
+from ai.gateway import AIGateway  # ✨ Gemini client + cache, gộp request, breaker...
+from ai.conversation import ConversationStore
+from ai.gemini_client import is_error_reply
 
 BASE_DIR = os.path.dirname(__file__)
 CONFIG_DIR = os.path.join(BASE_DIR, "config")
 LOG = setup_logger("bot")
 
+# Thời gian từng bước của một tin nhắn (web UI xuất ở /metrics dạng Prometheus)
+STAGE_SECONDS = metrics.histogram("chatbot_stage_seconds", "Thời gian từng bước xử lý tin nhắn (giây)",
+                                  ("stage", "connector"))
+REPLY_SECONDS = metrics.histogram("chatbot_reply_seconds", "Từ lúc bắt đầu xử lý tới khi gửi xong câu trả lời (giây)",
+                                  ("connector", "decision"))
+MESSAGES = metrics.counter("chatbot_messages_total", "Số tin nhắn đã trả lời", ("connector", "decision"))
+ERRORS = metrics.counter("chatbot_errors_total", "Số tin nhắn xử lý lỗi", ("connector",))
+
 def load_json(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-# ✨ helper lấy config AI
+_ai_config_memo = (None, None, None)
+
+# ✨ helper lấy config AI (snapshot từ config cache → không đọc file mỗi tin nhắn)
 def get_ai_config():
-    settings = load_json(os.path.join(CONFIG_DIR, "settings.json"))
-    creds = load_json(os.path.join(CONFIG_DIR, "credentials.json"))
+    global _ai_config_memo
+    settings = load_cached(os.path.join(CONFIG_DIR, "settings.json"))
+    creds = load_cached(os.path.join(CONFIG_DIR, "credentials.json"))
+    if _ai_config_memo[0] is settings and _ai_config_memo[1] is creds:
+        return _ai_config_memo[2]
     ai = settings.get("ai", {})
-    return {
+    cfg = freeze({
         "enabled": ai.get("enabled", True),
         "provider": ai.get("provider", "gemini"),
         "model": ai.get("model", "gemini-1.5-flash-latest"),
         "api_url": ai.get("api_url", "https://generativelanguage.googleapis.com/v1beta/models"),
         "api_key": creds.get("gemini", {}).get("api_key", ""),
+        "stream": ai.get("stream", False),
         "system_prompt": ai.get("system_prompt", "Bạn là trợ lý thân thiện. Trả lời ngắn gọn, rõ ràng, tiếng Việt.")
-    }
+    })
+    _ai_config_memo = (settings, creds, cfg)
+    return cfg
 
 def make_connector(settings, credentials) -> BaseConnector:
     choice = settings.get("connector", "mock").lower()
     if choice == "telegram":
-        token = credentials.get("telegram", {}).get("bot_token", "")
-        return TelegramConnector(token)
+        tg = credentials.get("telegram", {})
+        tg_settings = settings.get("telegram", {})
+        if tg_settings.get("mode", "polling") == "webhook":
+            wh = tg_settings.get("webhook", {})
+            conn = TelegramWebhookConnector(
+                tg.get("bot_token", ""), tg.get("webhook_secret", ""),
+                host=wh.get("host", "0.0.0.0"), port=int(wh.get("port", 8443)),
+                path=wh.get("path", "/telegram/webhook"), public_url=wh.get("public_url", ""),
+                queue_size=int(wh.get("queue_size", 1000)), max_connections=int(wh.get("max_connections", 40)),
+                logger=LOG)
+        elif tg_settings.get("polling", {}).get("prefetch", False):
+            polling = tg_settings["polling"]
+            conn = TelegramPrefetchConnector(
+                tg.get("bot_token", ""), queue_size=int(polling.get("queue_size", 1000)),
+                limit=int(polling.get("limit", 100)), logger=LOG)
+        else:
+            conn = TelegramConnector(tg.get("bot_token", ""))
+        out = tg_settings.get("outbound", {})
+        if out.get("enabled", False):
+            conn.enable_outbound(
+                rate=float(out.get("rate_per_second", 30)), per_chat_rate=float(out.get("per_chat_per_second", 1)),
+                per_chat_burst=float(out.get("per_chat_burst", 3)), workers=int(out.get("workers", 8)),
+                max_depth=int(out.get("max_queue", 10000)), max_attempts=int(out.get("max_attempts", 5)),
+                logger=LOG)
+        return conn
     elif choice == "facebook_graph_api":
         fb = credentials.get("facebook_graph_api", {})
-        return FacebookGraphAPIConnector(fb.get("page_access_token",""), fb.get("page_id",""))
+        fb_settings = settings.get("facebook", {})
+        wh = fb_settings.get("webhook", {})
+        return FacebookGraphAPIConnector(
+            fb.get("page_access_token", ""), fb.get("page_id", ""),
+            app_secret=fb.get("app_secret", ""), verify_token=fb.get("verify_token", ""),
+            host=wh.get("host", "0.0.0.0"), port=int(wh.get("port", 8444)), path=wh.get("path", "/facebook/webhook"),
+            queue_size=int(wh.get("queue_size", 1000)), send_batch_size=int(fb_settings.get("send_batch_size", 50)),
+            graph_base=fb_settings.get("graph_base", "https://graph.facebook.com"),
+            api_version=fb_settings.get("api_version", "v20.0"), logger=LOG)
     else:
         return MockConnector()
 
+def make_async_connector(settings, credentials, sync_connector: BaseConnector) -> AsyncBaseConnector:
+    choice = settings.get("connector", "mock").lower()
+    # blocking (webhook/prefetch) hoặc có hàng đợi gửi → giữ bản đồng bộ để dùng chung hàng đợi
+    if choice == "telegram" and not sync_connector.blocking and getattr(sync_connector, "outbound", None) is None:
+        token = credentials.get("telegram", {}).get("bot_token", "")
+        return AsyncTelegramConnector(token)
+    elif choice == "mock":
+        return AsyncMockConnector()
+    # Connector chưa có bản async → chạy bản đồng bộ trong thread pool
+    return SyncConnectorAdapter(sync_connector)
+
 class BotRunner:
     def __init__(self):
         self.settings = load_json(os.path.join(CONFIG_DIR, "settings.json"))
+        # Cấu hình lại LOG theo settings (ghi log ở thread riêng, xoay vòng file, JSON lines)
+        setup_logger("bot", self.settings.get("logging_level", "INFO"), self.settings.get("logging", {}))
         self.replies = load_json(os.path.join(CONFIG_DIR, "replies.json"))
         self.logic = BotLogic(self.replies)
+        # Sửa replies.json (qua web UI) có hiệu lực không cần restart
+        reload_every = float(self.settings.get("replies_reload_interval_seconds", 2))
+        self.replies_reloader = HotReloader(
+            os.path.join(CONFIG_DIR, "replies.json"),
+            build=BotLogic,
+            on_swap=self._swap_logic,
+            interval=reload_every,
+            logger=LOG,
+        ) if reload_every > 0 else None
         self.connector = make_connector(self.settings, load_json(os.path.join(CONFIG_DIR, "credentials.json")))
+        self.ai = AIGateway.from_settings(self.settings.get("ai", {}), BASE_DIR)
+        # Số liệu vận hành cho dashboard (web UI chạy process riêng)
+        self.status = StatusPublisher(interval=float(self.settings.get("status_interval_seconds", 5)), logger=LOG)
+        self.status.register("ai", self.ai.stats)
+        self.status.register("logging", lambda: logger_stats("bot"))
+        self.status.register("metrics", metrics.snapshot)
+        # Ngữ cảnh hội thoại cho AI (chỉ các lượt hỏi-đáp với AI, không gồm kịch bản)
+        memory_cfg = self.settings.get("ai", {}).get("memory", {})
+        self.memory = ConversationStore.from_config(memory_cfg)
+        self.memory_token_budget = int(memory_cfg.get("token_budget", 2000))
+        if self.memory is not None:
+            self.status.register("memory", self.memory.stats)
         # Scheduler là tùy chọn
         self.scheduler = BackgroundScheduler() if BackgroundScheduler else None
+        self.pool = self._make_pool()
         self._stop = False
 
+    def _make_pool(self):
+        # workers > 1: xử lý song song theo chat (giữ thứ tự trong từng chat)
+        workers = int(self.settings.get("workers", 1))
+        if workers <= 1:
+            return None
+        return ShardedWorkerPool(
+            workers,
+            queue_size=int(self.settings.get("worker_queue_size", 100)),
+            name="msg-worker",
+            logger=LOG,
+        )
+
+    def _swap_logic(self, logic: BotLogic):
+        # Gán thuộc tính là nguyên tử → vòng lặp luôn thấy bản cũ hoặc bản mới hoàn chỉnh
+        self.logic = logic
+        LOG.info(f"♻️ Đã nạp lại replies.json ({len(logic.intents)} intents)")
+
     def start(self):
         LOG.info("🚀 Bot khởi động...")
-        if self.connector.health_check():
+        self._report_health(self.connector.health_check())
+        self._start_background()
+        self.loop()
+
+    def _report_health(self, ok: bool):
+        if ok:
             LOG.info(f"✅ Connector '{self.connector.name}' sẵn sàng.")
         else:
             LOG.warning(f"⚠️ Connector '{self.connector.name}' chưa sẵn sàng. Vẫn tiếp tục và thử lại...")
 
+    def _start_background(self):
+        self.connector.start()
+        if hasattr(self.connector, "stats"):
+            self.status.register("connector", self.connector.stats)
+        if getattr(self.connector, "outbound", None) is not None:
+            self.status.register("outbound", self.connector.outbound.stats)
         # Khởi động Reminder Scheduler cho Telegram (nếu dùng Telegram)
         if isinstance(self.connector, TelegramConnector):
             try:
                 # import tuyệt đối để phù hợp cách chạy `py bot.py`
                 from connectors.telegram_connector import start_reminder_scheduler
-                start_reminder_scheduler()
+                reminder_scheduler = start_reminder_scheduler(self.connector)
+                if reminder_scheduler is not None:
+                    self.status.register("reminders", reminder_scheduler.stats)
             except Exception as _e:
                 LOG.warning(f"[bot] Không thể start reminder scheduler: {_e}")
 
+        if self.replies_reloader:
+            self.replies_reloader.start()
+        self.status.start()
+
         # Canary job (nếu có APScheduler)
         if self.settings.get("canary_enabled", True) and self.scheduler:
             interval = int(self.settings.get("canary_interval_minutes", 10))
@@ -83,50 +211,123 @@ class BotRunner:
         elif not BackgroundScheduler:
             LOG.info("[bot] APScheduler không có — bỏ qua các job APScheduler.")
 
-        self.loop()
-
     def stop(self):
         self._stop = True
+        if isinstance(self.connector, TelegramConnector):
+            try:
+                # Trước connector.close(): tin nhắc đang gửi còn dùng connector; stop() flush kho nhắc nhở
+                from connectors.telegram_connector import stop_reminder_scheduler
+                stop_reminder_scheduler()
+            except Exception as e:
+                LOG.warning(f"[bot] Lỗi khi dừng reminder scheduler: {e}")
+        try:
+            self.connector.close()
+        except Exception as e:
+            LOG.warning(f"[bot] Lỗi khi dừng connector: {e}")
+        if self.replies_reloader:
+            self.replies_reloader.stop()
+        if self.pool:
+            # Trả lời nốt các tin đã nhận trước khi dừng
+            self.pool.stop(drain=True)
+        self.ai.close()
+        self.status.stop()
         if self.scheduler:
             try:
                 self.scheduler.shutdown(wait=False)
             except Exception:
                 pass
         LOG.info("🛑 Dừng bot.")
+        shutdown_logger("bot")
 
     def loop(self):
         poll = int(self.settings.get("poll_interval_seconds", 3))
         while not self._stop:
             try:
+                t = time.perf_counter()
                 msgs = self.connector.get_new_messages()
+                if not self.connector.blocking:
+                    # Connector blocking chờ tin trong get_new_messages → thời gian đó là lúc rảnh, không đo
+                    self._observe("poll", t)
                 for m in msgs:
-                    LOG.info(f"💬 Tin nhắn mới từ {m.sender_id} ({m.thread_id}): {m.text}")
-
-                    # ✨ Kịch bản trước → fallback Gemini
-                    scenario_reply = getattr(self.logic, "find_match", self.logic.make_reply)(m.text)
-                    if scenario_reply is not None:
-                        reply = scenario_reply
-                        LOG.debug(f"Decision: SCENARIO -> {reply!r}")
+                    if self.pool:
+                        # Cùng thread_id → cùng worker → giữ thứ tự; hàng đợi đầy thì chờ ở đây
+                        self.pool.submit(m.thread_id, self.handle_message, m)
                     else:
-                        ai_cfg = get_ai_config()
-                        if ai_cfg.get("enabled"):
-                            LOG.debug(f"Decision: GEMINI with prompt={m.text!r}")
-                            reply = gemini_generate(
-                                prompt=m.text or "",
-                                api_url=ai_cfg["api_url"],
-                                model=ai_cfg["model"],
-                                api_key=ai_cfg["api_key"],
-                                system_prompt=ai_cfg.get("system_prompt","")
-                            )
-                        else:
-                            reply = self.logic.fallback
-                            LOG.debug("Decision: FALLBACK")
-
-                    self.connector.send_message(m.thread_id, reply)
-                    LOG.info(f"📤 Đã trả lời {m.thread_id}: {reply}")
+                        self.handle_message(m)
             except Exception as e:
-                LOG.exception(f"Lỗi vòng lặp: {e}")
-            time.sleep(poll)
+                LOG.exception("Lỗi vòng lặp: %s", e)
+            if not self.connector.blocking:
+                time.sleep(poll)
+
+    def handle_message(self, m):
+        started = time.monotonic()
+        try:
+            # %-format lười: chỉ định dạng khi bản ghi thật sự được ghi (ở thread ghi log nếu async)
+            LOG.info("💬 Tin nhắn mới từ %s (%s): %s", m.sender_id, m.thread_id, m.text,
+                     extra={"chat_id": m.thread_id, "stage": "inbound"})
+            t = time.perf_counter()
+            reply, ai_cfg, decision = self._route(m)
+            t = self._observe("route", t)
+            if reply is None and ai_cfg.get("stream"):
+                # Hiện từng phần câu trả lời ngay khi Gemini trả về (connector hỗ trợ sửa tin)
+                stream = self.ai.answer_stream(m.text or "", ai_cfg, fallback=self.logic.fallback,
+                                               history=self._history(m))
+                reply = self.connector.send_stream(m.thread_id, stream)
+                self._observe("ai_stream", t)  # gọi AI và gửi đan xen nhau
+                if stream.complete:
+                    # Câu trả lời đứt giữa chừng (lỗi upstream sau vài đoạn) không vào ngữ cảnh hội thoại
+                    self._remember(m, reply)
+            else:
+                if reply is None:
+                    reply = self.ai.answer(m.text or "", ai_cfg, fallback=self.logic.fallback,
+                                           history=self._history(m))
+                    t = self._observe("ai", t)
+                    self._remember(m, reply)
+                self.connector.send_message(m.thread_id, reply)
+                self._observe("send", t)
+            self._replied(m, reply, decision, started)
+        except Exception as e:
+            ERRORS.inc(self.connector.name)
+            LOG.exception("Lỗi xử lý tin nhắn từ %s: %s", m.thread_id, e,
+                          extra={"chat_id": m.thread_id, "stage": "error"})
+
+    def _observe(self, stage, since):
+        now = time.perf_counter()
+        STAGE_SECONDS.observe(now - since, stage, self.connector.name)
+        return now
+
+    def _replied(self, m, reply, decision, started):
+        elapsed = time.monotonic() - started
+        REPLY_SECONDS.observe(elapsed, self.connector.name, decision)
+        MESSAGES.inc(self.connector.name, decision)
+        LOG.info("📤 Đã trả lời %s: %s", m.thread_id, reply,
+                 extra={"chat_id": m.thread_id, "stage": "reply", "latency_ms": round(elapsed * 1000, 1)})
+
+    def _route(self, m):
+        """Kịch bản trước → fallback Gemini. Trả về (reply, None, decision) hoặc (None, ai_cfg, "GEMINI")
+        nếu cần gọi AI; decision: "SCENARIO" | "GEMINI" | "FALLBACK"."""
+        logic = self.logic  # chụp một lần: có thể bị hot-reload thay giữa chừng
+        scenario_reply = getattr(logic, "find_match", logic.make_reply)(m.text)
+        if scenario_reply is not None:
+            LOG.debug("Decision: SCENARIO -> %r", scenario_reply, extra={"chat_id": m.thread_id, "stage": "route"})
+            return scenario_reply, None, "SCENARIO"
+        ai_cfg = get_ai_config()
+        if ai_cfg.get("enabled"):
+            LOG.debug("Decision: GEMINI with prompt=%r", m.text, extra={"chat_id": m.thread_id, "stage": "route"})
+            return None, ai_cfg, "GEMINI"
+        LOG.debug("Decision: FALLBACK", extra={"chat_id": m.thread_id, "stage": "route"})
+        return logic.fallback, None, "FALLBACK"
+
+    def _history(self, m):
+        if self.memory is None:
+            return None
+        return self.memory.history(m.thread_id, self.memory_token_budget)
+
+    def _remember(self, m, reply):
+        # Không lưu chuỗi lỗi / câu fallback: chúng không phải câu trả lời thật của AI
+        if self.memory is None or not m.text or is_error_reply(reply) or reply == self.logic.fallback:
+            return
+        self.memory.add_exchange(m.thread_id, m.text, reply)
 
     def run_canary(self):
         try:
@@ -135,5 +336,110 @@ class BotRunner:
         except Exception as e:
             LOG.exception(f"Health-check exception: {e}")
 
+class AsyncBotRunner(BotRunner):
+    """Runtime asyncio: một thread, hàng nghìn lượt gửi/gọi AI đang chờ cùng lúc.
+
+    Tin nhắn trong cùng một chat vẫn xử lý tuần tự; các chat khác nhau chạy đồng thời.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.aconnector = make_async_connector(
+            self.settings, load_json(os.path.join(CONFIG_DIR, "credentials.json")), self.connector)
+        self.max_inflight = int(self.settings.get("async_max_inflight", 1000))
+        self.http = None
+        self._chats = {}
+        self._tasks = set()
+
+    def _make_pool(self):
+        return None
+
+    def start(self):
+        LOG.info("🚀 Bot khởi động (asyncio)...")
+        asyncio.run(self._amain())
+
+    async def _amain(self):
+        self.http = AsyncHTTPClient(max_per_host=self.max_inflight)
+        self._inflight = asyncio.Semaphore(self.max_inflight)
+        try:
+            self._report_health(await self.aconnector.health_check())
+            self._start_background()
+            await self.aloop()
+        finally:
+            # Trả lời nốt các tin đã nhận trước khi thoát
+            if self._tasks:
+                await asyncio.wait(self._tasks, timeout=30)
+            await self.aconnector.close()
+            await self.http.close()
+
+    async def aloop(self):
+        poll = int(self.settings.get("poll_interval_seconds", 3))
+        while not self._stop:
+            try:
+                t = time.perf_counter()
+                msgs = await self.aconnector.get_new_messages()
+                if not self.aconnector.blocking:
+                    self._observe("poll", t)
+                for m in msgs:
+                    # Quá nhiều tin đang xử lý → chờ ở đây (backpressure)
+                    await self._inflight.acquire()
+                    self._dispatch(m)
+            except Exception as e:
+                LOG.exception("Lỗi vòng lặp: %s", e)
+            if not self.aconnector.blocking:
+                await asyncio.sleep(poll)
+
+    def _dispatch(self, m):
+        q = self._chats.get(m.thread_id)
+        if q is not None:
+            q.append(m)
+            return
+        q = self._chats[m.thread_id] = deque([m])
+        task = asyncio.create_task(self._drain_chat(m.thread_id, q))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain_chat(self, thread_id, q):
+        try:
+            while q:
+                m = q.popleft()
+                try:
+                    await self.ahandle_message(m)
+                finally:
+                    self._inflight.release()
+        finally:
+            self._chats.pop(thread_id, None)
+
+    async def ahandle_message(self, m):
+        started = time.monotonic()
+        try:
+            LOG.info("💬 Tin nhắn mới từ %s (%s): %s", m.sender_id, m.thread_id, m.text,
+                     extra={"chat_id": m.thread_id, "stage": "inbound"})
+            t = time.perf_counter()
+            reply, ai_cfg, decision = self._route(m)
+            t = self._observe("route", t)
+            if reply is None:
+                reply = await self.ai.aanswer(m.text or "", ai_cfg, self.http, fallback=self.logic.fallback,
+                                              history=self._history(m))
+                t = self._observe("ai", t)
+                self._remember(m, reply)
+            await self.aconnector.send_message(m.thread_id, reply)
+            self._observe("send", t)
+            self._replied(m, reply, decision, started)
+        except Exception as e:
+            ERRORS.inc(self.connector.name)
+            LOG.exception("Lỗi xử lý tin nhắn từ %s: %s", m.thread_id, e,
+                          extra={"chat_id": m.thread_id, "stage": "error"})
+
+def make_runner() -> BotRunner:
+    settings = load_json(os.path.join(CONFIG_DIR, "settings.json"))
+    if settings.get("runtime", "threads").lower() == "async":
+        return AsyncBotRunner()
+    return BotRunner()
+
 if __name__ == "__main__":
-    BotRunner().start()
+    runner = make_runner()
+    try:
+        runner.start()
+    except KeyboardInterrupt:
+        runner.stop()
@@ -1,33 +1,68 @@
 import re
-import unicodedata
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, FrozenSet, Tuple
 
-def _normalize(s: str) -> str:
-    s = (s or "").lower().strip()
-    s = unicodedata.normalize("NFD", s)
-    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")  # bỏ dấu
-    s = re.sub(r"\s+", " ", s)
-    return s
+from utils.textnorm import normalize as _normalize  # bỏ dấu (kể cả đ → d), có cache
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
 
 def _tokenize(s: str) -> set:
-    return set(re.findall(r"[a-z0-9]+", _normalize(s)))
+    return set(_TOKEN_RE.findall(_normalize(s)))
+
+class _CompiledMatcher:
+    """Chỉ mục ngược token -> keyword, dựng một lần từ danh sách intents.
+
+    Mỗi keyword được đánh chỉ mục dưới token hiếm nhất của nó, nên khi so khớp
+    chỉ cần kiểm tra subset trên các keyword ứng viên chứa ít nhất một token của tin nhắn.
+    """
+    def __init__(self, intents: List[Dict[str, Any]]):
+        # (intent_idx, kw_tokens) theo thứ tự khai báo
+        self._entries: List[Tuple[int, FrozenSet[str]]] = []
+        for idx, intent in enumerate(intents):
+            seen = set()
+            for kw in intent.get("match", []):
+                kw_tokens = frozenset(_tokenize(kw))
+                if not kw_tokens or kw_tokens in seen:
+                    continue
+                seen.add(kw_tokens)
+                self._entries.append((idx, kw_tokens))
+
+        df: Dict[str, int] = {}
+        for _, kw_tokens in self._entries:
+            for t in kw_tokens:
+                df[t] = df.get(t, 0) + 1
+
+        self._index: Dict[str, List[Tuple[int, FrozenSet[str]]]] = {}
+        for entry in self._entries:
+            anchor = min(entry[1], key=lambda t: (df[t], t))
+            self._index.setdefault(anchor, []).append(entry)
+
+    def match(self, user_tokens: set) -> Optional[int]:
+        """Trả về chỉ số intent khai báo sớm nhất có keyword khớp, hoặc None."""
+        best: Optional[int] = None
+        for t in user_tokens:
+            for idx, kw_tokens in self._index.get(t, ()):
+                if best is not None and idx >= best:
+                    # posting list theo thứ tự intent tăng dần → phần còn lại không tốt hơn
+                    break
+                if len(kw_tokens) == 1 or kw_tokens.issubset(user_tokens):
+                    best = idx
+                    break
+        return best
 
 class BotLogic:
     """So khớp kịch bản theo từ khóa (bỏ dấu, không phân biệt hoa thường)."""
     def __init__(self, replies_config: Dict[str, Any]):
         self.intents: List[Dict[str, Any]] = replies_config.get("intents", [])
         self.fallback: str = replies_config.get("fallback", "Cám ơn bạn đã nhắn tin!")
+        self._matcher = _CompiledMatcher(self.intents)
 
     def find_match(self, text: str) -> Optional[str]:
-        user_tokens = _tokenize(text or "")
-        for intent in self.intents:
-            kws = intent.get("match", [])
-            # Khớp nếu bất kỳ keyword có đầy đủ từ cấu thành xuất hiện trong user_tokens
-            for kw in kws:
-                kw_tokens = _tokenize(kw)
-                if kw_tokens and kw_tokens.issubset(user_tokens):
-                    return intent.get("reply", self.fallback)
-        return None
+        # Khớp nếu bất kỳ keyword có đầy đủ từ cấu thành xuất hiện trong user_tokens;
+        # intent khai báo trước thắng.
+        idx = self._matcher.match(_tokenize(text or ""))
+        if idx is None:
+            return None
+        return self.intents[idx].get("reply", self.fallback)
 
     # Giữ lại cho tương thích cũ (không dùng nếu đã gọi find_match)
     def make_reply(self, text: str) -> str:
@@ -0,0 +1,49 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, List
+
+from .base import BaseConnector, Message
+
+class AsyncBaseConnector(ABC):
+    """Bản asyncio của BaseConnector: cùng hợp đồng, các method là coroutine."""
+    name: str = "base"
+    blocking: bool = False
+
+    @abstractmethod
+    async def get_new_messages(self) -> List[Message]:
+        """Fetch new messages since last poll."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def send_message(self, thread_id: str, text: str) -> Any:
+        """Send a text message to a thread/user."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def health_check(self) -> bool:
+        """Return True if connector is healthy/authenticated."""
+        raise NotImplementedError
+
+    async def close(self):
+        """Release network resources."""
+        return None
+
+class SyncConnectorAdapter(AsyncBaseConnector):
+    """Cho connector đồng bộ (BaseConnector) chạy trong runtime asyncio qua thread pool."""
+
+    def __init__(self, connector: BaseConnector):
+        self.inner = connector
+        self.name = connector.name
+        self.blocking = connector.blocking
+
+    async def get_new_messages(self) -> List[Message]:
+        return await asyncio.to_thread(self.inner.get_new_messages)
+
+    async def send_message(self, thread_id: str, text: str) -> Any:
+        return await asyncio.to_thread(self.inner.send_message, thread_id, text)
+
+    async def health_check(self) -> bool:
+        return await asyncio.to_thread(self.inner.health_check)
+
+    async def close(self):
+        return await asyncio.to_thread(self.inner.close)
@@ -0,0 +1,66 @@
+import asyncio
+from typing import List, Optional
+
+from utils.async_http import AsyncHTTPClient
+from .async_base import AsyncBaseConnector
+from .base import Message
+from .telegram_connector import API_BASE, update_to_message
+
+class AsyncTelegramConnector(AsyncBaseConnector):
+    """Telegram Bot API trên asyncio: long-poll và gửi tin không chiếm thread."""
+    name = "telegram"
+
+    def __init__(self, bot_token: str, api_base: str = API_BASE, http: Optional[AsyncHTTPClient] = None):
+        self.token = bot_token
+        self.offset: Optional[int] = None
+        self.api_url = api_base.rstrip("/") + "/bot{token}/{method}"
+        self.http = http or AsyncHTTPClient(max_per_host=200)
+
+    def _url(self, method: str) -> str:
+        return self.api_url.format(token=self.token, method=method)
+
+    async def get_new_messages(self) -> List[Message]:
+        params = {"timeout": 25}
+        if self.offset:
+            params["offset"] = self.offset + 1
+        try:
+            r = await self.http.get(self._url("getUpdates"), params=params, timeout=35)
+            r.raise_for_status()
+            data = r.json()
+        except asyncio.TimeoutError:
+            # long-polling hết hạn là bình thường
+            return []
+        except Exception:
+            # Đừng ném lỗi để không làm sập vòng lặp
+            return []
+
+        msgs: List[Message] = []
+        for upd in data.get("result", []) if data.get("ok") else []:
+            self.offset = max(self.offset or 0, upd.get("update_id", 0))
+            m = update_to_message(upd)
+            if m:
+                msgs.append(m)
+        return msgs
+
+    async def send_message(self, thread_id: str, text: str):
+        payload = {"chat_id": thread_id, "text": text, "disable_web_page_preview": True}
+        delay = 1.0
+        for _ in range(3):
+            try:
+                r = await self.http.post(self._url("sendMessage"), json=payload, timeout=12)
+                r.raise_for_status()
+                return r.json()
+            except (asyncio.TimeoutError, ConnectionError):
+                await asyncio.sleep(delay)
+                delay *= 1.8
+        raise asyncio.TimeoutError(f"sendMessage tới {thread_id} thất bại sau 3 lần thử")
+
+    async def health_check(self) -> bool:
+        try:
+            r = await self.http.get(self._url("getMe"), timeout=8)
+            return r.status_code == 200 and r.json().get("ok", False)
+        except Exception:
+            return False
+
+    async def close(self):
+        await self.http.close()
@@ -1,5 +1,6 @@
+import queue
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional
 
 class Message:
     def __init__(self, thread_id: str, sender_id: str, text: str):
@@ -7,8 +8,23 @@ class Message:
         self.sender_id = sender_id
         self.text = text
 
+def drain(q: "queue.Queue", timeout: float, max_items: int) -> list:
+    """Chờ tối đa `timeout` giây cho phần tử đầu tiên rồi lấy luôn những gì đang có (≤ max_items)."""
+    try:
+        items = [q.get(timeout=timeout)]
+    except queue.Empty:
+        return []
+    while len(items) < max_items:
+        try:
+            items.append(q.get_nowait())
+        except queue.Empty:
+            break
+    return items
+
 class BaseConnector(ABC):
     name: str = "base"
+    # True: get_new_messages() tự chờ tới khi có tin (webhook, prefetch) → vòng lặp bot không ngủ thêm
+    blocking: bool = False
 
     @abstractmethod
     def get_new_messages(self) -> List[Message]:
@@ -25,6 +41,24 @@ class BaseConnector(ABC):
         """Return True if connector is healthy/authenticated."""
         raise NotImplementedError
 
+    def send_stream(self, thread_id: str, chunks: Iterable[str]) -> str:
+        """Send a reply produced progressively; returns the full text.
+
+        Default: wait for all chunks, then send once. Connectors that can edit
+        messages override this to show partial text early.
+        """
+        text = "".join(chunks)
+        self.send_message(thread_id, text)
+        return text
+
+    def start(self):
+        """Start background ingest (webhook server, prefetch thread) if any."""
+        return None
+
+    def close(self):
+        """Stop background ingest and release resources."""
+        return None
+
     def canary(self, text: str) -> bool:
         """Optional canary test hook."""
         return True
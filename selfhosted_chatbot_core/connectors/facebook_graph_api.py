@@ -1,37 +1,257 @@
-import requests
-from typing import List
-from .base import BaseConnector, Message
+import hashlib
+import hmac
+import json
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Optional
+from urllib.parse import urlencode
 
-# NOTE: This connector uses the official Graph API and requires proper permissions and webhook setup.
-# It is provided as a placeholder for compliant integrations.
-# Inbound messages typically arrive via webhook callbacks; to simplify, this class provides a polling endpoint
-# for demonstration (Graph API does not provide simple polling for messages in production).
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ModuleNotFoundError:
+    from utils.requests_shim import requests  # fallback stdlib
+    HTTPAdapter = requests.adapters.HTTPAdapter
+
+from .base import BaseConnector, Message, drain
+from .webhook_server import WebhookServer
+
+# Connector dùng Graph API chính thức (Messenger Platform): cần quyền pages_messaging + App Review.
+# Nhận tin: Meta POST webhook tới server nhỏ trong process (connectors.webhook_server).
+# Gửi tin: Send API qua session giữ kết nối; nhiều tin đang chờ được gộp vào một lần gọi batch.
+
+GRAPH_BASE = "https://graph.facebook.com"
+GRAPH_VERSION = "v20.0"
+SIGNATURE_HEADER = "X-Hub-Signature-256"
+MAX_BATCH = 50  # tối đa của Graph batch API
+
+def entry_to_messages(payload: dict) -> List[tuple]:
+    """Bóc entry[].messaging[] của một webhook thành [(mid, Message)] (bỏ echo, tin không có text)."""
+    out = []
+    if payload.get("object") != "page":
+        return out
+    for entry in payload.get("entry") or []:
+        for ev in entry.get("messaging") or []:
+            msg = ev.get("message") or {}
+            text = msg.get("text")
+            if not text or msg.get("is_echo"):
+                continue
+            sender = str((ev.get("sender") or {}).get("id", ""))
+            out.append((msg.get("mid") or f'{sender}:{ev.get("timestamp")}', Message(sender, sender, text)))
+    return out
 
 class FacebookGraphAPIConnector(BaseConnector):
+    """- GET `path`: bắt tay verify-token (hub.mode=subscribe) → trả hub.challenge.
+    - POST `path`: chữ ký X-Hub-Signature-256 (HMAC-SHA256 của body bằng app secret) phải khớp, sai → 401;
+      tin trùng `mid` (Meta gửi lại) bị bỏ qua; hàng đợi đầy → 429 (Meta gửi lại sau),
+      các tin của lượt đó đã vào hàng đợi được ghi nhận nên lần gửi lại không bị nhân đôi.
+    """
     name = "facebook_graph_api"
+    blocking = True
 
-    def __init__(self, page_access_token: str, page_id: str):
+    def __init__(self, page_access_token: str, page_id: str, app_secret: str = "", verify_token: str = "",
+                 host: str = "0.0.0.0", port: int = 8444, path: str = "/facebook/webhook",
+                 queue_size: int = 1000, dedup_size: int = 10000, batch_size: int = 100,
+                 send_batch_size: int = MAX_BATCH, graph_base: str = GRAPH_BASE,
+                 api_version: str = GRAPH_VERSION, send_workers: int = 2, logger=None):
         self.token = page_access_token
         self.page_id = page_id
-        self.after_cursor = None
+        # Không có app secret thì không kiểm được chữ ký webhook → chỉ tắt phần nhận tin, vẫn gửi được
+        self.app_secret = app_secret.encode("utf-8") if app_secret else None
+        self.verify_token = verify_token
+        self.path = path
+        self.dedup_size = dedup_size
+        self.batch_size = batch_size
+        self.wait_timeout = 1.0
+        self.queue: "queue.Queue[Message]" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._accepting = False
+        self._log = logger
+        # graph_base đổi được để chạy với Graph giả lập khi test
+        self.graph_base = graph_base.rstrip("/")
+        self.api_version = api_version
+        self.send_batch_size = max(1, min(MAX_BATCH, int(send_batch_size)))
+        self.s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self.s.mount("https://", adapter)
+        self.s.mount("http://", adapter)
+        self._outbox: "queue.Queue[tuple]" = queue.Queue()
+        self.send_workers = max(1, int(send_workers))
+        self._senders: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self.server: Optional[WebhookServer] = None
+        if self.app_secret is not None:
+            self.server = WebhookServer(host, port, logger=logger)
+            self.server.route(path, self._on_request, methods=("GET", "POST"))
+        else:
+            msg = ("[facebook] thiếu app secret (credentials.json: facebook_graph_api.app_secret) "
+                   "→ không mở webhook, bot sẽ không nhận được tin")
+            if logger:
+                logger.error(msg)
+            else:
+                print(msg)
+        self.counters = {"received": 0, "accepted": 0, "duplicates": 0, "rejected_full": 0,
+                         "unauthorized": 0, "bad_request": 0, "sent": 0, "send_errors": 0,
+                         "send_calls": 0, "batched": 0}
+
+    # --- nhận tin ---
+    def _on_request(self, req):
+        return self._on_verify(req) if req.method == "GET" else self._on_webhook(req)
+
+    def _on_verify(self, req):
+        q = req.query
+        if (q.get("hub.mode") == "subscribe" and self.verify_token
+                and hmac.compare_digest(q.get("hub.verify_token", "").encode("utf-8"),
+                                        self.verify_token.encode("utf-8"))):
+            return 200, q.get("hub.challenge", "")
+        return 403, "forbidden"
+
+    def _on_webhook(self, req):
+        sig = req.headers.get(SIGNATURE_HEADER, "")
+        expected = "sha256=" + hmac.new(self.app_secret, req.body, hashlib.sha256).hexdigest()
+        with self._lock:
+            self.counters["received"] += 1
+            if not hmac.compare_digest(sig.encode("utf-8", "replace"), expected.encode("ascii")):
+                self.counters["unauthorized"] += 1
+                return 401, "bad signature"
+            if not self._accepting:
+                return 503, "stopping", {"Retry-After": "5"}
+        try:
+            items = entry_to_messages(req.json())
+        except (ValueError, AttributeError, TypeError):
+            with self._lock:
+                self.counters["bad_request"] += 1
+            return 400, "bad payload"
+        with self._lock:
+            for mid, m in items:
+                if mid in self._seen:
+                    self.counters["duplicates"] += 1
+                    continue
+                try:
+                    self.queue.put_nowait(m)
+                except queue.Full:
+                    self.counters["rejected_full"] += 1
+                    return 429, "queue full", {"Retry-After": "1"}
+                self._seen[mid] = None
+                if len(self._seen) > self.dedup_size:
+                    self._seen.popitem(last=False)
+                self.counters["accepted"] += 1
+        return 200, "EVENT_RECEIVED"
 
     def get_new_messages(self) -> List[Message]:
-        # Placeholder: In reality, use Webhooks to receive messages.
-        # Here we return an empty list to avoid misleading behavior.
-        return []
+        return drain(self.queue, self.wait_timeout, self.batch_size)
 
+    # --- gửi tin ---
     def send_message(self, thread_id: str, text: str):
-        url = f"https://graph.facebook.com/v20.0/me/messages"
-        params = {"access_token": self.token}
-        payload = {"recipient": {"id": thread_id}, "message": {"text": text}}
-        r = requests.post(url, params=params, json=payload, timeout=30)
+        """Chờ kết quả như trước; tin của nhiều thread gửi cùng lúc đi chung một lần gọi batch."""
+        if self._stop.is_set() or not self._senders:
+            return self._send_one(thread_id, text)
+        fut: Future = Future()
+        self._outbox.put((str(thread_id), text, fut))
+        return fut.result(timeout=60)
+
+    def _message_body(self, thread_id: str, text: str) -> dict:
+        return {"recipient": {"id": thread_id}, "messaging_type": "RESPONSE", "message": {"text": text}}
+
+    def _send_one(self, thread_id: str, text: str):
+        r = self.s.post(f"{self.graph_base}/{self.api_version}/me/messages", params={"access_token": self.token},
+                        json=self._message_body(thread_id, text), timeout=30)
+        with self._lock:
+            self.counters["send_calls"] += 1
         r.raise_for_status()
         return r.json()
 
+    def _run_sender(self):
+        # Mỗi người gọi chờ tin của mình gửi xong mới gửi tin tiếp → thứ tự trong một chat được giữ
+        # dù các request trong batch (và các batch của hai thread gửi) chạy song song
+        while not self._stop.is_set() or not self._outbox.empty():
+            batch = drain(self._outbox, 0.5, self.send_batch_size)
+            if batch:
+                self._deliver(batch)
+
+    def _deliver(self, batch: List[tuple]):
+        if len(batch) == 1:
+            thread_id, text, fut = batch[0]
+            try:
+                fut.set_result(self._send_one(thread_id, text))
+                self._count(sent=1)
+            except Exception as e:
+                self._count(send_errors=1)
+                fut.set_exception(e)
+            return
+        reqs = [{"method": "POST", "relative_url": f"{self.api_version}/me/messages",
+                 "body": urlencode({k: json.dumps(v) if isinstance(v, dict) else v
+                                    for k, v in self._message_body(thread_id, text).items()})}
+                for thread_id, text, _ in batch]
+        try:
+            r = self.s.post(self.graph_base + "/", data={"access_token": self.token, "batch": json.dumps(reqs)},
+                            timeout=60)
+            r.raise_for_status()
+            results = r.json()
+            if not isinstance(results, list):
+                # Ví dụ {"error": {...}} khi token hết hạn
+                raise RuntimeError(f"Graph batch trả về không phải danh sách: {str(results)[:200]}")
+        except Exception as e:
+            self._count(send_calls=1, send_errors=len(batch))
+            for _, _, fut in batch:
+                fut.set_exception(e)
+            return
+        ok = 0
+        for (thread_id, _, fut), res in zip(batch, results + [None] * (len(batch) - len(results))):
+            # null = Graph hết thời gian xử lý request đó trong batch
+            res = res if isinstance(res, dict) else {}
+            try:
+                if res.get("code") != 200:
+                    raise RuntimeError(f"Graph batch gửi tới {thread_id} lỗi: {res.get('code')} {res.get('body')}")
+                fut.set_result(json.loads(res.get("body") or "{}"))
+                ok += 1
+            except Exception as e:
+                fut.set_exception(e)
+        self._count(send_calls=1, sent=ok, send_errors=len(batch) - ok, batched=len(batch))
+
+    def _count(self, **kw):
+        with self._lock:
+            for k, v in kw.items():
+                self.counters[k] += v
+
     def health_check(self) -> bool:
         try:
-            url = f"https://graph.facebook.com/v20.0/{self.page_id}"
-            r = requests.get(url, params={"access_token": self.token}, timeout=10)
+            r = self.s.get(f"{self.graph_base}/{self.api_version}/{self.page_id}",
+                           params={"access_token": self.token}, timeout=10)
             return r.status_code == 200
         except Exception:
             return False
+
+    def start(self):
+        self._accepting = True
+        self._stop.clear()
+        if not self._senders:
+            # Hai thread: một batch đang chờ Graph thì batch sau đã gom sẵn
+            self._senders = [threading.Thread(target=self._run_sender, name=f"facebook-send-{i}", daemon=True)
+                             for i in range(self.send_workers)]
+            for t in self._senders:
+                t.start()
+        if self.server is None:
+            return
+        self.server.start()
+        if self._log:
+            host, port = self.server.address
+            self._log.info(f"[facebook] webhook đang nghe ở http://{host}:{port}{self.path}")
+
+    def close(self):
+        self._accepting = False
+        if self.server is not None:
+            self.server.stop()
+        self._stop.set()
+        # Gửi nốt tin đang chờ trong outbox
+        for t in self._senders:
+            t.join(timeout=5.0)
+        self._senders = []
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, queue_depth=self.queue.qsize(), queue_size=self.queue.maxsize,
+                        outbox_depth=self._outbox.qsize())
@@ -1,6 +1,8 @@
+import asyncio
 import time
 from typing import List
 from .base import BaseConnector, Message
+from .async_base import AsyncBaseConnector
 
 class MockConnector(BaseConnector):
     name = "mock"
@@ -30,3 +32,32 @@ class MockConnector(BaseConnector):
     # Helpers for tests / UI
     def inject_message(self, thread_id: str, text: str, sender_id: str = None):
         self._inbox.append(Message(thread_id=thread_id, sender_id=sender_id or thread_id, text=text))
+
+class AsyncMockConnector(AsyncBaseConnector):
+    """Bản asyncio của MockConnector (test runtime async không cần mạng)."""
+    name = "mock"
+
+    def __init__(self, send_delay: float = 0.0):
+        self._sync = MockConnector()
+        self.send_delay = send_delay
+
+    @property
+    def sent(self):
+        return self._sync._sent
+
+    async def get_new_messages(self) -> List[Message]:
+        await asyncio.sleep(0.01)
+        new = self._sync._inbox[self._sync._last_idx:]
+        self._sync._last_idx = len(self._sync._inbox)
+        return new
+
+    async def send_message(self, thread_id: str, text: str):
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        return self._sync.send_message(thread_id, text)
+
+    async def health_check(self) -> bool:
+        return True
+
+    def inject_message(self, thread_id: str, text: str, sender_id: str = None):
+        self._sync.inject_message(thread_id, text, sender_id)
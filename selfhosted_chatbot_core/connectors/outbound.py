@@ -0,0 +1,258 @@
+# connectors/outbound.py
+# Hàng đợi gửi tin ra ngoài: người gọi chỉ enqueue (không chặn), một thread điều phối cấp
+# token (toàn cục + từng chat, utils.rate_limit.TokenBucket) rồi giao cho pool thread gửi thật.
+# - Làn ưu tiên: trả lời người dùng (INTERACTIVE) đi trước nhắc nhở (BULK).
+# - Trong một chat: gửi lần lượt theo (ưu tiên, thứ tự enqueue), không vượt nhịp của chat.
+# - Nền tảng trả 429 kèm retry_after → chat đó tạm dừng đúng chừng ấy giây, tin về lại đầu hàng.
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.rate_limit import TokenBucket
+
+INTERACTIVE = 0
+BULK = 1
+LANES = ("interactive", "bulk")
+
+class RetryAfter(Exception):
+    """Nền tảng báo quá nhịp (HTTP 429): thử lại sau `seconds` giây."""
+
+    def __init__(self, seconds: float, message: str = ""):
+        super().__init__(message or f"retry after {seconds}s")
+        self.seconds = float(seconds)
+
+class PermanentSendError(Exception):
+    """Lỗi không nên thử lại (chat không tồn tại, bot bị chặn, nội dung sai...)."""
+
+class _Item:
+    __slots__ = ("chat_id", "text", "priority", "seq", "enqueued", "attempts", "on_done")
+
+    def __init__(self, chat_id: str, text: str, priority: int, seq: int, on_done):
+        self.chat_id = chat_id
+        self.text = text
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+        self.on_done = on_done
+
+class OutboundQueue:
+    """send(chat_id, text) chạy trong pool `workers` thread; ném RetryAfter / PermanentSendError
+    để báo 429 / lỗi vĩnh viễn, lỗi khác được thử lại tối đa `max_attempts` lần (backoff mũ)."""
+
+    MAX_TRACKED_CHATS = 10000  # quá số này thì bỏ bucket của các chat đang rảnh
+
+    def __init__(self, send: Callable[[str, str], Any], rate: float = 30.0, burst: float = 30.0,
+                 per_chat_rate: float = 1.0, per_chat_burst: float = 3.0, workers: int = 8,
+                 max_depth: int = 10000, max_attempts: int = 5, name: str = "outbound", logger=None):
+        self._send = send
+        self.global_bucket = TokenBucket(rate, burst)
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self.workers = max(1, int(workers))
+        self._log = logger
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._pending: Dict[str, list] = {}          # chat → heap (priority, seq, item)
+        self._state: Dict[str, str] = {}             # chat → "ready" | "delayed" | "busy"
+        self._lanes = [deque() for _ in LANES]       # chat sẵn sàng, theo làn của tin đầu hàng
+        self._delayed: List[tuple] = []              # heap (not_before, seq, chat)
+        self._depth = [0] * len(LANES)
+        self._seq = itertools.count()
+        self._cv = threading.Condition()
+        self._slots = threading.Semaphore(self.workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{name}-send")
+        self._name = name
+        self._closed = False
+        self._stop = False
+        self._thr: Optional[threading.Thread] = None
+        self.counters = {"enqueued": 0, "sent": 0, "failed": 0, "retried": 0, "rate_limited": 0, "dropped_full": 0}
+        self._latency = deque(maxlen=1000)   # enqueue → gửi xong (giây), gồm thời gian xếp hàng
+        self._send_time = deque(maxlen=1000)  # riêng lời gọi HTTP
+
+    # --- phía người gọi ---
+    def enqueue(self, chat_id: str, text: str, priority: int = INTERACTIVE,
+                on_done: Optional[Callable[[bool, Optional[Exception]], None]] = None) -> bool:
+        """Không chặn. False nếu hàng đợi đã đầy (`max_depth`) hoặc đã đóng."""
+        chat_id = str(chat_id)
+        with self._cv:
+            if self._closed:
+                return False
+            if sum(self._depth) >= self.max_depth:
+                self.counters["dropped_full"] += 1
+                return False
+            item = _Item(chat_id, text, priority, next(self._seq), on_done)
+            heapq.heappush(self._pending.setdefault(chat_id, []), (priority, item.seq, item))
+            self._depth[priority] += 1
+            self.counters["enqueued"] += 1
+            state = self._state.get(chat_id)
+            if state is None:
+                self._schedule(chat_id, time.monotonic())
+            elif state == "ready" and priority == INTERACTIVE:
+                # Chat đang chờ ở làn bulk → đưa thêm vào làn interactive (entry cũ bị bỏ qua khi tới lượt)
+                self._lanes[INTERACTIVE].append(chat_id)
+            self._cv.notify()
+        return True
+
+    # --- điều phối ---
+    def _bucket(self, chat_id: str) -> TokenBucket:
+        b = self._buckets.get(chat_id)
+        if b is None:
+            if len(self._buckets) >= self.MAX_TRACKED_CHATS:
+                # Chat rảnh (không còn tin) đã/ sắp đầy token → bỏ bucket không ảnh hưởng nhịp
+                self._buckets = {c: b for c, b in self._buckets.items() if c in self._state}
+            b = self._buckets[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return b
+
+    def _schedule(self, chat_id: str, now: float, delay: Optional[float] = None):
+        # gọi khi đang giữ self._cv; chat có tin chờ và không có tin nào đang gửi
+        if delay is None:
+            delay = self._bucket(chat_id).reserve()
+        if delay > 0:
+            self._state[chat_id] = "delayed"
+            heapq.heappush(self._delayed, (now + delay, next(self._seq), chat_id))
+        else:
+            self._state[chat_id] = "ready"
+            self._lanes[self._pending[chat_id][0][0]].append(chat_id)
+
+    def _next_chat(self, now: float) -> Optional[str]:
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, chat_id = heapq.heappop(self._delayed)
+            if self._state.get(chat_id) == "delayed":
+                self._state[chat_id] = "ready"
+                self._lanes[self._pending[chat_id][0][0]].append(chat_id)
+        for lane in self._lanes:
+            while lane:
+                chat_id = lane.popleft()
+                if self._state.get(chat_id) == "ready":
+                    return chat_id
+        return None
+
+    def start(self):
+        if self._thr and self._thr.is_alive():
+            return
+        self._thr = threading.Thread(target=self._run, name=f"{self._name}-dispatch", daemon=True)
+        self._thr.start()
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while True:
+                    if self._stop:
+                        return
+                    now = time.monotonic()
+                    chat_id = self._next_chat(now)
+                    if chat_id is not None:
+                        break
+                    self._cv.wait(self._delayed[0][0] - now if self._delayed else None)
+                _, _, item = heapq.heappop(self._pending[chat_id])
+                if not self._pending[chat_id]:
+                    del self._pending[chat_id]
+                self._state[chat_id] = "busy"
+            # Nhịp toàn cục: chờ ở đây (thread điều phối), người gọi không bị chặn
+            wait = self.global_bucket.reserve()
+            if wait:
+                time.sleep(wait)
+            self._slots.acquire()
+            self._pool.submit(self._deliver, item)
+
+    def _deliver(self, item: _Item):
+        started = time.monotonic()
+        error: Optional[Exception] = None
+        retry_in: Optional[float] = None
+        try:
+            self._send(item.chat_id, item.text)
+        except RetryAfter as e:
+            error, retry_in = e, e.seconds
+        except PermanentSendError as e:
+            error = e
+        except Exception as e:
+            error = e
+            if item.attempts + 1 < self.max_attempts:
+                retry_in = min(30.0, 2.0 ** item.attempts)
+        finally:
+            self._slots.release()
+        now = time.monotonic()
+        item.attempts += 1
+        done = retry_in is None or item.attempts >= self.max_attempts
+        with self._cv:
+            chat_id = item.chat_id
+            if not done:
+                self.counters["rate_limited" if isinstance(error, RetryAfter) else "retried"] += 1
+                # Về lại đầu hàng của chat (seq cũ) và dừng chat tới khi hết retry_after / backoff
+                heapq.heappush(self._pending.setdefault(chat_id, []), (item.priority, item.seq, item))
+                self._schedule(chat_id, now, delay=retry_in)
+            else:
+                self._depth[item.priority] -= 1
+                if error is None:
+                    self.counters["sent"] += 1
+                    self._latency.append(now - item.enqueued)
+                    self._send_time.append(now - started)
+                else:
+                    self.counters["failed"] += 1
+                if chat_id in self._pending:
+                    self._schedule(chat_id, now)
+                else:
+                    self._state.pop(chat_id, None)
+            self._cv.notify_all()
+        if not done:
+            return
+        if error is not None and self._log:
+            self._log.warning(f"[{self._name}] gửi tới {item.chat_id} thất bại sau {item.attempts} lần: {error}")
+        if item.on_done:
+            try:
+                item.on_done(error is None, error)
+            except Exception:
+                if self._log:
+                    self._log.exception(f"[{self._name}] lỗi trong on_done")
+
+    # --- dừng / số liệu ---
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def depth(self) -> int:
+        return sum(self._depth)
+
+    def close(self, drain: bool = True, timeout: float = 10.0):
+        """Ngừng nhận tin; drain=True thì chờ gửi nốt (tối đa `timeout` giây)."""
+        deadline = time.monotonic() + timeout
+        with self._cv:
+            self._closed = True
+            while drain and self._thr and sum(self._depth) and time.monotonic() < deadline:
+                self._cv.wait(deadline - time.monotonic())
+            self._stop = True
+            self._cv.notify_all()
+            # Tin chưa kịp gửi: báo thất bại cho người đang chờ kết quả (on_done)
+            left = [item for heap in self._pending.values() for _, _, item in heap if item.on_done]
+        if self._thr:
+            self._thr.join(timeout=1.0)
+        self._pool.shutdown(wait=False)
+        for item in left:
+            try:
+                item.on_done(False, RuntimeError("hàng đợi gửi đã đóng, tin chưa được gửi"))
+            except Exception:
+                if self._log:
+                    self._log.exception(f"[{self._name}] lỗi trong on_done")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cv:
+            out = dict(self.counters, depth=sum(self._depth),
+                       **{f"depth_{name}": self._depth[i] for i, name in enumerate(LANES)},
+                       in_flight=sum(1 for s in self._state.values() if s == "busy"),
+                       chats_waiting=len(self._pending))
+            lat, send = sorted(self._latency), sorted(self._send_time)
+        for key, values in (("latency_ms", lat), ("send_ms", send)):
+            if values:
+                out[f"{key}_p50"] = round(values[len(values) // 2] * 1000, 1)
+                out[f"{key}_p95"] = round(values[math.ceil(len(values) * 0.95) - 1] * 1000, 1)  # nearest-rank
+                out[f"{key}_max"] = round(values[-1] * 1000, 1)
+        return out
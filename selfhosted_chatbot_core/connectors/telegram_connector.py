@@ -1,15 +1,31 @@
+import hmac
+import json
+import queue
+import secrets
+import threading
 import time
-from typing import List, Optional
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Iterable, List, Optional
 try:
     import requests  # nếu đã cài, dùng bình thường
+    from requests.adapters import HTTPAdapter, Retry
 except ModuleNotFoundError:
     from utils.requests_shim import requests  # fallback stdlib, không cần cài gì
+    HTTPAdapter, Retry = requests.adapters.HTTPAdapter, requests.adapters.Retry
 
-from requests.adapters import HTTPAdapter, Retry
+from .base import BaseConnector, Message, drain
+from .outbound import BULK, INTERACTIVE, OutboundQueue, PermanentSendError, RetryAfter
+from .webhook_server import WebhookServer
 
-from .base import BaseConnector, Message
-
-API_URL = "https://api.telegram.org/bot{token}/{method}"
+API_BASE = "https://api.telegram.org"
+API_URL = API_BASE + "/bot{token}/{method}"
+MAX_TEXT_LEN = 4096        # giới hạn độ dài một tin của Bot API
+STREAM_EDIT_INTERVAL = 1.0  # giây tối thiểu giữa hai lần editMessageText của một tin
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+ALLOWED_UPDATES = ["message", "edited_message"]  # update_to_message chỉ dùng hai loại này
+POLL_TIMEOUT = 25          # giây long-poll phía Telegram
+POLL_LIMIT = 100           # số update tối đa mỗi lần getUpdates (tối đa của Bot API)
 
 def _build_session() -> requests.Session:
     s = requests.Session()
@@ -28,45 +44,93 @@ def _build_session() -> requests.Session:
     # s.proxies.update({"https": "http://127.0.0.1:8888"})
     return s
 
+def _build_outbound_session(pool_size: int) -> requests.Session:
+    # Không Retry ở tầng HTTP: 429/lỗi mạng do OutboundQueue xử lý (retry_after, nhường chat khác)
+    s = requests.Session()
+    adapter = HTTPAdapter(max_retries=0, pool_connections=1, pool_maxsize=pool_size)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+def update_to_message(upd: dict) -> Optional[Message]:
+    """Chuyển một update của Bot API thành Message (None nếu không phải tin nhắn văn bản)."""
+    msg = upd.get("message") or upd.get("edited_message")
+    if not msg:
+        return None
+    text = msg.get("text") or ""
+    if not text:
+        return None
+    return Message(
+        thread_id=str(msg.get("chat", {}).get("id")),
+        sender_id=str(msg.get("from", {}).get("id")),
+        text=text
+    )
+
 class TelegramConnector(BaseConnector):
     name = "telegram"
 
-    def __init__(self, bot_token: str):
+    def __init__(self, bot_token: str, api_base: str = API_BASE):
         self.token = bot_token
         self.offset: Optional[int] = None
         self.s = _build_session()
+        # api_base đổi được để chạy với Bot API server tự host hoặc server giả lập khi test
+        self.api_url = api_base.rstrip("/") + "/bot{token}/{method}"
+        self.outbound: Optional[OutboundQueue] = None
+        self.s_out = None
 
-    def get_new_messages(self) -> List[Message]:
-        # Long-polling nhẹ (timeout phía Telegram ~25s), nhưng timeout requests = 35s
-        params = {"timeout": 25}
+    def enable_outbound(self, rate: float = 30.0, per_chat_rate: float = 1.0, per_chat_burst: float = 3.0,
+                        workers: int = 8, max_depth: int = 10000, max_attempts: int = 5, logger=None) -> OutboundQueue:
+        """Gửi qua hàng đợi có giới hạn nhịp (Bot API: ~30 tin/s toàn bot, ~1 tin/s mỗi chat).
+        Từ đó send_message chỉ xếp hàng rồi trả về ngay."""
+        self.s_out = _build_outbound_session(workers)
+        self.outbound = OutboundQueue(self._post_message, rate=rate, burst=rate, per_chat_rate=per_chat_rate,
+                                      per_chat_burst=per_chat_burst, workers=workers, max_depth=max_depth,
+                                      max_attempts=max_attempts, name="telegram-out", logger=logger)
+        return self.outbound
+
+    def _post_message(self, thread_id: str, text: str):
+        # Một lần gọi sendMessage, không tự ngủ/thử lại — dùng cho OutboundQueue
+        r = self.s_out.post(
+            self.api_url.format(token=self.token, method="sendMessage"),
+            json={"chat_id": thread_id, "text": text, "disable_web_page_preview": True},
+            timeout=12
+        )
+        if r.status_code == 429:
+            try:
+                retry_after = r.json().get("parameters", {}).get("retry_after")
+            except ValueError:
+                retry_after = None
+            raise RetryAfter(float(retry_after or r.headers.get("Retry-After") or 1))
+        if r.status_code in (400, 403):
+            # chat không tồn tại, bot bị chặn, text rỗng... → thử lại cũng vậy
+            raise PermanentSendError(f"{r.status_code} {r.text[:200]}")
+        r.raise_for_status()
+        return r.json()
+
+    def _get_updates(self, timeout: int = POLL_TIMEOUT, limit: int = POLL_LIMIT) -> list:
+        # Long-polling (timeout phía Telegram), timeout requests dài hơn 10s;
+        # allowed_updates: chỉ nhận loại update bot dùng → payload nhỏ hơn
+        params = {"timeout": timeout, "limit": limit, "allowed_updates": json.dumps(ALLOWED_UPDATES)}
         if self.offset:
             params["offset"] = self.offset + 1
+        r = self.s.get(
+            self.api_url.format(token=self.token, method="getUpdates"),
+            params=params,
+            timeout=timeout + 10
+        )
+        r.raise_for_status()
+        data = r.json()
+        return data.get("result", []) if data.get("ok") else []
 
+    def get_new_messages(self) -> List[Message]:
         try:
-            r = self.s.get(
-                API_URL.format(token=self.token, method="getUpdates"),
-                params=params,
-                timeout=35
-            )
-            r.raise_for_status()
-            data = r.json()
-            results = data.get("result", []) if data.get("ok") else []
-
+            results = self._get_updates()
             msgs: List[Message] = []
             for upd in results:
                 self.offset = max(self.offset or 0, upd.get("update_id", 0))
-                msg = upd.get("message") or upd.get("edited_message")
-                if not msg:
-                    continue
-                chat = msg.get("chat", {})
-                text = msg.get("text") or ""
-                if not text:
-                    continue
-                msgs.append(Message(
-                    thread_id=str(chat.get("id")),
-                    sender_id=str(msg.get("from", {}).get("id")),
-                    text=text
-                ))
+                m = update_to_message(upd)
+                if m:
+                    msgs.append(m)
             return msgs
         except requests.exceptions.Timeout:
             # long-polling hết hạn là bình thường → không coi là lỗi
@@ -75,7 +139,39 @@ class TelegramConnector(BaseConnector):
             # Đừng ném lỗi để không làm sập vòng lặp
             return []
 
-    def send_message(self, thread_id: str, text: str):
+    def send_message(self, thread_id: str, text: str, priority: int = INTERACTIVE):
+        # Hàng đợi đã đóng (bot đang dừng, worker trả lời nốt) → gửi thẳng
+        if self.outbound is not None and not self.outbound.closed:
+            if not self.outbound.enqueue(thread_id, text, priority):
+                raise RuntimeError("hàng đợi gửi Telegram đã đầy")
+            return {"ok": True, "queued": True}
+        return self._send_now(thread_id, text)
+
+    def send_and_wait(self, thread_id: str, text: str, priority: int = BULK, timeout: Optional[float] = None):
+        """Gửi rồi chờ kết quả thật (qua hàng đợi nếu có): lỗi 403, 429 hết lượt thử, hàng đợi đóng... → raise.
+        Quá `timeout` giây chưa có kết quả → TimeoutError (tin có thể vẫn được gửi sau đó)."""
+        if self.outbound is not None and not self.outbound.closed:
+            fut: Future = Future()
+
+            def on_done(ok: bool, error: Optional[Exception]):
+                if ok:
+                    fut.set_result(None)
+                else:
+                    fut.set_exception(error or RuntimeError("gửi thất bại"))
+
+            if not self.outbound.enqueue(thread_id, text, priority, on_done=on_done):
+                raise RuntimeError("hàng đợi gửi Telegram đã đầy")
+            try:
+                return fut.result(timeout)
+            except FutureTimeout:
+                raise TimeoutError(f"chưa gửi xong sau {timeout}s (vẫn trong hàng đợi)") from None
+        try:
+            return self._send_now(thread_id, text, timeout=timeout)
+        except requests.exceptions.Timeout as e:
+            raise TimeoutError(f"sendMessage quá {timeout}s: {e}") from e
+
+    def _send_now(self, thread_id: str, text: str, timeout: Optional[float] = None):
+        """timeout: tổng thời gian tối đa cho mọi lần thử (None = 3 lần × 12s + backoff)."""
         payload = {
             "chat_id": thread_id,
             "text": text,
@@ -86,18 +182,30 @@ class TelegramConnector(BaseConnector):
         tries = 3
         delay = 1.0
         last_exc = None
+        deadline = time.monotonic() + timeout if timeout else None
+        # Có hạn → session không Retry ở tầng HTTP (Retry của urllib3 không biết hạn này)
+        if deadline is not None and self.s_out is None:
+            self.s_out = _build_outbound_session(4)
+        session = self.s_out if deadline is not None else self.s
 
         for i in range(tries):
+            per_try = 12  # ngắn hơn 30s để sớm retry
+            if deadline is not None:
+                per_try = min(per_try, deadline - time.monotonic())
+                if per_try <= 0:
+                    break
             try:
-                r = self.s.post(
-                    API_URL.format(token=self.token, method="sendMessage"),
+                r = session.post(
+                    self.api_url.format(token=self.token, method="sendMessage"),
                     json=payload,
-                    timeout=12   # ngắn hơn 30s để sớm retry
+                    timeout=per_try
                 )
                 r.raise_for_status()
                 return r.json()
             except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectTimeout) as e:
                 last_exc = e
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    break
                 time.sleep(delay)
                 delay *= 1.8
                 continue
@@ -107,42 +215,318 @@ class TelegramConnector(BaseConnector):
         # Sau khi đã retry vẫn fail → raise ReadTimeout để bot xử lý log nhưng không chết
         raise requests.exceptions.ReadTimeout(last_exc, request=None)
 
+    def send_stream(self, thread_id: str, chunks: Iterable[str], edit_interval: float = STREAM_EDIT_INTERVAL) -> str:
+        """Hiện câu trả lời dần dần: gửi một tin ngay khi có đoạn đầu tiên, sau đó
+        editMessageText theo nhịp `edit_interval` giây; quá MAX_TEXT_LEN thì sang tin mới."""
+        full = ""
+        msg_id = None       # tin đang được cập nhật
+        msg_start = 0       # vị trí trong `full` nơi tin hiện tại bắt đầu
+        shown = ""          # text tin hiện tại đang hiển thị trên Telegram
+        last_edit = 0.0
+
+        def flush(final: bool):
+            nonlocal msg_id, msg_start, shown, last_edit
+            while True:
+                current = full[msg_start:msg_start + MAX_TEXT_LEN]
+                if msg_id is None:
+                    if not current:
+                        return
+                    # Cần message_id để edit → gửi trực tiếp, không qua hàng đợi
+                    res = self._send_now(thread_id, current)
+                    msg_id = (res or {}).get("result", {}).get("message_id")
+                    shown = current
+                    last_edit = time.monotonic()
+                elif current != shown and (final or time.monotonic() - last_edit >= edit_interval
+                                           or len(current) == MAX_TEXT_LEN):
+                    self._edit_message(thread_id, msg_id, current)
+                    shown = current
+                    last_edit = time.monotonic()
+                if len(full) - msg_start > MAX_TEXT_LEN and len(shown) == MAX_TEXT_LEN:
+                    # Tin hiện tại đã đầy → phần còn lại sang tin mới
+                    msg_start += MAX_TEXT_LEN
+                    msg_id, shown = None, ""
+                    continue
+                return
+
+        for chunk in chunks:
+            if not chunk:
+                continue
+            full += chunk
+            flush(final=False)
+        flush(final=True)
+        return full
+
+    def _edit_message(self, thread_id: str, message_id: int, text: str):
+        r = self.s.post(
+            self.api_url.format(token=self.token, method="editMessageText"),
+            json={"chat_id": thread_id, "message_id": message_id, "text": text,
+                  "disable_web_page_preview": True},
+            timeout=12
+        )
+        # 400 "message is not modified" không phải lỗi thật
+        if r.status_code != 400:
+            r.raise_for_status()
+        return r.json()
+
     def health_check(self) -> bool:
         try:
             r = self.s.get(
-                API_URL.format(token=self.token, method="getMe"),
+                self.api_url.format(token=self.token, method="getMe"),
                 timeout=8
             )
             return r.status_code == 200 and r.json().get("ok", False)
         except Exception:
             return False
+
+    def start(self):
+        if self.outbound is not None:
+            self.outbound.start()
+
+    def close(self):
+        if self.outbound is not None:
+            # Gửi nốt các tin đã xếp hàng (tối đa vài giây) rồi mới dừng
+            self.outbound.close(drain=True, timeout=5.0)
+
+class TelegramPrefetchConnector(TelegramConnector):
+    """Polling có thread prefetch: luôn có một getUpdates đang chờ trong khi bot xử lý tin.
+
+    Tin của mỗi lượt được đưa vào hàng đợi có giới hạn; `offset` chỉ tiến lên sau khi cả lượt
+    đã vào hàng đợi → bot dừng giữa chừng thì Telegram giao lại phần chưa bàn giao.
+    Hàng đợi đầy → thread prefetch chờ (không lấy thêm), update nằm lại phía Telegram.
+    """
+    blocking = True
+
+    def __init__(self, bot_token: str, api_base: str = API_BASE, queue_size: int = 1000,
+                 limit: int = POLL_LIMIT, poll_timeout: int = POLL_TIMEOUT, batch_size: int = 100, logger=None):
+        super().__init__(bot_token, api_base)
+        self.limit = max(1, min(100, int(limit)))
+        self.poll_timeout = poll_timeout
+        self.batch_size = batch_size
+        self.wait_timeout = 1.0
+        self.queue: "queue.Queue[Message]" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._log = logger
+        self._stop = threading.Event()
+        self._thr: Optional[threading.Thread] = None
+        self.counters = {"polls": 0, "updates": 0, "messages": 0, "errors": 0, "queue_full_waits": 0}
+        self.last_poll_ms = None
+
+    def start(self):
+        super().start()
+        if self._thr and self._thr.is_alive():
+            return
+        self._stop.clear()
+        self._thr = threading.Thread(target=self._run, name="telegram-prefetch", daemon=True)
+        self._thr.start()
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                results = self._get_updates(self.poll_timeout, self.limit)
+            except requests.exceptions.Timeout:
+                continue  # long-poll hết hạn là bình thường
+            except Exception as e:
+                self.counters["errors"] += 1
+                if self._log:
+                    self._log.warning(f"[telegram] getUpdates lỗi: {e} (thử lại sau {backoff:.0f}s)")
+                if self._stop.wait(backoff):
+                    return
+                backoff = min(backoff * 2, 30.0)
+                continue
+            backoff = 1.0
+            self.counters["polls"] += 1
+            self.last_poll_ms = round((time.monotonic() - started) * 1000, 1)
+            if not results:
+                continue
+            for upd in results:
+                m = update_to_message(upd)
+                if m is not None and not self._handoff(m):
+                    return  # đang dừng: offset chưa tiến → lần chạy sau nhận lại lượt này
+            self.counters["updates"] += len(results)
+            self.offset = max(self.offset or 0, max(u.get("update_id", 0) for u in results))
+
+    def _handoff(self, m: Message) -> bool:
+        while not self._stop.is_set():
+            try:
+                self.queue.put(m, timeout=self.wait_timeout)
+                self.counters["messages"] += 1
+                return True
+            except queue.Full:
+                self.counters["queue_full_waits"] += 1
+        return False
+
+    def get_new_messages(self) -> List[Message]:
+        return drain(self.queue, self.wait_timeout, self.batch_size)
+
+    def close(self):
+        self._stop.set()
+        if self._thr:
+            # Có thể đang giữa một long-poll — thread daemon, không chờ hết POLL_TIMEOUT
+            self._thr.join(timeout=1.0)
+        super().close()
+
+    def stats(self):
+        return dict(self.counters, offset=self.offset, last_poll_ms=self.last_poll_ms,
+                    queue_depth=self.queue.qsize(), queue_size=self.queue.maxsize)
+
+class TelegramWebhookConnector(TelegramConnector):
+    """Nhận update qua webhook thay vì getUpdates: Telegram POST từng update tới server nhỏ
+    trong process (connectors.webhook_server), update hợp lệ vào hàng đợi có giới hạn và
+    vòng lặp bot lấy ra ngay — không còn long-poll + ngủ `poll_interval_seconds`.
+
+    - Header X-Telegram-Bot-Api-Secret-Token phải khớp `secret_token`, sai → 401.
+    - Trùng update_id (Telegram gửi lại khi không nhận được 200 kịp) → 200, bỏ qua.
+    - Hàng đợi đầy → 429 + Retry-After (Telegram giữ update, gửi lại sau); đang dừng → 503.
+      update bị từ chối không được ghi nhận là đã thấy → lần gửi lại vẫn được nhận.
+    """
+    blocking = True
+
+    def __init__(self, bot_token: str, secret_token: str = "", host: str = "0.0.0.0", port: int = 8443,
+                 path: str = "/telegram/webhook", public_url: str = "", queue_size: int = 1000,
+                 max_connections: int = 40, dedup_size: int = 10000, batch_size: int = 100,
+                 api_base: str = API_BASE, logger=None):
+        super().__init__(bot_token, api_base)
+        if not secret_token:
+            if not public_url:
+                raise ValueError("webhook mode cần secret token (credentials.json: telegram.webhook_secret)")
+            # Tự đăng ký webhook → tự sinh secret cho phiên này
+            secret_token = secrets.token_urlsafe(32)
+        self.secret_token = secret_token.encode("utf-8")
+        self.public_url = public_url
+        self.path = path
+        self.max_connections = max_connections
+        self.dedup_size = dedup_size
+        self.batch_size = batch_size
+        self.wait_timeout = 1.0  # get_new_messages chờ tối đa chừng này để vòng lặp còn kiểm tra _stop
+        self.queue: "queue.Queue[Message]" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._accepting = False
+        self._log = logger
+        self.server = WebhookServer(host, port, logger=logger)
+        self.server.route(path, self._on_update)
+        self.counters = {"received": 0, "accepted": 0, "duplicates": 0, "rejected_full": 0,
+                         "unauthorized": 0, "bad_request": 0}
+
+    def _on_update(self, req):
+        token = req.headers.get(SECRET_HEADER, "").encode("utf-8", "replace")
+        with self._lock:
+            self.counters["received"] += 1
+            if not hmac.compare_digest(token, self.secret_token):
+                self.counters["unauthorized"] += 1
+                return 401, "unauthorized"
+            if not self._accepting:
+                return 503, "stopping", {"Retry-After": "5"}
+        try:
+            upd = req.json()
+            update_id = int(upd["update_id"])
+        except (ValueError, KeyError, TypeError):
+            with self._lock:
+                self.counters["bad_request"] += 1
+            return 400, "bad update"
+        m = update_to_message(upd)
+        with self._lock:
+            if update_id in self._seen:
+                self.counters["duplicates"] += 1
+                return 200, "ok"
+            if m is not None:
+                try:
+                    self.queue.put_nowait(m)
+                except queue.Full:
+                    self.counters["rejected_full"] += 1
+                    return 429, "queue full", {"Retry-After": "1"}
+            self._seen[update_id] = None
+            if len(self._seen) > self.dedup_size:
+                self._seen.popitem(last=False)
+            self.counters["accepted"] += 1
+        return 200, "ok"
+
+    def get_new_messages(self) -> List[Message]:
+        return drain(self.queue, self.wait_timeout, self.batch_size)
+
+    def set_webhook(self):
+        r = self.s.post(
+            self.api_url.format(token=self.token, method="setWebhook"),
+            json={"url": self.public_url.rstrip("/") + self.path,
+                  "secret_token": self.secret_token.decode("utf-8"),
+                  "allowed_updates": ALLOWED_UPDATES,
+                  "max_connections": self.max_connections},
+            timeout=12
+        )
+        r.raise_for_status()
+        return r.json()
+
+    def start(self):
+        super().start()
+        self._accepting = True
+        self.server.start()
+        if self._log:
+            host, port = self.server.address
+            self._log.info(f"[telegram] webhook đang nghe ở http://{host}:{port}{self.path}")
+        if self.public_url:
+            self.set_webhook()
+
+    def close(self):
+        self._accepting = False
+        self.server.stop()
+        super().close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, queue_depth=self.queue.qsize(), queue_size=self.queue.maxsize)
+
 # --- BEGIN REMINDER UPGRADE ---
 import re
 try:
-    from ..reminders.scheduler import ReminderScheduler
-    from ..reminders.service import handle_message, acknowledge_if_cycle
+    # import tuyệt đối như bot.py (`python bot.py` chạy từ thư mục gốc dự án)
+    from reminders.scheduler import ReminderScheduler
+    from reminders.service import handle_message, acknowledge_if_cycle
 except Exception as _e:
     print("[telegram] reminder modules not available:", _e)
     ReminderScheduler = None
 
+_reminder_connector: Optional[TelegramConnector] = None
+REMINDER_SEND_TIMEOUT = 30.0
+
 def _send_reminder(chat_id: str, text: str, meta: dict):
     try:
-        send_message(chat_id, text)  # dùng hàm gửi sẵn có của connector
+        # Làn BULK (trả lời người dùng đi trước); chờ kết quả gửi thật để scheduler ghi đúng
+        # cycle["sends"] (403, 429 hết lượt thử... là lỗi, không phải "đã xếp hàng")
+        _reminder_connector.send_and_wait(chat_id, text, priority=BULK,
+                                          timeout=meta.get("timeout") or REMINDER_SEND_TIMEOUT)
     except Exception as e:
         print("[telegram] failed to send reminder:", e)
+        raise  # scheduler ghi lỗi vào cycle["sends"]
 
 _scheduler_instance = None
-def start_reminder_scheduler():
-    global _scheduler_instance
+def start_reminder_scheduler(connector: Optional[TelegramConnector] = None):
+    global _scheduler_instance, _reminder_connector
+    if connector is not None:
+        _reminder_connector = connector
     if ReminderScheduler and _scheduler_instance is None:
         _scheduler_instance = ReminderScheduler(_send_reminder)
         _scheduler_instance.start()
         print("[telegram] ReminderScheduler started")
+    return _scheduler_instance
+
+def stop_reminder_scheduler():
+    """Dừng scheduler và flush kho nhắc nhở (write-back cache của Pantry giữ tới vài giây thay đổi)."""
+    global _scheduler_instance
+    if _scheduler_instance is not None:
+        _scheduler_instance.stop()
+        _scheduler_instance = None
+        print("[telegram] ReminderScheduler stopped")
 
 def on_incoming_text(user_id: str, chat_id: str, text: str):
+    if ReminderScheduler is None:
+        return
     resp = handle_message(user_id, chat_id, text)
     if resp:
-        send_message(chat_id, resp)
+        if _reminder_connector is None:
+            print("[telegram] reminder reply dropped: start_reminder_scheduler(connector) chưa được gọi")
+            return
+        _reminder_connector.send_message(chat_id, resp)
         return
     # Heuristic ack: nếu text chứa cycle key (tùy bạn cải tiến theo reply_to_message)
     m = re.search(r"(\w{8}-\w{4}-\w{4}-\w{4}-\w{12}@\d{12})", text)
@@ -0,0 +1,128 @@
+# connectors/webhook_server.py
+# HTTP server nhỏ (stdlib, không cần Flask) nhận webhook của các nền tảng chat.
+# Mỗi route là một hàm WebhookRequest -> (status, body[, headers]); server chỉ đọc request
+# (có giới hạn kích thước) và ghi response — kiểm tra chữ ký, khử trùng, xếp hàng... do connector làm.
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+MAX_BODY = 1 << 20  # 1 MB — một update Telegram/Facebook chỉ vài KB
+
+class WebhookRequest:
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method: str, path: str, query: Dict[str, str], headers, body: bytes):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers  # http.client.HTTPMessage: tra cứu không phân biệt hoa thường
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body.decode("utf-8"))
+
+Handler = Callable[[WebhookRequest], Tuple]
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = "chatbot-webhook"
+    protocol_version = "HTTP/1.1"  # keep-alive: Telegram/Facebook gửi nhiều update trên một kết nối
+    # Header và body được ghi thành hai lần → tắt Nagle, tránh chờ delayed ACK ~40 ms mỗi response
+    disable_nagle_algorithm = True
+
+    def _dispatch(self):
+        app: "WebhookServer" = self.server.app
+        parts = urlsplit(self.path)
+        route = app.routes.get(parts.path)
+        if route is None:
+            return self._reply(404, "not found")
+        handler, methods = route
+        if self.command not in methods:
+            return self._reply(405, "method not allowed", {"Allow": ", ".join(methods)})
+        length = self.headers.get("Content-Length")
+        if self.command == "POST" and length is None:
+            return self._reply(411, "length required")
+        try:
+            length = int(length or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Không biết body dài bao nhiêu → không đọc tiếp được request sau trên kết nối này
+            self.close_connection = True
+            return self._reply(400, "bad content-length")
+        if length > app.max_body:
+            self.close_connection = True
+            return self._reply(413, "payload too large")
+        body = self.rfile.read(length) if length else b""
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        try:
+            result = handler(WebhookRequest(self.command, parts.path, query, self.headers, body))
+        except Exception as e:
+            if app.logger:
+                app.logger.exception(f"[webhook] lỗi xử lý {parts.path}: {e}")
+            return self._reply(500, "internal error")
+        self._reply(*result)
+
+    do_GET = do_POST = _dispatch
+
+    def _reply(self, status: int, body: Any = b"", headers: Optional[Dict[str, str]] = None):
+        if isinstance(body, (dict, list)):
+            data, ctype = json.dumps(body).encode("utf-8"), "application/json"
+        else:
+            data = body if isinstance(body, bytes) else str(body).encode("utf-8")
+            ctype = "text/plain; charset=utf-8"
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        # Mỗi update một dòng log thì quá ồn → chỉ ở mức DEBUG
+        app = self.server.app
+        if app.logger:
+            app.logger.debug("[webhook] " + fmt % args)
+
+class WebhookServer:
+    """Chạy trong thread nền; mỗi kết nối một thread (ThreadingHTTPServer).
+
+    port=0 → hệ điều hành chọn cổng trống (xem `address`), tiện khi thử cục bộ.
+    """
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 8443, max_body: int = MAX_BODY, logger=None):
+        self.host = host
+        self.port = port
+        self.max_body = max_body
+        self.logger = logger
+        self.routes: Dict[str, Tuple[Handler, Tuple[str, ...]]] = {}
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thr: Optional[threading.Thread] = None
+
+    def route(self, path: str, handler: Handler, methods=("POST",)):
+        self.routes[path] = (handler, tuple(methods))
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._httpd.server_address[:2] if self._httpd else (self.host, self.port)
+
+    def start(self):
+        if self._httpd is not None:
+            return
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _RequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.app = self
+        self._thr = threading.Thread(target=self._httpd.serve_forever, name="webhook-server", daemon=True)
+        self._thr.start()
+
+    def stop(self):
+        if self._httpd is None:
+            return
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._httpd = None
+        if self._thr:
+            self._thr.join(timeout=2.0)
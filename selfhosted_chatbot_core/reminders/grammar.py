@@ -0,0 +1,150 @@
+"""Cú pháp tin nhắn nhắc nhở, biên dịch một lần lúc import.
+
+Tạo:  nhắc [nhở] [tôi] [lúc|vào] 7h30 [sáng|chiều|tối|pm] [mai] [ngày 20/10] [mỗi ngày] <nội dung>
+      nội dung: trong ngoặc kép, sau "nội dung", sau dấu ":" hoặc phần chữ còn lại.
+      Giờ là số trần ("nhắc 7 ...") chỉ được nhận khi có dấu mở đầu nội dung ngay sau ("nhắc 7: ...");
+      "10 phút nữa", "2 tiếng", "2 lần" không phải giờ.
+      Ngày có thể đứng trước giờ: "nhắc tôi ngày 20/10 lúc 8h: mua hoa".
+Tắt:  tắt|hủy|xoá [hết] nhắc [nhở] [lúc] 7h30
+
+Cả hai dạng đều chứa "nhắc" → tin không có chữ này (tin ASCII thuần, "tắt đèn"...) bị loại
+bằng vài phép tìm chuỗi, không chạy regex nào.
+"""
+import datetime, re, unicodedata
+from typing import Iterable, List, Optional
+from .scheduler import now_local
+
+KEYWORD = "nhắc"
+_CANCEL_VERBS = ("tắt", "hủy", "huỷ", "xóa", "xoá", "bỏ")
+
+# Các regex chạy trên bản lower() của tin → không cần re.I (chậm hơn đáng kể với tiếng Việt)
+_TIME = (r"(?P<hour>\d{1,2})"
+         r"(?:\s*(?P<unit>h|giờ)\s*(?P<m1>\d{2}(?![/\-\d]))?(?:\s*(?:phút|p)(?!\w))?|:(?P<m2>\d{2}))?"
+         r"(?:\s*(?P<period>sáng|trưa|chiều|tối|đêm|am|pm)(?!\w))?")
+_DATE_BODY = r"\d{1,2}\s*(?:/|-|\s+tháng\s+)\s*\d{1,2}(?:\s*(?:/|-|\s+năm\s+)\s*\d{4})?"
+
+_CREATE = re.compile(
+    r"nhắc(?:\s*nhở)?"
+    r"(?:\s+(?:tôi|tui|mình|mk|em|e|anh|chị|tớ|con|bọn\s*mình)(?!\w))?"
+    r"(?:\s+(?:lúc|vào(?:\s+lúc)?))?\s*"
+    r"(?:ngày\s*" + _DATE_BODY + r"\s*,?\s*(?:(?:lúc|vào)\s*)?)?"
+    + _TIME +
+    r"(?:\s*(?P<rel>ngày\s*mai|mai|hôm\s*nay|tomorrow|today)(?!\w))?")
+_CANCEL = re.compile(
+    r"(?:" + "|".join(_CANCEL_VERBS) + r")\s+(?:hết\s+|mọi\s+|tất\s*cả\s+)?(?:các\s+)?nhắc(?:\s*nhở)?"
+    r"(?:\s+(?:lúc|vào))?\s*" + _TIME)
+_DATE = re.compile(
+    r"(?:ngày\s*)?(?P<day>\d{1,2})\s*(?:/|-|\s+tháng\s+)\s*(?P<month>\d{1,2})"
+    r"(?:\s*(?:/|-|\s+năm\s+)\s*(?P<year>\d{4}))?(?!\d)")
+_DAILY = re.compile(r"(?:hằng|hàng|mỗi)\s*ngày|every\s*day|daily")
+# Dấu mở đầu nội dung: ngoặc kép, "[với] nội dung [là]", ":" — dấu nào đứng trước thì dùng dấu đó
+_MARK = re.compile(r"[\"“:]|(?:với\s+)?nội\s*dung(?:\s*là)?\s*:?")
+_STRIP = " \t\r\n,.;-–—\"“”'"
+# Số sau "nhắc" là khoảng thời gian / số lần, không phải giờ: "10 phút nữa", "2 tiếng", "2 lần"
+_NOT_CLOCK = re.compile(r"\s*(?:(?:h|giờ|phút|p|tiếng|ngày|tuần)\s*nữa|phút|tiếng|lần|bận)(?!\w)")
+
+def _none() -> dict:
+    return {"action": "none"}
+
+def _hhmm(m: "re.Match") -> Optional[str]:
+    hour, m1, m2, period = m.group("hour", "m1", "m2", "period")
+    hour = int(hour)
+    minute = int(m1 or m2 or 0)
+    if period:
+        if period in ("chiều", "tối", "pm"):
+            hour += 12 if hour < 12 else 0
+        elif period == "trưa":
+            hour += 12 if hour < 6 else 0
+        elif period == "đêm":
+            hour = 0 if hour == 12 else hour + 12 if 6 <= hour < 12 else hour
+        elif hour == 12:  # sáng / am
+            hour = 0
+    if hour > 23 or minute > 59:
+        return None
+    return f"{hour:02d}:{minute:02d}"
+
+def _date(m: "re.Match", today: datetime.date) -> Optional[datetime.date]:
+    day, month, year = m.group("day", "month", "year")
+    try:
+        if year:
+            return datetime.date(int(year), int(month), int(day))
+        d = datetime.date(today.year, int(month), int(day))
+        # "20/1" gửi vào tháng 12 → năm sau
+        return d if d >= today else d.replace(year=today.year + 1)
+    except ValueError:
+        return None
+
+def parse(msg: str, today: Optional[datetime.date] = None) -> dict:
+    """{"action": "create", "time", "date", "repeat", "text"} | {"action": "cancel", "time"} | {"action": "none"}.
+
+    repeat: "daily" | "once" (có ngày) | "once_today" (chưa có ngày, service gán hôm nay).
+    """
+    # Lọc bằng tìm chuỗi (nhắc / Nhắc / NHẮC); chỉ tin dạng NFD (gõ dấu rời) mới phải
+    # chuẩn hoá rồi tìm lại
+    if not msg or ("nhắc" not in msg and "Nhắc" not in msg and "NHẮC" not in msg):
+        if not msg or msg.isascii() or unicodedata.is_normalized("NFC", msg):
+            return _none()
+        msg = unicodedata.normalize("NFC", msg)
+    low = msg.lower()
+    pos = low.find(KEYWORD)
+    if pos < 0:
+        return _none()
+    if len(low) != len(msg):
+        msg = low  # lower() đổi độ dài (hiếm) → vị trí trên low không dùng được cho msg
+
+    before = low[max(0, pos - 12):pos]
+    if any(v in before for v in _CANCEL_VERBS):
+        m = _CANCEL.search(low, max(0, pos - 12))
+        if m:
+            t = _hhmm(m)
+            return {"action": "cancel", "time": t} if t else _none()
+
+    m = _CREATE.match(low, pos) or _CREATE.search(low, pos + 1)
+    if not m:
+        return _none()
+    t = _hhmm(m)
+    if t is None or _NOT_CLOCK.match(low, m.end("hour")):
+        return _none()
+    # Số trần (không h/giờ/:mm/sáng/pm...) chỉ là giờ khi ngay sau nó là nội dung có dấu mở đầu
+    bare = not (m.group("unit") or m.group("m2") or m.group("period"))
+    mark = _MARK.search(low, m.end())
+    scope = low[m.start():mark.start() if mark else len(low)]
+    daily = _DAILY.search(scope) if ("ngày" in scope or "day" in scope or "daily" in scope) else None
+    dm = _DATE.search(scope) if ("/" in scope or "-" in scope or "tháng" in scope) else None
+    if bare and (not mark or _DATE.sub("", _DAILY.sub("", low[m.end():mark.start()])).strip(_STRIP)):
+        return _none()
+    if mark:
+        text = msg[mark.end():]
+        if mark.group() in ("\"", "“"):
+            close = [i for i in (text.find("\""), text.find("”")) if i >= 0]
+            text = text[:min(close)] if close else text
+    else:
+        # Không có dấu mở đầu: nội dung là phần chữ còn lại sau khi bỏ ngày / "mỗi ngày"
+        cut = sorted((f.start() + m.start(), f.end() + m.start()) for f in (dm, daily) if f)
+        text, at = "", m.end()
+        for a, b in cut:
+            if a >= at:
+                text += msg[at:a] + " "
+                at = b
+        text += msg[at:]
+        text = " ".join(text.split())
+    text = text.strip(_STRIP)
+
+    today = today or now_local().date()
+    date = None
+    if dm:
+        date = _date(dm, today)
+        if date is None:
+            return _none()
+    elif m.group("rel"):
+        rel = m.group("rel")
+        date = today + datetime.timedelta(days=1) if ("mai" in rel or rel == "tomorrow") else today
+    if daily:
+        return {"action": "create", "time": t, "date": None, "repeat": "daily", "text": text}
+    return {"action": "create", "time": t, "date": date.isoformat() if date else None,
+            "repeat": "once" if date else "once_today", "text": text}
+
+def parse_many(msgs: Iterable[str], today: Optional[datetime.date] = None) -> List[dict]:
+    """parse() cho cả lô tin (vd. một lượt getUpdates); tính "hôm nay" một lần."""
+    today = today or now_local().date()
+    return [parse(msg, today) for msg in msgs]
@@ -0,0 +1,129 @@
+import math, os, socket, sqlite3, threading, time, uuid, zlib
+from typing import Callable, FrozenSet, Optional
+
+def shard_of(reminder_id: str, shards: int) -> int:
+    return zlib.crc32(reminder_id.encode("utf-8")) % shards
+
+class LeaseManager:
+    """Chia `shards` phần nhắc nhở cho các process cùng máy qua bảng lease trong SQLite.
+
+    Mỗi worker giữ tối đa ceil(shards / số worker còn sống) shard; lease có hạn `ttl`
+    (= 3/4 `lease_seconds`) và được gia hạn mỗi 1/4 `lease_seconds`; worker im quá `ttl` bị
+    loại khỏi danh sách còn sống → worker chết thì shard của nó được worker khác nhận trong
+    vòng một `lease_seconds`.
+    Mọi thay đổi lease đi qua `UPDATE ... WHERE owner=? / expires_at<?` trong transaction
+    BEGIN IMMEDIATE nên hai worker không thể cùng giữ một shard còn hạn.
+    """
+
+    def __init__(self, path: str, shards: int, lease_seconds: float = 30.0, worker_id: Optional[str] = None,
+                 on_change: Optional[Callable[[FrozenSet[int]], None]] = None):
+        self.path = path
+        self.shards = max(1, int(shards))
+        self.lease_seconds = lease_seconds
+        self.ttl = lease_seconds * 0.75
+        self.renew_every = lease_seconds * 0.25
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.on_change = on_change
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+        CREATE TABLE IF NOT EXISTS leases (shard INTEGER PRIMARY KEY, owner TEXT, expires_at REAL NOT NULL DEFAULT 0);
+        CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, seen_at REAL NOT NULL);
+        """)
+        self._db.executemany("INSERT OR IGNORE INTO leases (shard, owner, expires_at) VALUES (?, NULL, 0)",
+                             [(i,) for i in range(self.shards)])
+        self._lock = threading.Lock()
+        self._owned: FrozenSet[int] = frozenset()
+        self._valid_until = 0.0  # time.monotonic() — hết hạn cục bộ, tính từ TRƯỚC lúc gia hạn
+        self._stop = threading.Event()
+        self._thr = None
+
+    def owns(self, shard: int) -> bool:
+        return shard in self._owned and time.monotonic() < self._valid_until
+
+    def owns_key(self, reminder_id: str) -> bool:
+        return self.owns(shard_of(reminder_id, self.shards))
+
+    @property
+    def owned(self) -> FrozenSet[int]:
+        return self._owned if time.monotonic() < self._valid_until else frozenset()
+
+    def renew(self) -> FrozenSet[int]:
+        """Một vòng: báo còn sống, gia hạn shard đang giữ, trả bớt/nhận thêm cho cân bằng."""
+        started = time.monotonic()
+        now = time.time()
+        expires = now + self.ttl
+        me = self.worker_id
+        db = self._db
+        with self._lock:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("INSERT OR REPLACE INTO workers VALUES (?, ?)", (me, now))
+                # Worker im quá `ttl` (lease của nó cũng vừa hết) → không tính là còn sống nữa,
+                # nếu không `target` của các worker khác vẫn chia cho nó và shard bỏ trống thêm 1/4 lease
+                db.execute("DELETE FROM workers WHERE seen_at < ?", (now - self.ttl,))
+                alive = db.execute("SELECT COUNT(*) FROM workers").fetchone()[0]
+                target = math.ceil(self.shards / max(1, alive))
+                db.execute("UPDATE leases SET expires_at=? WHERE owner=? AND expires_at>=?", (expires, me, now))
+                owned = [r[0] for r in db.execute("SELECT shard FROM leases WHERE owner=? AND expires_at>=? ORDER BY shard",
+                                                  (me, now))]
+                if len(owned) > target:
+                    # Có worker mới → trả bớt để họ nhận
+                    extra = owned[target:]
+                    db.executemany("UPDATE leases SET owner=NULL, expires_at=0 WHERE shard=? AND owner=?",
+                                   [(s, me) for s in extra])
+                    owned = owned[:target]
+                elif len(owned) < target:
+                    free = [r[0] for r in db.execute(
+                        "SELECT shard FROM leases WHERE owner IS NULL OR expires_at<? ORDER BY shard LIMIT ?",
+                        (now, target - len(owned)))]
+                    for s in free:
+                        cur = db.execute("UPDATE leases SET owner=?, expires_at=? WHERE shard=? AND (owner IS NULL OR expires_at<?)",
+                                         (me, expires, s, now))
+                        if cur.rowcount == 1:
+                            owned.append(s)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            changed = frozenset(owned) != self._owned
+            self._owned = frozenset(owned)
+            self._valid_until = started + self.ttl
+        if changed and self.on_change:
+            self.on_change(self._owned)
+        return self._owned
+
+    def release(self):
+        with self._lock:
+            self._db.execute("UPDATE leases SET owner=NULL, expires_at=0 WHERE owner=?", (self.worker_id,))
+            self._db.execute("DELETE FROM workers WHERE worker_id=?", (self.worker_id,))
+            self._owned = frozenset()
+            self._valid_until = 0.0
+
+    def start(self):
+        if self._thr and self._thr.is_alive():
+            return
+        self._stop.clear()
+        self._thr = threading.Thread(target=self._run, name="reminder-lease", daemon=True)
+        self._thr.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.renew()
+            except Exception as e:
+                print("[lease] renew error:", e)
+            if self._stop.wait(self.renew_every):
+                return
+
+    def stop(self):
+        self._stop.set()
+        if self._thr:
+            self._thr.join(timeout=2.0)
+        try:
+            self.release()
+        except Exception as e:
+            print("[lease] release error:", e)
+        self._db.close()
@@ -0,0 +1,36 @@
+"""Nhập document Pantry hiện có ({"reminders": {...}, "cycles": {...}}) vào kho SQLite.
+
+Chạy từ thư mục gốc dự án (cần PANTRY_BIN_ID hoặc PANTRY_URL nếu đọc trực tiếp từ Pantry):
+    python -m reminders.migrate [--db data/reminders.db] [--from-file dump.json]
+Sau đó đặt "reminders": {"store": "sqlite"} trong config/settings.json.
+"""
+import argparse, json, os
+
+from utils import pantry
+from .store import DEFAULT_SQLITE_PATH, SQLiteReminderStore
+
+def migrate(doc: dict, store: SQLiteReminderStore):
+    reminders = [dict(r, id=r.get("id") or rid) for rid, r in (doc.get("reminders") or {}).items()]
+    cycles = list((doc.get("cycles") or {}).items())
+    return store.add_many(reminders, cycles)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Import a Pantry reminder document into SQLite")
+    ap.add_argument("--db", default=DEFAULT_SQLITE_PATH, help="SQLite file (default: data/reminders.db)")
+    ap.add_argument("--from-file", help="read the document from a JSON dump instead of Pantry")
+    args = ap.parse_args(argv)
+
+    if args.from_file:
+        with open(args.from_file, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+    else:
+        doc = pantry.load_all()
+    store = SQLiteReminderStore(os.path.abspath(args.db))
+    try:
+        n_rem, n_cyc = migrate(doc, store)
+    finally:
+        store.close()
+    print(f"Imported {n_rem} reminders, {n_cyc} cycles into {args.db}")
+
+if __name__ == "__main__":
+    main()
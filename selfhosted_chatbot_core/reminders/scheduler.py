@@ -1,6 +1,13 @@
-import threading, time, datetime, json, os
-from typing import Callable, Dict, Any
-from ..utils import pantry
+import heapq, itertools, math, threading, time, datetime, os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from .lease import LeaseManager
+from .store import BASE_DIR, ReminderStore, SQLiteReminderStore, get_store, reminder_settings
+from utils.config_cache import load_cached
+from utils import metrics
+
+TICK_SECONDS = metrics.histogram("reminder_tick_seconds", "Thời gian một tick có nhắc nhở đến hạn: gửi + ghi kho (giây)")
+SEND_SECONDS = metrics.histogram("reminder_send_seconds", "Thời gian gửi một tin nhắc nhở (giây)", ("result",))
 
 TZ_OFFSET_MINUTES = 7*60  # UTC+7
 
@@ -13,108 +20,491 @@ def parse_hhmm(s: str) -> datetime.time:
     mm = int(parts[1]) if len(parts) > 1 else 0
     return datetime.time(hour=hh, minute=mm)
 
+STEP_OFFSETS = {2: 600, 3: 1200}  # bước 2 sau 10', bước 3 sau 20' kể từ t0
+CLEANUP_AFTER = 1800               # dọn chu kỳ sau 30'
+ON_TIME_SECONDS = 60               # trễ hơn mức này thì tính là gửi muộn
+MAX_SLEEP = 60.0                   # ngủ tối đa (phòng đồng hồ hệ thống bị chỉnh)
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+def _ts(dt: datetime.datetime) -> float:
+    return (dt - _EPOCH).total_seconds()
+
+class _Send:
+    """Một lần gửi đã giành được trong tick; kết quả được ghi lại vào cycle sau khi gửi xong."""
+    __slots__ = ("cycle_key", "step", "chat_id", "text", "meta", "due", "sends",
+                 "started", "elapsed", "error", "sent_at", "timed_out")
+
+    def __init__(self, cycle_key: str, step: int, chat_id: str, text: str, meta: Dict[str, Any],
+                 due: datetime.datetime, sends: Optional[dict] = None):
+        self.cycle_key = cycle_key
+        self.step = step
+        self.chat_id = chat_id
+        self.text = text
+        self.meta = meta
+        self.due = due
+        self.sends = sends or {}
+        self.started = None   # time.monotonic() lúc worker bắt đầu gửi
+        self.elapsed = None
+        self.error = None
+        self.sent_at = None
+        self.timed_out = False
+
 class ReminderScheduler:
-    def __init__(self, send_func: Callable[[str, str, Dict[str, Any]], None]):
+    """Scheduler theo sự kiện: heap (thời điểm đến hạn) gồm lần nhắc đầu của mỗi reminder
+    và bước kế tiếp của mỗi cycle (bước 2 +10', bước 3 +20', dọn +30').
+    Thread ngủ tới sự kiện gần nhất; kho báo thay đổi (thêm/tắt nhắc nhở, ack) → thức dậy ngay.
+
+    Trễ hạn (bot tắt, máy chậm):
+    - lần nhắc đầu trễ ≤ `misfire_grace` giây → gửi ngay; trễ hơn → `misfire_policy`:
+      "skip" bỏ lần đó (nhắc một lần thì xoá luôn), "fire" vẫn gửi bù một lần;
+    - bước 2/3 trễ → chỉ gửi bước mới nhất; cycle đã quá 30' → dọn, không gửi.
+
+    Chạy nhiều process (`reminders.sharding.enabled`): reminder chia vào N shard theo crc32(id),
+    mỗi process chỉ xử lý shard mình đang giữ lease (xem lease.LeaseManager). Mỗi bước nhắc được
+    "giành" bằng CAS trong kho (create_cycle / advance_cycle) TRƯỚC khi gửi → không gửi trùng;
+    nếu process chết giữa lúc giành và lúc gửi thì bước đó mất (tối đa một lần).
+
+    Mỗi tick: lấy hết sự kiện đến hạn, giành theo lô (một transaction), gửi song song qua pool
+    `send_workers` thread với hạn `send_timeout` giây mỗi lần gửi, rồi ghi kết quả
+    (cycle["sends"], last_fired...) vào kho một lần.
+    """
+
+    def __init__(self, send_func: Callable[[str, str, Dict[str, Any]], None], store: Optional[ReminderStore] = None,
+                 misfire_grace: Optional[float] = None, misfire_policy: Optional[str] = None,
+                 resync_interval: Optional[float] = None, lease: Optional[LeaseManager] = None,
+                 send_workers: Optional[int] = None, send_timeout: Optional[float] = None):
+        cfg = reminder_settings()
         self._send = send_func
+        self._store = store or get_store()
+        shard_cfg = cfg.get("sharding", {})
+        if (lease is not None or shard_cfg.get("enabled")) and not isinstance(self._store, SQLiteReminderStore):
+            # create_cycle/advance_cycle chỉ là CAS thật trên SQLite; kho khác → hai worker có thể gửi trùng
+            raise ValueError("reminders.sharding cần reminders.store = \"sqlite\" "
+                             f"(đang dùng {type(self._store).__name__})")
+        self.misfire_grace = float(cfg.get("misfire_grace_seconds", 600) if misfire_grace is None else misfire_grace)
+        self.misfire_policy = (misfire_policy or cfg.get("misfire_policy", "skip")).lower()
+        # Đọc lại toàn bộ kho định kỳ: bắt thay đổi từ process khác (listener chỉ thấy ghi trong process này)
+        self.resync_interval = float(cfg.get("resync_seconds", 600) if resync_interval is None else resync_interval)
+        self._heap = []
+        self._live: Dict[Tuple[str, str], int] = {}  # (kind, key) → seq của entry còn hiệu lực trong heap
+        self._seq = itertools.count()
+        self._dirty = set()
+        self._cv = threading.Condition()
         self._stop = threading.Event()
         self._thr = None
+        self.counters = {"fired": 0, "followups": 0, "late": 0, "misfired": 0, "wakeups": 0,
+                         "send_errors": 0, "send_timeouts": 0}
+        self.last_tick: Dict[str, Any] = {}
+        self.send_workers = int(cfg.get("send_workers", 8) if send_workers is None else send_workers)
+        self.send_timeout = float(cfg.get("send_timeout_seconds", 30) if send_timeout is None else send_timeout)
+        self._pool = (ThreadPoolExecutor(max_workers=self.send_workers, thread_name_prefix="reminder-send")
+                      if self.send_workers > 1 else None)
+        self._store.add_listener(self._on_change)
+        if lease is None and shard_cfg.get("enabled"):
+            path = shard_cfg.get("lease_path") or "data/reminder_leases.db"
+            lease = LeaseManager(path if os.path.isabs(path) else os.path.join(BASE_DIR, path),
+                                 shards=int(shard_cfg.get("shards", 8)),
+                                 lease_seconds=float(shard_cfg.get("lease_seconds", 30)))
+        self.lease = lease
+        self._resync_needed = False
+        if lease is not None:
+            lease.on_change = self._on_lease_change
+        # Nhiều process cùng ghi một kho → hỏi kho các bản ghi mới đổi (process khác tạo/ack)
+        self.poll_interval = float(shard_cfg.get("poll_seconds", 2))
+        self._polled_at = time.time()
 
     def start(self):
         if self._thr and self._thr.is_alive():
             return
         self._stop.clear()
-        self._thr = threading.Thread(target=self._run, daemon=True)
+        self._thr = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
         self._thr.start()
 
     def stop(self):
         self._stop.set()
+        with self._cv:
+            self._cv.notify_all()
         if self._thr:
             self._thr.join(timeout=1.0)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+        self._store.remove_listener(self._on_change)
+        if self.lease is not None:
+            self.lease.stop()
+        try:
+            self._store.flush()
+        except Exception as e:
+            print("[scheduler] store flush error:", e)
+
+    def _on_change(self, kind: str, key: str):
+        with self._cv:
+            self._dirty.add((kind, key))
+            self._cv.notify()
+
+    def _on_lease_change(self, owned):
+        print("[scheduler] shards owned:", sorted(owned))
+        with self._cv:
+            self._resync_needed = True
+            self._cv.notify()
+
+    def _owns(self, key: str) -> bool:
+        # cycle_key "rid@..." nằm cùng shard với reminder của nó
+        return self.lease is None or self.lease.owns_key(key.split("@", 1)[0])
+
+    def _poll_changes(self):
+        started = time.time()
+        # Lùi 1 s: bản ghi commit ngay sát mốc lần hỏi trước
+        rids, keys = self._store.changed_since(self._polled_at - 1.0)
+        self._polled_at = started
+        with self._cv:
+            self._dirty.update(("reminder", k) for k in rids if self._owns(k))
+            self._dirty.update(("cycle", k) for k in keys if self._owns(k))
 
     def _run(self):
+        if self.lease is not None:
+            try:
+                self.lease.renew()
+            except Exception as e:
+                print("[scheduler] lease error:", e)
+            self.lease.start()
+        try:
+            self.resync()
+        except Exception as e:
+            print("[scheduler] error:", e)
+        next_resync = time.monotonic() + self.resync_interval
+        next_poll = time.monotonic() + self.poll_interval
         while not self._stop.is_set():
+            with self._cv:
+                while not self._stop.is_set() and not self._dirty and not self._resync_needed:
+                    timeout = MAX_SLEEP
+                    if self.resync_interval > 0:
+                        timeout = min(timeout, next_resync - time.monotonic())
+                    if self.lease is not None:
+                        timeout = min(timeout, next_poll - time.monotonic())
+                    if self._heap:
+                        timeout = min(timeout, self._heap[0][0] - _ts(now_local()))
+                    if timeout <= 0:
+                        break
+                    self._cv.wait(timeout)
+            if self._stop.is_set():
+                break
             try:
+                if self.lease is not None and time.monotonic() >= next_poll:
+                    self._poll_changes()
+                    next_poll = time.monotonic() + self.poll_interval
+                if self._resync_needed or (self.resync_interval > 0 and time.monotonic() >= next_resync):
+                    self._resync_needed = False
+                    self.resync()
+                    next_resync = time.monotonic() + self.resync_interval
                 self._tick()
             except Exception as e:
                 print("[scheduler] error:", e)
-            time.sleep(30)
 
-    def _tick(self):
-        data = pantry.load_all()
-        reminders = data.get("reminders", {})
-        cycles = data.get("cycles", {})
+    # --- heap ---
+    def _schedule(self, kind: str, key: str, due: Optional[datetime.datetime]):
+        with self._cv:
+            if due is None:
+                self._live.pop((kind, key), None)
+                return
+            seq = next(self._seq)
+            self._live[(kind, key)] = seq
+            heapq.heappush(self._heap, (_ts(due), seq, kind, key, due))
 
+    def _pop_due(self, now: datetime.datetime):
+        with self._cv:
+            limit = _ts(now)
+            while self._heap and self._heap[0][0] <= limit:
+                _, seq, kind, key, due = heapq.heappop(self._heap)
+                # Entry cũ (đã được lên lịch lại / huỷ) → bỏ qua
+                if self._live.get((kind, key)) == seq:
+                    del self._live[(kind, key)]
+                    return kind, key, due
+            if len(self._heap) > 2 * len(self._live) + 1024:
+                # Dọn entry cũ để heap không phình khi reminder bị sửa/tắt liên tục
+                self._heap = [e for e in self._heap if self._live.get((e[2], e[3])) == e[1]]
+                heapq.heapify(self._heap)
+        return None
+
+    def resync(self):
+        """Dựng lại heap từ toàn bộ kho (lúc khởi động và định kỳ)."""
         now = now_local()
+        entries, live = [], {}
+        for r in self._store.all_reminders():
+            if not self._owns(r["id"]):
+                continue
+            due = self._next_fire(r, now)
+            if due is not None:
+                seq = next(self._seq)
+                live[("fire", r["id"])] = seq
+                entries.append((_ts(due), seq, "fire", r["id"], due))
+        for key, c in self._store.cycles():
+            if not self._owns(key):
+                continue
+            due = self._next_step(c)
+            seq = next(self._seq)
+            live[("cycle", key)] = seq
+            entries.append((_ts(due), seq, "cycle", key, due))
+        heapq.heapify(entries)
+        with self._cv:
+            self._heap, self._live = entries, live
 
-        to_delete = []
-        for rid, r in list(reminders.items()):
-            t = parse_hhmm(r.get("time", "08:00"))
-            date_str = r.get("date")
-            repeat = r.get("repeat", "once")
-            last_fired = r.get("last_fired")
-            chat_id = r.get("chat_id")
-
-            if date_str:
-                y, m, d = [int(x) for x in date_str.split("-")]
-                target_day = datetime.date(y, m, d)
-            else:
-                target_day = now.date()
-
-            target_dt = datetime.datetime.combine(target_day, t)
-
-            if now >= target_dt and (now - target_dt).total_seconds() <= 60:
-                cycle_key = f"{rid}@{target_dt.strftime('%Y%m%d%H%M')}"
-                if cycle_key not in cycles:
-                    msg = self._render_template(1, r.get("text", ""))
-                    self._send(chat_id, msg, {"reminder_id": rid, "step": 1, "cycle_key": cycle_key})
-                    cycles[cycle_key] = {"reminder_id": rid, "chat_id": chat_id, "step": 1, "t0": target_dt.isoformat()}
-                    reminders[rid]["active_cycle_key"] = cycle_key
-                    reminders[rid]["last_fired"] = now.date().isoformat()
-
-            if repeat == "once" and last_fired:
-                lf = datetime.date.fromisoformat(last_fired)
-                base_day = datetime.date.fromisoformat(date_str) if date_str else now.date()
-                if lf >= base_day:
-                    to_delete.append(rid)
-
-        for ckey, c in list(cycles.items()):
+    def _next_fire(self, r: dict, now: datetime.datetime) -> Optional[datetime.datetime]:
+        t = parse_hhmm(r.get("time", "08:00"))
+        # Ngày gần nhất đã xử lý (đã nhắc hoặc đã bỏ qua do trễ) — so sánh chuỗi ISO
+        done_day = max(r.get("last_fired") or "", r.get("last_missed") or "")
+        date_str = r.get("date")
+        if date_str:
+            if done_day >= date_str:
+                return None
+            return datetime.datetime.combine(datetime.date.fromisoformat(date_str), t)
+        # Hằng ngày: lần kế tiếp sau ngày đã xử lý (chưa có → lần đầu sau lúc tạo), KHÔNG tính từ `now`
+        # → lần nhắc lỡ qua nửa đêm (tick trễ, khởi động lại) vẫn về _fire để áp grace/misfire_policy
+        if done_day:
+            day = datetime.date.fromisoformat(done_day[:10]) + datetime.timedelta(days=1)
+        else:
+            day = now.date()
+            try:
+                created = datetime.datetime.fromisoformat(r["created_at"]).replace(tzinfo=None)
+                day = created.date() if datetime.datetime.combine(created.date(), t) >= created \
+                    else created.date() + datetime.timedelta(days=1)
+            except (KeyError, TypeError, ValueError):
+                pass
+        # Chỉ bù lần đến hạn gần nhất; các ngày cũ hơn (bot tắt nhiều ngày) coi như đã qua
+        latest = now.date() if datetime.datetime.combine(now.date(), t) <= now else now.date() - datetime.timedelta(days=1)
+        return datetime.datetime.combine(max(day, latest), t)
+
+    @staticmethod
+    def _next_step(c: dict) -> datetime.datetime:
+        t0 = datetime.datetime.fromisoformat(c["t0"])
+        step = c.get("step", 1)
+        if c.get("ack") or c.get("done") or step >= 3:
+            return t0 + datetime.timedelta(seconds=CLEANUP_AFTER)
+        return t0 + datetime.timedelta(seconds=STEP_OFFSETS[step + 1])
+
+    def _replan(self, kind: str, key: str, now: datetime.datetime):
+        if not self._owns(key):
+            self._schedule("fire" if kind in ("reminder", "fire") else "cycle", key, None)
+        elif kind in ("reminder", "fire"):
+            r = self._store.get_reminder(key)
+            self._schedule("fire", key, self._next_fire(r, now) if r else None)
+        else:
+            c = self._store.get_cycle(key)
+            self._schedule("cycle", key, self._next_step(c) if c else None)
+
+    # --- xử lý sự kiện đến hạn ---
+    def _tick(self):
+        self.counters["wakeups"] += 1
+        with self._cv:
+            dirty, self._dirty = self._dirty, set()
+        now = now_local()
+        for kind, key in dirty:
+            self._replan(kind, key, now)
+        fires, steps = [], []
+        while True:
+            item = self._pop_due(now)
+            if item is None:
+                break
+            kind, key, due = item
+            if not self._owns(key):
+                # Lease vừa hết hạn/chuyển cho worker khác → dựng lại heap theo shard đang giữ
+                self._resync_needed = True
+                continue
+            (fires if kind == "fire" else steps).append((key, due))
+        if not fires and not steps:
+            return
+        started = time.monotonic()
+        reminder_updates: Dict[str, dict] = {}
+        jobs = self._fire(fires, now, reminder_updates) + self._advance_cycles(steps, now)
+        self._dispatch(jobs)
+        self._commit(jobs, reminder_updates, len(fires) + len(steps), started)
+        now = now_local()
+        for key, _ in fires:
+            self._replan("fire", key, now)
+        for key, _ in steps:
+            self._replan("cycle", key, now)
+
+    def _fire(self, items: List[Tuple[str, datetime.datetime]], now: datetime.datetime,
+              reminder_updates: Dict[str, dict]) -> List[_Send]:
+        store = self._store
+        claims, pending, skipped = [], {}, []
+        for rid, target_dt in items:
+            r = store.get_reminder(rid)
+            if r is None or self._next_fire(r, now) != target_dt:
+                continue  # reminder đã bị tắt/sửa sau khi lên lịch → _replan xử lý
+            late = (now - target_dt).total_seconds()
+            day = target_dt.date().isoformat()
+            if late > self.misfire_grace and self.misfire_policy != "fire":
+                self.counters["misfired"] += 1
+                if r.get("repeat", "once") == "once":
+                    skipped.append(rid)
+                else:
+                    reminder_updates[rid] = {"last_missed": day}
+                continue
+            cycle_key = f"{rid}@{target_dt.strftime('%Y%m%d%H%M')}"
+            # Gửi bù → các bước sau tính từ lúc gửi thật
+            t0 = target_dt if late <= ON_TIME_SECONDS else now
+            claims.append((cycle_key, {"reminder_id": rid, "chat_id": r.get("chat_id"), "step": 1, "t0": t0.isoformat()}))
+            pending[cycle_key] = (r, target_dt)
+            reminder_updates[rid] = {"active_cycle_key": cycle_key, "last_fired": day}
+        if skipped:
+            store.delete_reminders(skipped)
+        # Giành bước 1 (INSERT OR IGNORE) rồi mới gửi: worker khác đã giành thì thôi
+        created = store.create_cycles(claims) if claims else []
+        jobs = []
+        for cycle_key in created:
+            r, target_dt = pending[cycle_key]
+            jobs.append(_Send(cycle_key, 1, r.get("chat_id"), self._render_template(1, r.get("text", "")),
+                              {"reminder_id": r["id"], "step": 1, "cycle_key": cycle_key}, target_dt))
+        return jobs
+
+    def _advance_cycles(self, items: List[Tuple[str, datetime.datetime]], now: datetime.datetime) -> List[_Send]:
+        store = self._store
+        claims, pending, finished_once = [], {}, []
+        for ckey, _ in items:
+            c = store.get_cycle(ckey)
+            if c is None:
+                continue
             rid = c["reminder_id"]
-            r = reminders.get(rid)
+            r = store.get_reminder(rid)
             if not r:
-                del cycles[ckey]
-                continue
-            if c.get("ack"):
-                t0 = datetime.datetime.fromisoformat(c["t0"])
-                if (now - t0).total_seconds() >= 1800:
-                    del cycles[ckey]
+                store.delete_cycle(ckey)
                 continue
             t0 = datetime.datetime.fromisoformat(c["t0"])
-            dt = now - t0
-            if c.get("step", 1) == 1 and dt.total_seconds() >= 600:
-                msg = self._render_template(2, r.get("text", ""))
-                self._send(r["chat_id"], msg, {"reminder_id": rid, "step": 2, "cycle_key": ckey})
-                c["step"] = 2
-            elif c.get("step") == 2 and dt.total_seconds() >= 1200:
-                msg = self._render_template(3, r.get("text", ""))
-                self._send(r["chat_id"], msg, {"reminder_id": rid, "step": 3, "cycle_key": ckey})
-                c["step"] = 3
-                c["done"] = True
-                if (now - t0).total_seconds() >= 1800:
-                    del cycles[ckey]
-
-        for rid in to_delete:
-            if rid in reminders:
-                del reminders[rid]
-
-        pantry.save_all({"reminders": reminders, "cycles": cycles})
+            age = (now - t0).total_seconds()
+            finished = c.get("ack") or c.get("done")
+            if age >= CLEANUP_AFTER:
+                if not finished:
+                    self.counters["misfired"] += 1
+                # Hết chu kỳ: nhắc một lần thì xoá luôn reminder (kèm cycle), lặp lại thì chỉ xoá cycle
+                if r.get("repeat", "once") == "once":
+                    finished_once.append(rid)
+                else:
+                    store.delete_cycle(ckey)
+                continue
+            if finished:
+                continue
+            step = 3 if age >= STEP_OFFSETS[3] else 2 if age >= STEP_OFFSETS[2] else 1
+            current = c.get("step", 1)
+            if step <= current:
+                continue
+            claims.append((ckey, current, {"step": 3, "done": True} if step == 3 else {"step": step}))
+            pending[ckey] = (r, c, step, t0 + datetime.timedelta(seconds=STEP_OFFSETS[step]))
+        if finished_once:
+            store.delete_reminders(finished_once)
+        # CAS (UPDATE ... WHERE step=current) trước khi gửi → mỗi bước chỉ một worker gửi
+        claimed = store.advance_cycles(claims) if claims else []
+        jobs = []
+        for ckey in claimed:
+            r, c, step, due = pending[ckey]
+            jobs.append(_Send(ckey, step, r["chat_id"], self._render_template(step, r.get("text", "")),
+                              {"reminder_id": r["id"], "step": step, "cycle_key": ckey}, due, c.get("sends")))
+        return jobs
+
+    # --- gửi song song ---
+    def _deliver(self, job: _Send):
+        job.started = time.monotonic()
+        try:
+            # Hạn gửi truyền xuống connector (timeout HTTP / chờ hàng đợi) để lần gửi tự dừng đúng hạn
+            self._send(job.chat_id, job.text, dict(job.meta, timeout=self.send_timeout))
+        except TimeoutError:
+            job.timed_out = True  # connector hết hạn chờ: tin có thể vẫn tới người dùng
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+        job.elapsed = time.monotonic() - job.started
+        job.sent_at = now_local()
+
+    def _dispatch(self, jobs: List[_Send]):
+        """Gửi qua pool; lần gửi chạy quá `send_timeout` bị tính là timeout — không rõ đã tới hay chưa
+        (thread vẫn chạy nốt, kết quả bị bỏ), lần chưa kịp bắt đầu trước hạn chung của tick thì huỷ, không gửi."""
+        if not jobs:
+            return
+        if self._pool is None or len(jobs) == 1:
+            for job in jobs:
+                self._deliver(job)
+            return
+        futures = {self._pool.submit(self._deliver, job): job for job in jobs}
+        # Hạn chung: đủ cho mọi lượt của pool nếu lần gửi nào cũng chạm timeout
+        hard_deadline = time.monotonic() + self.send_timeout * math.ceil(len(jobs) / self.send_workers)
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            expired = set()
+            for f in pending:
+                job = futures[f]
+                if job.started is not None and now - job.started >= self.send_timeout:
+                    job.timed_out = True
+                    expired.add(f)
+                elif now >= hard_deadline and f.cancel():
+                    job.error = "cancelled"  # chưa gửi
+                    expired.add(f)
+            pending -= expired
+            if not pending:
+                break
+            running = [futures[f].started for f in pending if futures[f].started is not None]
+            deadline = min(running) + self.send_timeout if running else hard_deadline
+            _, pending = wait(pending, timeout=max(0.01, min(deadline, hard_deadline) - now),
+                              return_when=FIRST_COMPLETED)
+
+    def _commit(self, jobs: List[_Send], reminder_updates: Dict[str, dict], events: int, started: float):
+        """Ghi kết quả gửi vào cycle + cập nhật reminder trong một lần ghi kho; cập nhật số liệu tick."""
+        cycle_updates = {}
+        latencies, late, errors, timeouts = [], 0, 0, 0
+        for job in jobs:
+            self.counters["fired" if job.step == 1 else "followups"] += 1
+            if job.timed_out:
+                # Quá hạn nhưng lần gửi có thể vẫn tới nơi → "unknown", không tính là lỗi
+                timeouts += 1
+                result = {"ok": None, "status": "unknown", "error": "timeout"}
+            elif job.error:
+                errors += 1
+                result = {"ok": False, "error": job.error[:200]}
+            else:
+                latencies.append(job.elapsed)
+                result = {"ok": True, "ms": int(job.elapsed * 1000), "at": job.sent_at.isoformat(timespec="seconds")}
+                if (job.sent_at - job.due).total_seconds() > ON_TIME_SECONDS:
+                    late += 1
+            cycle_updates[job.cycle_key] = {"sends": dict(job.sends, **{str(job.step): result})}
+        if reminder_updates or cycle_updates:
+            self._store.update_many(reminder_updates, cycle_updates)
+        tick = time.monotonic() - started
+        TICK_SECONDS.observe(tick)
+        for job in jobs:
+            if not job.timed_out:
+                SEND_SECONDS.observe(job.elapsed or 0.0, "error" if job.error else "ok")
+        self.counters["late"] += late
+        self.counters["send_errors"] += errors
+        self.counters["send_timeouts"] += timeouts
+        latencies.sort()
+        self.last_tick = {
+            "at": now_local().isoformat(timespec="seconds"),
+            "events": events,
+            "sends": len(jobs),
+            "late": late,
+            "errors": errors,
+            "timeouts": timeouts,
+            "send_ms_avg": round(1000 * sum(latencies) / len(latencies), 1) if latencies else None,
+            "send_ms_p95": round(1000 * latencies[math.ceil(len(latencies) * 0.95) - 1], 1) if latencies else None,
+            "send_ms_max": round(1000 * latencies[-1], 1) if latencies else None,
+            "tick_ms": round(1000 * tick, 1),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cv:
+            nxt = self._heap[0][4].isoformat() if self._heap else None
+            out = dict(self.counters, scheduled=len(self._live), heap=len(self._heap), next_due=nxt)
+        out["send_workers"] = self.send_workers
+        out["last_tick"] = self.last_tick
+        if self.lease is not None:
+            out["worker_id"] = self.lease.worker_id
+            out["shards_owned"] = sorted(self.lease.owned)
+        return out
 
     def _render_template(self, step: int, text: str) -> str:
         base = os.path.dirname(os.path.dirname(__file__))
         cfg = os.path.join(base, "config")
         fname = {1:"reminder_msg1.json", 2:"reminder_msg2.json", 3:"reminder_msg3.json"}.get(step, "reminder_msg1.json")
         try:
-            with open(os.path.join(cfg, fname), "r", encoding="utf-8") as f:
-                tpl = json.load(f).get("template", "{{text}}")
+            tpl = load_cached(os.path.join(cfg, fname)).get("template", "{{text}}")
         except Exception:
             tpl = "{{text}}"
         return tpl.replace("{{text}}", text)
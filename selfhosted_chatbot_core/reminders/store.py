@@ -0,0 +1,456 @@
+import json, os, sqlite3, threading, time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from utils import pantry
+from utils.config_cache import load_cached
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+SETTINGS_PATH = os.path.join(BASE_DIR, "config", "settings.json")
+DEFAULT_SQLITE_PATH = os.path.join(BASE_DIR, "data", "reminders.db")
+
+# slot = (ngày "YYYY-MM-DD", giờ "HH:MM") cần kiểm tra; reminder không có `date` khớp mọi ngày
+Slot = Tuple[str, str]
+
+class ReminderStore(ABC):
+    """Kho nhắc nhở: reminders theo id + cycles (chu kỳ nhắc 3 bước) theo cycle_key "rid@YYYYmmddHHMM".
+
+    Listener `fn(kind, key)` được gọi sau mỗi lần ghi ("reminder", rid) / ("cycle", cycle_key),
+    ví dụ để scheduler thức dậy sớm khi có nhắc nhở mới hoặc bị tắt.
+    """
+
+    def __init__(self):
+        self._listeners: List[Callable[[str, str], None]] = []
+
+    def add_listener(self, fn: Callable[[str, str], None]):
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn: Callable[[str, str], None]):
+        if fn in self._listeners:
+            self._listeners.remove(fn)
+
+    def _notify(self, kind: str, keys: Iterable[str]):
+        for fn in list(self._listeners):
+            for key in keys:
+                fn(kind, key)
+
+    @abstractmethod
+    def add_reminder(self, reminder: dict): ...
+
+    @abstractmethod
+    def get_reminder(self, reminder_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    def update_reminder(self, reminder_id: str, **fields) -> bool: ...
+
+    @abstractmethod
+    def delete_reminders(self, reminder_ids: Iterable[str]) -> int:
+        """Xoá reminders và mọi cycle của chúng; trả về số reminder đã xoá."""
+
+    @abstractmethod
+    def find_by_user_time(self, platform: str, user_id: str, time: str) -> List[str]: ...
+
+    @abstractmethod
+    def due_reminders(self, slots: Iterable[Slot]) -> List[dict]: ...
+
+    @abstractmethod
+    def all_reminders(self) -> Iterator[dict]: ...
+
+    @abstractmethod
+    def get_cycle(self, key: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    def put_cycle(self, key: str, item: dict): ...
+
+    @abstractmethod
+    def update_cycle(self, key: str, **fields) -> bool: ...
+
+    @abstractmethod
+    def delete_cycle(self, key: str): ...
+
+    @abstractmethod
+    def cycles(self) -> List[Tuple[str, dict]]: ...
+
+    # Bản mặc định không nguyên tử giữa các process (đọc rồi ghi) → chỉ đúng khi một process dùng kho;
+    # SQLiteReminderStore dùng CAS thật, và scheduler từ chối bật sharding với kho khác
+    def create_cycle(self, key: str, item: dict) -> bool:
+        """Tạo cycle nếu chưa có; False = đã có (một worker khác đã nhắc bước 1)."""
+        if self.get_cycle(key) is not None:
+            return False
+        self.put_cycle(key, item)
+        return True
+
+    def advance_cycle(self, key: str, from_step: int, **fields) -> bool:
+        """Cập nhật cycle chỉ khi nó còn ở bước `from_step` (compare-and-set)."""
+        c = self.get_cycle(key)
+        if c is None or c.get("step", 1) != from_step:
+            return False
+        return self.update_cycle(key, **fields)
+
+    # Bản theo lô (scheduler gọi một lần mỗi tick); mặc định gọi lần lượt từng bản ghi
+    def create_cycles(self, items: List[Tuple[str, dict]]) -> List[str]:
+        """create_cycle cho nhiều cycle; trả về các key tạo được."""
+        return [key for key, item in items if self.create_cycle(key, item)]
+
+    def advance_cycles(self, items: List[Tuple[str, int, dict]]) -> List[str]:
+        """advance_cycle cho nhiều (key, from_step, fields); trả về các key CAS thành công."""
+        return [key for key, from_step, fields in items if self.advance_cycle(key, from_step, **fields)]
+
+    def update_many(self, reminders: Mapping[str, dict], cycles: Mapping[str, dict]):
+        for rid, fields in reminders.items():
+            self.update_reminder(rid, **fields)
+        for key, fields in cycles.items():
+            self.update_cycle(key, **fields)
+
+    def changed_since(self, ts: float) -> Tuple[List[str], List[str]]:
+        """(reminder ids, cycle keys) được ghi sau `ts` (time.time()), kể cả bởi process khác.
+        Backend không hỗ trợ → ([], [])."""
+        return [], []
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+def _matches(r: dict, slots: List[Slot]) -> bool:
+    return any(r.get("time") == hhmm and (not r.get("date") or r.get("date") == day) for day, hhmm in slots)
+
+class PantryReminderStore(ReminderStore):
+    """Backend mặc định: một document JSON trên Pantry (qua write-back cache của utils.pantry).
+
+    Đọc là tra/quét bản cache trong RAM (không gọi mạng, chỉ copy bản ghi trả về); phù hợp vài nghìn nhắc nhở.
+    """
+
+    def add_reminder(self, reminder: dict):
+        pantry.upsert_reminder(reminder)
+        self._notify("reminder", [reminder["id"]])
+
+    def get_reminder(self, reminder_id: str) -> Optional[dict]:
+        return pantry.get_record("reminders", reminder_id)
+
+    def update_reminder(self, reminder_id: str, **fields) -> bool:
+        r = self.get_reminder(reminder_id)
+        if r is None:
+            return False
+        r.update(fields)
+        pantry.upsert_reminder(r)
+        self._notify("reminder", [reminder_id])
+        return True
+
+    def delete_reminders(self, reminder_ids: Iterable[str]) -> int:
+        ids = set(reminder_ids)
+        deleted = [0]
+        def changer(data):
+            for rid in ids:
+                if data["reminders"].pop(rid, None) is not None:
+                    deleted[0] += 1
+            for k in [k for k, c in data["cycles"].items() if c.get("reminder_id") in ids]:
+                del data["cycles"][k]
+        if ids:
+            pantry.bulk_update(changer)
+            self._notify("reminder", ids)
+        return deleted[0]
+
+    def find_by_user_time(self, platform: str, user_id: str, time: str) -> List[str]:
+        return [rid for rid, _ in pantry.select(
+            "reminders",
+            lambda r: r.get("platform") == platform and r.get("user_id") == user_id and r.get("time") == time)]
+
+    def due_reminders(self, slots: Iterable[Slot]) -> List[dict]:
+        slots = list(slots)
+        return [r for _, r in pantry.select("reminders", lambda r: _matches(r, slots))]
+
+    def all_reminders(self) -> Iterator[dict]:
+        return (r for _, r in pantry.select("reminders"))
+
+    def get_cycle(self, key: str) -> Optional[dict]:
+        return pantry.get_record("cycles", key)
+
+    def put_cycle(self, key: str, item: dict):
+        pantry.upsert_cycle(key, item)
+        self._notify("cycle", [key])
+
+    def update_cycle(self, key: str, **fields) -> bool:
+        c = self.get_cycle(key)
+        if c is None:
+            return False
+        c.update(fields)
+        pantry.upsert_cycle(key, c)
+        self._notify("cycle", [key])
+        return True
+
+    def delete_cycle(self, key: str):
+        pantry.delete_cycle(key)
+        self._notify("cycle", [key])
+
+    def cycles(self) -> List[Tuple[str, dict]]:
+        return pantry.select("cycles")
+
+    def flush(self):
+        pantry.flush()
+
+class SQLiteReminderStore(ReminderStore):
+    """Backend SQLite (WAL) cục bộ, có index theo giờ đến hạn, theo (platform, user_id, time)
+    và cycles theo reminder_id → truy vấn đến hạn / tắt nhắc nhở là tra index, không quét."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS reminders (
+        id TEXT PRIMARY KEY,
+        platform TEXT,
+        user_id TEXT,
+        time TEXT NOT NULL,
+        date TEXT,
+        data TEXT NOT NULL,
+        updated_at REAL NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_reminders_due ON reminders(time, date);
+    CREATE INDEX IF NOT EXISTS idx_reminders_user ON reminders(platform, user_id, time);
+    CREATE TABLE IF NOT EXISTS cycles (
+        key TEXT PRIMARY KEY,
+        reminder_id TEXT NOT NULL,
+        data TEXT NOT NULL,
+        step INTEGER NOT NULL DEFAULT 1,
+        updated_at REAL NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_cycles_reminder ON cycles(reminder_id);
+    """
+    # Cột thêm sau phiên bản đầu: (bảng, cột, định nghĩa)
+    UPGRADES = [
+        ("reminders", "updated_at", "REAL NOT NULL DEFAULT 0"),
+        ("cycles", "step", "INTEGER NOT NULL DEFAULT 1"),
+        ("cycles", "updated_at", "REAL NOT NULL DEFAULT 0"),
+    ]
+    R_COLS = "(id, platform, user_id, time, date, data, updated_at)"
+    C_COLS = "(key, reminder_id, data, step, updated_at)"
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH):
+        super().__init__()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        # timeout: chờ khoá ghi khi nhiều process (worker scheduler) dùng chung file
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        self._upgrade_schema()
+        self._lock = threading.Lock()
+
+    def _upgrade_schema(self):
+        for table, col, ddl in self.UPGRADES:
+            cols = {r[1] for r in self._db.execute(f"PRAGMA table_info({table})")}
+            if col not in cols:
+                self._db.execute(f"ALTER TABLE {table} ADD COLUMN {col} {ddl}")
+                if (table, col) == ("cycles", "step"):
+                    self._db.execute("UPDATE cycles SET step=COALESCE(json_extract(data, '$.step'), 1)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_reminders_updated ON reminders(updated_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_cycles_updated ON cycles(updated_at)")
+
+    @staticmethod
+    def _row(r: dict) -> tuple:
+        return (r["id"], r.get("platform"), r.get("user_id"), r.get("time", "08:00"), r.get("date"),
+                json.dumps(r, ensure_ascii=False), time.time())
+
+    @staticmethod
+    def _crow(key: str, c: dict) -> tuple:
+        return (key, c.get("reminder_id", key.split("@")[0]), json.dumps(c, ensure_ascii=False),
+                int(c.get("step", 1)), time.time())
+
+    def add_reminder(self, reminder: dict):
+        with self._lock:
+            self._db.execute(f"INSERT OR REPLACE INTO reminders {self.R_COLS} VALUES (?,?,?,?,?,?,?)",
+                             self._row(reminder))
+        self._notify("reminder", [reminder["id"]])
+
+    def add_many(self, reminders: Iterable[dict], cycles: Iterable[Tuple[str, dict]] = ()) -> Tuple[int, int]:
+        """Nạp hàng loạt trong một transaction (dùng cho migrate)."""
+        rrows = [self._row(r) for r in reminders]
+        crows = [self._crow(k, c) for k, c in cycles]
+        with self._lock:
+            with self._tx():
+                self._db.executemany(f"INSERT OR REPLACE INTO reminders {self.R_COLS} VALUES (?,?,?,?,?,?,?)", rrows)
+                self._db.executemany(f"INSERT OR REPLACE INTO cycles {self.C_COLS} VALUES (?,?,?,?,?)", crows)
+        return len(rrows), len(crows)
+
+    def _tx(self):
+        db = self._db
+        class _Tx:
+            def __enter__(self):
+                db.execute("BEGIN IMMEDIATE")
+            def __exit__(self, exc_type, *exc):
+                db.execute("ROLLBACK" if exc_type else "COMMIT")
+                return False
+        return _Tx()
+
+    def get_reminder(self, reminder_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM reminders WHERE id=?", (reminder_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update_reminder(self, reminder_id: str, **fields) -> bool:
+        with self._lock:
+            with self._tx():
+                row = self._db.execute("SELECT data FROM reminders WHERE id=?", (reminder_id,)).fetchone()
+                if not row:
+                    return False
+                r = json.loads(row[0])
+                r.update(fields)
+                self._db.execute(f"INSERT OR REPLACE INTO reminders {self.R_COLS} VALUES (?,?,?,?,?,?,?)",
+                                 self._row(r))
+        self._notify("reminder", [reminder_id])
+        return True
+
+    def delete_reminders(self, reminder_ids: Iterable[str]) -> int:
+        ids = [(rid,) for rid in reminder_ids]
+        if not ids:
+            return 0
+        with self._lock:
+            with self._tx():
+                before = self._db.total_changes
+                self._db.executemany("DELETE FROM reminders WHERE id=?", ids)
+                deleted = self._db.total_changes - before
+                self._db.executemany("DELETE FROM cycles WHERE reminder_id=?", ids)
+        self._notify("reminder", [rid for (rid,) in ids])
+        return deleted
+
+    def find_by_user_time(self, platform: str, user_id: str, time: str) -> List[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT id FROM reminders WHERE platform=? AND user_id=? AND time=?",
+                                    (platform, user_id, time)).fetchall()
+        return [r[0] for r in rows]
+
+    def due_reminders(self, slots: Iterable[Slot]) -> List[dict]:
+        out = []
+        with self._lock:
+            for day, hhmm in slots:
+                rows = self._db.execute("SELECT data FROM reminders WHERE time=? AND (date IS NULL OR date=?)",
+                                        (hhmm, day)).fetchall()
+                out.extend(json.loads(r[0]) for r in rows)
+        return out
+
+    def all_reminders(self) -> Iterator[dict]:
+        with self._lock:
+            rows = self._db.execute("SELECT data FROM reminders").fetchall()
+        return (json.loads(r[0]) for r in rows)
+
+    def get_cycle(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM cycles WHERE key=?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_cycle(self, key: str, item: dict):
+        with self._lock:
+            self._db.execute(f"INSERT OR REPLACE INTO cycles {self.C_COLS} VALUES (?,?,?,?,?)", self._crow(key, item))
+        self._notify("cycle", [key])
+
+    def create_cycle(self, key: str, item: dict) -> bool:
+        with self._lock:
+            cur = self._db.execute(f"INSERT OR IGNORE INTO cycles {self.C_COLS} VALUES (?,?,?,?,?)",
+                                   self._crow(key, item))
+        if cur.rowcount != 1:
+            return False
+        self._notify("cycle", [key])
+        return True
+
+    def create_cycles(self, items: List[Tuple[str, dict]]) -> List[str]:
+        created = []
+        with self._lock:
+            with self._tx():
+                for key, item in items:
+                    cur = self._db.execute(f"INSERT OR IGNORE INTO cycles {self.C_COLS} VALUES (?,?,?,?,?)",
+                                           self._crow(key, item))
+                    if cur.rowcount == 1:
+                        created.append(key)
+        self._notify("cycle", created)
+        return created
+
+    def _cas_cycle(self, key: str, from_step: Optional[int], fields: dict) -> bool:
+        # gọi khi đang giữ self._lock và trong transaction
+        row = self._db.execute("SELECT data, step FROM cycles WHERE key=?", (key,)).fetchone()
+        if not row or (from_step is not None and row[1] != from_step):
+            return False
+        c = json.loads(row[0])
+        c.update(fields)
+        # WHERE step=? là điều kiện CAS: process khác đổi bước trước thì không ghi đè
+        cur = self._db.execute("UPDATE cycles SET data=?, step=?, updated_at=? WHERE key=? AND step=?",
+                               (json.dumps(c, ensure_ascii=False), int(c.get("step", 1)), time.time(), key, row[1]))
+        return cur.rowcount == 1
+
+    def _update_cycles(self, items: List[Tuple[str, Optional[int], dict]]) -> List[str]:
+        with self._lock:
+            with self._tx():
+                done = [key for key, from_step, fields in items if self._cas_cycle(key, from_step, fields)]
+        self._notify("cycle", done)
+        return done
+
+    def update_cycle(self, key: str, **fields) -> bool:
+        return bool(self._update_cycles([(key, None, fields)]))
+
+    def advance_cycle(self, key: str, from_step: int, **fields) -> bool:
+        return bool(self._update_cycles([(key, from_step, fields)]))
+
+    def advance_cycles(self, items: List[Tuple[str, int, dict]]) -> List[str]:
+        return self._update_cycles(list(items))
+
+    def update_many(self, reminders: Mapping[str, dict], cycles: Mapping[str, dict]):
+        with self._lock:
+            with self._tx():
+                for rid, fields in reminders.items():
+                    row = self._db.execute("SELECT data FROM reminders WHERE id=?", (rid,)).fetchone()
+                    if row:
+                        r = json.loads(row[0])
+                        r.update(fields)
+                        self._db.execute(f"INSERT OR REPLACE INTO reminders {self.R_COLS} VALUES (?,?,?,?,?,?,?)",
+                                         self._row(r))
+                done = [key for key, fields in cycles.items() if self._cas_cycle(key, None, fields)]
+        self._notify("reminder", list(reminders))
+        self._notify("cycle", done)
+
+    def changed_since(self, ts: float) -> Tuple[List[str], List[str]]:
+        with self._lock:
+            rids = [r[0] for r in self._db.execute("SELECT id FROM reminders WHERE updated_at>?", (ts,))]
+            keys = [r[0] for r in self._db.execute("SELECT key FROM cycles WHERE updated_at>?", (ts,))]
+        return rids, keys
+
+    def delete_cycle(self, key: str):
+        with self._lock:
+            self._db.execute("DELETE FROM cycles WHERE key=?", (key,))
+        self._notify("cycle", [key])
+
+    def cycles(self) -> List[Tuple[str, dict]]:
+        with self._lock:
+            rows = self._db.execute("SELECT key, data FROM cycles").fetchall()
+        return [(k, json.loads(d)) for k, d in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+_store: Optional[ReminderStore] = None
+_store_lock = threading.Lock()
+
+def reminder_settings() -> Mapping:
+    return load_cached(SETTINGS_PATH, default={}).get("reminders", {})
+
+def make_store(cfg: Mapping) -> ReminderStore:
+    backend = (cfg.get("store") or "pantry").lower()
+    if backend == "sqlite":
+        path = cfg.get("sqlite_path") or DEFAULT_SQLITE_PATH
+        return SQLiteReminderStore(path if os.path.isabs(path) else os.path.join(BASE_DIR, path))
+    if backend == "pantry":
+        return PantryReminderStore()
+    raise ValueError(f"Unknown reminder store: {backend}")
+
+def get_store() -> ReminderStore:
+    """Kho dùng chung theo `reminders` trong config/settings.json (mặc định Pantry)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = make_store(reminder_settings())
+    return _store
+
+def set_store(store: Optional[ReminderStore]):
+    global _store
+    _store = store
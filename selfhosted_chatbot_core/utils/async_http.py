@@ -0,0 +1,156 @@
+# utils/async_http.py
+# Client HTTP/1.1 tối thiểu trên asyncio (stdlib, không cần aiohttp).
+# Giữ kết nối keep-alive theo từng host để hàng nghìn request đồng thời
+# chạy trên một thread mà không phải bắt tay TCP/TLS lại mỗi lần.
+
+import asyncio
+import json as _json
+import ssl
+import urllib.parse
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+class AsyncHTTPError(Exception):
+    def __init__(self, status_code: int, body: bytes = b""):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.body = body
+
+class AsyncResponse:
+    def __init__(self, status_code: int, headers: Dict[str, str], body: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = body
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return _json.loads(self.content or b"null")
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise AsyncHTTPError(self.status_code, self.content)
+
+_Conn = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+class AsyncHTTPClient:
+    def __init__(self, max_per_host: int = 100, timeout: float = 30.0,
+                 ssl_context: Optional[ssl.SSLContext] = None):
+        self.timeout = timeout
+        self._ssl = ssl_context or ssl.create_default_context()
+        self._idle: Dict[Tuple[str, str, int], Deque[_Conn]] = {}
+        self._limits: Dict[Tuple[str, str, int], asyncio.Semaphore] = {}
+        self._max_per_host = max_per_host
+
+    async def get(self, url: str, params: Optional[dict] = None, **kw) -> AsyncResponse:
+        return await self.request("GET", url, params=params, **kw)
+
+    async def post(self, url: str, json: Any = None, **kw) -> AsyncResponse:
+        return await self.request("POST", url, json=json, **kw)
+
+    async def request(self, method: str, url: str, params: Optional[dict] = None, json: Any = None,
+                      data: Optional[bytes] = None, headers: Optional[dict] = None,
+                      timeout: Optional[float] = None) -> AsyncResponse:
+        u = urllib.parse.urlsplit(url)
+        port = u.port or (443 if u.scheme == "https" else 80)
+        key = (u.scheme, u.hostname, port)
+        path = u.path or "/"
+        query = u.query
+        if params:
+            extra = urllib.parse.urlencode(params)
+            query = f"{query}&{extra}" if query else extra
+        if query:
+            path += "?" + query
+
+        hdrs = {"Host": u.netloc, "Accept-Encoding": "identity", "Connection": "keep-alive"}
+        if json is not None:
+            data = _json.dumps(json, ensure_ascii=False).encode("utf-8")
+            hdrs["Content-Type"] = "application/json"
+        if headers:
+            hdrs.update(headers)
+        hdrs["Content-Length"] = str(len(data or b""))
+        head = f"{method} {path} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in hdrs.items()) + "\r\n"
+        raw = head.encode("latin-1") + (data or b"")
+
+        sem = self._limits.get(key)
+        if sem is None:
+            sem = self._limits[key] = asyncio.Semaphore(self._max_per_host)
+        async with sem:
+            return await asyncio.wait_for(self._roundtrip(key, raw, method), timeout or self.timeout)
+
+    async def _roundtrip(self, key, raw: bytes, method: str = "GET") -> AsyncResponse:
+        idle = self._idle.setdefault(key, deque())
+        # Kết nối tái sử dụng có thể đã bị server đóng → thử lại một lần bằng kết nối mới
+        for attempt in range(2):
+            reused = bool(idle)
+            conn = idle.pop() if idle else await self._connect(key)
+            reader, writer = conn
+            try:
+                writer.write(raw)
+                await writer.drain()
+                resp, keep = await self._read_response(reader, method)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if reused and attempt == 0:
+                    continue
+                raise ConnectionError(str(e)) from e
+            except BaseException:
+                writer.close()
+                raise
+            if keep:
+                idle.append(conn)
+            else:
+                writer.close()
+            return resp
+        raise ConnectionError("unreachable")
+
+    async def _connect(self, key) -> _Conn:
+        scheme, host, port = key
+        return await asyncio.open_connection(host, port, ssl=self._ssl if scheme == "https" else None)
+
+    async def _read_response(self, reader: asyncio.StreamReader, method: str = "GET"):
+        while True:
+            status_line = await reader.readuntil(b"\r\n")
+            parts = status_line.decode("latin-1").split(" ", 2)
+            status = int(parts[1])
+            headers: Dict[str, str] = {}
+            while True:
+                line = await reader.readuntil(b"\r\n")
+                if line == b"\r\n":
+                    break
+                k, _, v = line.decode("latin-1").partition(":")
+                headers[k.strip().lower()] = v.strip()
+            # 1xx tạm thời (100 Continue, 103 Early Hints): không có body, response thật theo sau
+            if not (100 <= status < 200 and status != 101):
+                break
+
+        if method.upper() == "HEAD" or status in (101, 204, 304):
+            # Không có body dù có Content-Length (RFC 9112 §6.3) → không đọc tới EOF/timeout
+            body = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readuntil(b"\r\n")
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            return AsyncResponse(status, headers, body), False
+
+        keep = headers.get("connection", "").lower() != "close" and status != 101
+        return AsyncResponse(status, headers, body), keep
+
+    async def close(self):
+        for idle in self._idle.values():
+            while idle:
+                _, writer = idle.pop()
+                writer.close()
+        self._idle.clear()
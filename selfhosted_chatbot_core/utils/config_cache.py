@@ -0,0 +1,93 @@
+# utils/config_cache.py
+# Cache file JSON cấu hình theo đường dẫn. Chỉ parse lại khi mtime/inode/size đổi,
+# và chỉ stat tối đa mỗi `check_interval` giây → đường nóng (mỗi tin nhắn) không chạm đĩa.
+# Giá trị trả về là snapshot bất biến (MappingProxyType/tuple) dùng chung giữa các thread.
+
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Optional, Tuple
+
+_MISSING = object()
+
+def freeze(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return MappingProxyType({k: freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+def thaw(obj: Any) -> Any:
+    """Bản sao có thể sửa của một snapshot (dict/list thường)."""
+    if isinstance(obj, MappingProxyType):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, tuple):
+        return [thaw(v) for v in obj]
+    return obj
+
+class _Entry:
+    __slots__ = ("sig", "snapshot", "checked_at")
+
+    def __init__(self, sig: Tuple[int, int, int], snapshot: Any, checked_at: float):
+        self.sig = sig
+        self.snapshot = snapshot
+        self.checked_at = checked_at
+
+class ConfigCache:
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str, default: Any = _MISSING) -> Any:
+        now = time.monotonic()
+        entry = self._entries.get(path)
+        if entry is not None and now - entry.checked_at < self.check_interval:
+            return entry.snapshot
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            if default is not _MISSING:
+                return default
+            raise
+        sig = (st.st_mtime_ns, st.st_ino, st.st_size)
+        if entry is not None and entry.sig == sig:
+            entry.checked_at = now
+            return entry.snapshot
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.sig == sig:
+                entry.checked_at = now
+                return entry.snapshot
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    snapshot = freeze(json.load(f))
+            except Exception:
+                # File đang sửa dở/hỏng → dùng tiếp bản tốt gần nhất nếu có
+                if entry is not None:
+                    entry.checked_at = now
+                    return entry.snapshot
+                if default is not _MISSING:
+                    return default
+                raise
+            self._entries[path] = _Entry(sig, snapshot, now)
+            return snapshot
+
+    def invalidate(self, path: Optional[str] = None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+_default_cache = ConfigCache()
+
+def load_cached(path: str, default: Any = _MISSING) -> Any:
+    return _default_cache.get(path, default)
+
+def invalidate(path: Optional[str] = None):
+    _default_cache.invalidate(path)
@@ -0,0 +1,62 @@
+# utils/hot_reload.py
+# Theo dõi một file JSON bằng os.stat (mtime/size/inode) trong thread nền.
+# Khi file đổi: parse + dựng đối tượng mới ngoài vòng lặp chính rồi gọi on_swap(obj).
+# JSON lỗi → giữ nguyên bản tốt gần nhất.
+
+import json
+import os
+import threading
+from typing import Any, Callable, Optional
+
+class HotReloader:
+    def __init__(self, path: str, build: Callable[[Any], Any], on_swap: Callable[[Any], None],
+                 interval: float = 2.0, logger=None):
+        self.path = path
+        self._build = build
+        self._on_swap = on_swap
+        self.interval = interval
+        self._log = logger
+        self._stop = threading.Event()
+        self._thr: Optional[threading.Thread] = None
+        self._sig = self._stat()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def start(self):
+        if self._thr and self._thr.is_alive():
+            return
+        self._stop.clear()
+        self._thr = threading.Thread(target=self._run, name="hot-reload", daemon=True)
+        self._thr.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thr:
+            self._thr.join(timeout=1.0)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self) -> bool:
+        """Nạp lại nếu file đổi. Trả về True nếu đã swap bản mới."""
+        sig = self._stat()
+        if sig is None or sig == self._sig:
+            return False
+        # Ghi nhận chữ ký trước khi parse: file hỏng sẽ không bị parse lại mỗi chu kỳ
+        self._sig = sig
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            obj = self._build(data)
+        except Exception as e:
+            if self._log:
+                self._log.warning("⚠️ Không nạp lại được %s, giữ bản cũ: %s", os.path.basename(self.path), e)
+            return False
+        self._on_swap(obj)
+        return True
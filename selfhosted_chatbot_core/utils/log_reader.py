@@ -0,0 +1,257 @@
+# utils/log_reader.py
+# Đọc logs/bot.log cho web UI mà không đọc cả file:
+# - tail_lines: đọc ngược từng khối từ cuối file → chi phí không phụ thuộc kích thước log
+# - follow: theo dõi dòng mới (cho Server-Sent Events), chịu được file bị xoay vòng
+# - LogIndex: chỉ mục nhỏ trên đĩa (SQLite) chia log thành các khối ~64 KB, ghi khoảng thời gian
+#   của từng khối và chat_id nào xuất hiện trong khối nào → tìm một hội thoại chỉ đọc vài khối.
+# Hiểu cả hai dạng log của utils.logger: text "[ts] [LEVEL] msg" và JSON lines.
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+
+BLOCK_SIZE = 64 * 1024
+
+_TEXT_LINE = re.compile(r"\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\] \[(\w+)\] ")
+# Các dòng trên đường xử lý tin của bot.py (nhận / trả lời / lỗi) mang chat_id
+_CHAT = re.compile(r"(?:Tin nhắn mới từ \S+ \(([^)\s]+)\)|Đã trả lời (\S+?)|Lỗi xử lý tin nhắn từ (\S+?)):")
+
+def parse_line(line: str) -> Tuple[Optional[str], Optional[str]]:
+    """(timestamp "YYYY-mm-dd HH:MM:SS", chat_id); (None, None) với dòng nối tiếp (traceback...)."""
+    if line.startswith("{"):
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            return None, None
+        chat = rec.get("chat_id")
+        return rec.get("ts"), (str(chat) if chat is not None else None)
+    m = _TEXT_LINE.match(line)
+    if not m:
+        return None, None
+    c = _CHAT.search(line, m.end())
+    return m.group(1), (next(g for g in c.groups() if g) if c else None)
+
+def tail_lines(path: str, n: int = 50, block: int = 8192) -> List[str]:
+    """n dòng cuối (kể cả dòng cuối chưa có \\n), đọc ngược theo khối."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return []
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        pos, data = end, b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.splitlines(keepends=True)
+    if pos > 0:
+        lines = lines[1:]  # dòng đầu có thể bị cắt giữa chừng
+    return [ln.decode("utf-8", errors="replace") for ln in lines[-n:]]
+
+def follow(path: str, offset: Optional[int] = None, poll: float = 0.5, heartbeat: float = 15.0,
+           stop: Optional[threading.Event] = None) -> Iterator[Tuple[Optional[int], Optional[str]]]:
+    """Sinh (offset sau dòng, dòng) cho mỗi dòng đầy đủ mới được ghi; (None, None) mỗi `heartbeat`
+    giây không có gì mới (để SSE gửi ping, phát hiện client đã đi). offset=None → bắt đầu từ cuối file.
+    File nhỏ đi hoặc đổi inode (xoay vòng) → đọc file mới từ đầu."""
+    ino = None
+    idle_since = time.monotonic()
+    buf = b""
+    while stop is None or not stop.is_set():
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            st = None
+        if st is not None:
+            if offset is None:
+                offset = st.st_size
+            if ino is not None and (st.st_ino != ino or st.st_size < offset):
+                offset, buf = 0, b""
+            ino = st.st_ino
+            if st.st_size > offset:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    chunk = f.read(min(st.st_size - offset, 1 << 20))
+                offset += len(chunk)
+                buf += chunk
+                *lines, buf = buf.split(b"\n")
+                end = offset - len(buf)
+                pos = end - sum(len(ln) + 1 for ln in lines)
+                for ln in lines:
+                    pos += len(ln) + 1
+                    yield pos, ln.decode("utf-8", errors="replace")
+                if lines:
+                    idle_since = time.monotonic()
+                continue
+        if time.monotonic() - idle_since >= heartbeat:
+            idle_since = time.monotonic()
+            yield None, None
+        time.sleep(poll)
+
+def _until_key(until: Optional[str]) -> Optional[str]:
+    # "2026-10-18" hoặc "2026-10-18 09" → tính cả mọi thời điểm có tiền tố đó
+    return until + "~" if until else None
+
+class LogIndex:
+    """Chỉ mục khối của một file log. refresh() chỉ đọc phần mới ghi thêm; file bị xoay vòng
+    (inode đổi, nhỏ đi, đầu file khác) → lập lại từ đầu. Chỉ mục hóa file hiện tại, không gồm bot.log.N."""
+
+    def __init__(self, log_path: str, index_path: str, block_size: int = BLOCK_SIZE):
+        self.log_path = log_path
+        self.block_size = block_size
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(index_path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS blocks (start INTEGER PRIMARY KEY, end INTEGER, ts_first TEXT, ts_last TEXT);
+            CREATE TABLE IF NOT EXISTS chats (chat_id TEXT, block INTEGER, PRIMARY KEY (chat_id, block)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS blocks_ts ON blocks (ts_last);
+        """)
+        self._lock = threading.Lock()
+
+    def _meta(self, key: str, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _identity(self, f, st) -> str:
+        f.seek(0)
+        return f"{st.st_ino}:{f.read(256).hex()}"
+
+    def refresh(self) -> int:
+        """Chỉ mục hóa phần mới; trả về số byte đã chỉ mục hóa (tới hết dòng đầy đủ cuối cùng)."""
+        with self._lock:
+            try:
+                f = open(self.log_path, "rb")
+            except FileNotFoundError:
+                return 0
+            with f:
+                st = os.fstat(f.fileno())
+                upto = int(self._meta("indexed_upto", 0))
+                if upto > st.st_size or self._meta("identity") != self._identity(f, st):
+                    # File mới (xoay vòng) hoặc lần đầu. Khi file còn ngắn hơn 256 byte thì identity
+                    # đổi theo nội dung → lập lại, rẻ vì file nhỏ.
+                    self._db.executescript("DELETE FROM meta; DELETE FROM blocks; DELETE FROM chats;")
+                    upto = 0
+                    identity = self._identity(f, st)
+                else:
+                    identity = None
+                if st.st_size > upto:
+                    upto = self._index_from(f, upto, st.st_size)
+                if identity is not None or st.st_size > 0:
+                    self._db.execute("BEGIN")
+                    if identity is not None:
+                        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('identity', ?)", (identity,))
+                    self._db.execute("INSERT OR REPLACE INTO meta VALUES ('indexed_upto', ?)", (str(upto),))
+                    self._db.execute("COMMIT")
+                return upto
+
+    def _index_from(self, f, upto: int, size: int) -> int:
+        # Khối đang mở (cuối file lần trước) được nối tiếp
+        row = self._db.execute("SELECT start, ts_first, ts_last FROM blocks ORDER BY start DESC LIMIT 1").fetchone()
+        if row and row[0] <= upto:
+            start, ts_first, ts_last = row
+        else:
+            start, ts_first, ts_last = upto, None, None
+        chats = set()
+        pos = upto
+        f.seek(upto)
+        self._db.execute("BEGIN")
+        try:
+            while pos < size:
+                chunk = f.read(min(4 << 20, size - pos))
+                if not chunk:
+                    break
+                last_nl = chunk.rfind(b"\n")
+                if last_nl < 0:
+                    break  # dòng chưa ghi xong
+                chunk = chunk[:last_nl + 1]
+                f.seek(pos + len(chunk))
+                for raw in chunk.splitlines(keepends=True):
+                    if pos - start >= self.block_size:
+                        self._save_block(start, pos, ts_first, ts_last, chats)
+                        start, ts_first, chats = pos, None, set()
+                    ts, chat = parse_line(raw.decode("utf-8", errors="replace"))
+                    if ts:
+                        ts_first = ts_first or ts
+                        ts_last = ts
+                    if chat:
+                        chats.add(chat)
+                    pos += len(raw)
+            self._save_block(start, pos, ts_first, ts_last, chats)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return pos
+
+    def _save_block(self, start, end, ts_first, ts_last, chats):
+        if end <= start:
+            return
+        self._db.execute("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?)", (start, end, ts_first, ts_last))
+        self._db.executemany("INSERT OR IGNORE INTO chats VALUES (?, ?)", [(c, start) for c in chats])
+
+    def search(self, chat_id: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+               q: Optional[str] = None, limit: int = 200, after: int = 0, max_blocks: int = 2000) -> dict:
+        """Dòng khớp (theo thứ tự trong file), bắt đầu sau offset `after`. Dòng nối tiếp (traceback)
+        đi theo dòng có timestamp đứng trước nó. `next` = offset để lấy trang tiếp (None = hết)."""
+        upto = self.refresh()
+        sql = "SELECT b.start, b.end FROM blocks b"
+        where, args = ["b.end > ?"], [after]
+        if chat_id:
+            sql += " JOIN chats c ON c.block = b.start AND c.chat_id = ?"
+            args.insert(0, str(chat_id))
+        if since:
+            where.append("(b.ts_last IS NULL OR b.ts_last >= ?)")
+            args.append(since)
+        if until:
+            where.append("(b.ts_first IS NULL OR b.ts_first <= ?)")
+            args.append(_until_key(until))
+        sql += " WHERE " + " AND ".join(where) + " ORDER BY b.start LIMIT ?"
+        args.append(max_blocks + 1)
+        # Kết nối SQLite dùng chung giữa các thread của web UI → mọi truy vấn đi dưới _lock
+        with self._lock:
+            blocks = self._db.execute(sql, args).fetchall()
+        until_key = _until_key(until)
+        out, scanned, next_offset = [], 0, None
+        with open(self.log_path, "rb") as f:
+            for start, end in blocks[:max_blocks]:
+                f.seek(start)
+                data = f.read(end - start)
+                scanned += len(data)
+                pos, keep = start, False
+                for raw in data.splitlines(keepends=True):
+                    line_start, pos = pos, pos + len(raw)
+                    if line_start < after:
+                        continue
+                    text = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                    ts, chat = parse_line(text)
+                    if ts is not None:
+                        keep = ((not chat_id or chat == str(chat_id))
+                                and (not since or ts >= since) and (not until_key or ts <= until_key))
+                    if keep and (not q or q.lower() in text.lower()):
+                        out.append({"offset": line_start, "ts": ts, "chat_id": chat, "text": text})
+                        if len(out) >= limit:
+                            next_offset = pos
+                            break
+                if next_offset is not None:
+                    break
+        if next_offset is None and len(blocks) > max_blocks:
+            next_offset = blocks[max_blocks - 1][1]
+        return {"lines": out, "next": next_offset, "scanned_bytes": scanned, "indexed_upto": upto}
+
+    def stats(self) -> dict:
+        with self._lock:
+            blocks = self._db.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+            chats = self._db.execute("SELECT COUNT(DISTINCT chat_id) FROM chats").fetchone()[0]
+            upto = int(self._meta("indexed_upto", 0))
+        return {"blocks": blocks, "chats": chats, "indexed_upto": upto}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
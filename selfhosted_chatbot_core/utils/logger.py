@@ -1,25 +1,146 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import time
+from typing import Optional
 
-def setup_logger(name: str, level: str = "INFO"):
+LOGS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
+TEXT_FORMAT = "[%(asctime)s] [%(levelname)s] %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Trường có cấu trúc, truyền qua extra={...}: LOG.info("...", extra={"chat_id": ..., "stage": "reply"})
+STRUCTURED_FIELDS = ("chat_id", "stage", "latency_ms")
+
+_listeners = {}  # tên logger → QueueListener đang chạy
+
+class JsonLineFormatter(logging.Formatter):
+    """Mỗi bản ghi một dòng JSON: ts, level, msg + chat_id/stage/latency_ms nếu có."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": time.strftime(DATE_FORMAT, time.localtime(record.created)),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        for key in STRUCTURED_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                out[key] = value
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler không chặn: hàng đợi đầy (đĩa/console đang nghẽn) → bỏ bản ghi và đếm.
+
+    Không định dạng trước khi xếp hàng (khác QueueHandler gốc): msg % args, traceback,
+    JSON... đều làm ở thread của QueueListener, ngoài đường trả lời tin nhắn.
+    """
+
+    def __init__(self, q: "queue.Queue"):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record  # cùng process → không cần pickle được
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class SizeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler gốc định dạng mỗi bản ghi hai lần (một lần chỉ để đo độ dài) và stat file;
+    ở đây chỉ xem vị trí ghi hiện tại → file có thể vượt max_bytes một dòng."""
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.stream is None:
+            self.stream = self._open()
+        return self.maxBytes > 0 and self.stream.tell() >= self.maxBytes
+
+def _file_handler(path: str, rotate: dict) -> logging.Handler:
+    when = rotate.get("when", "size")
+    backups = int(rotate.get("backup_count", 5))
+    if when == "size":
+        return SizeRotatingFileHandler(
+            path, maxBytes=int(rotate.get("max_bytes", 5 * 1024 * 1024)), backupCount=backups, encoding="utf-8")
+    if when == "none":
+        return logging.FileHandler(path, encoding="utf-8")
+    # "midnight", "H", "D"... như TimedRotatingFileHandler
+    return logging.handlers.TimedRotatingFileHandler(
+        path, when=when, interval=int(rotate.get("interval", 1)), backupCount=backups, encoding="utf-8")
+
+def _stop_listener(name: str):
+    """Dừng QueueListener (ghi nốt hàng đợi), gắn thẳng handler của nó vào logger → log sau đó vẫn được ghi."""
+    listener = _listeners.pop(name, None)
+    if listener is None:
+        return
+    listener.stop()
+    logger = logging.getLogger(name)
+    for h in list(logger.handlers):
+        if isinstance(h, DroppingQueueHandler):
+            logger.removeHandler(h)
+    for h in listener.handlers:
+        logger.addHandler(h)
+
+def setup_logger(name: str, level: str = "INFO", config: Optional[dict] = None):
+    """config (settings.json → "logging"), None = giữ handler đã có:
+    - async: true → QueueHandler + QueueListener (ghi console/file ở thread riêng), queue_size
+    - rotate: {when: "size"|"none"|"midnight"|"H"..., max_bytes, interval, backup_count}
+    - format: "text" | "json" (file logs/bot.log thành JSON lines; console luôn là text)
+    """
     logger = logging.getLogger(name)
-    logger.setLevel(getattr(logging, level.upper(), logging.INFO))
+    lvl = getattr(logging, level.upper(), logging.INFO)
+    logger.setLevel(lvl)
     logger.propagate = False
 
-    if not logger.handlers:
-        # Console handler
-        ch = logging.StreamHandler()
-        ch.setLevel(getattr(logging, level.upper(), logging.INFO))
-        fmt = logging.Formatter("[%(asctime)s] [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
-        ch.setFormatter(fmt)
-        logger.addHandler(ch)
+    if logger.handlers and config is None:
+        return logger
+    config = config or {}
+    _stop_listener(name)
+    for h in list(logger.handlers):
+        logger.removeHandler(h)
+        h.close()
 
-        # File handler
-        logs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
-        os.makedirs(logs_dir, exist_ok=True)
-        fh = logging.FileHandler(os.path.join(logs_dir, "bot.log"), encoding="utf-8")
-        fh.setLevel(getattr(logging, level.upper(), logging.INFO))
-        fh.setFormatter(fmt)
-        logger.addHandler(fh)
+    text = logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+    # Console handler
+    ch = logging.StreamHandler()
+    ch.setLevel(lvl)
+    ch.setFormatter(text)
+
+    # File handler (mặc định xoay vòng theo kích thước, không còn lớn mãi)
+    os.makedirs(LOGS_DIR, exist_ok=True)
+    fh = _file_handler(os.path.join(LOGS_DIR, "bot.log"), config.get("rotate", {}))
+    fh.setLevel(lvl)
+    fh.setFormatter(JsonLineFormatter() if config.get("format") == "json" else text)
 
+    if config.get("async", False):
+        q: "queue.Queue" = queue.Queue(maxsize=int(config.get("queue_size", 10000)))
+        logger.addHandler(DroppingQueueHandler(q))
+        listener = logging.handlers.QueueListener(q, ch, fh, respect_handler_level=True)
+        listener.start()
+        _listeners[name] = listener
+    else:
+        logger.addHandler(ch)
+        logger.addHandler(fh)
     return logger
+
+def logger_stats(name: str) -> dict:
+    listener = _listeners.get(name)
+    if listener is None:
+        return {"async": False}
+    dropped = sum(h.dropped for h in logging.getLogger(name).handlers if isinstance(h, DroppingQueueHandler))
+    return {"async": True, "queue_depth": listener.queue.qsize(), "dropped": dropped}
+
+def shutdown_logger(name: str):
+    """Ghi nốt log đang xếp hàng (chế độ async) rồi chuyển về ghi trực tiếp. Gọi khi bot dừng;
+    cũng tự chạy lúc thoát process."""
+    _stop_listener(name)
+
+@atexit.register
+def _flush_all():
+    for name in list(_listeners):
+        _stop_listener(name)
@@ -0,0 +1,190 @@
+# utils/metrics.py
+# Số liệu đo nhẹ cho bot: Counter và Histogram bucket cố định (không lưu từng mẫu → bộ nhớ không đổi,
+# observe chỉ là bisect + cộng dưới một lock). Bot ghi snapshot() vào data/runtime_status.json
+# (mục "metrics"); web UI (process riêng) đọc lại và xuất dạng text Prometheus ở /metrics.
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Giây; đủ phủ từ khớp kịch bản (vài µs) tới gọi Gemini / Pantry chậm
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class _Family:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], list] = {}  # nhãn (chuỗi) → giá trị
+        self._lookup: Dict[tuple, list] = {}  # nhãn đúng như lúc gọi → cùng giá trị, tra nhanh không cần str()
+
+    def _child(self, labels: tuple) -> list:
+        child = self._lookup.get(labels)
+        if child is not None:
+            return child
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: cần nhãn {self.labelnames}, nhận {labels}")
+        key = tuple(str(v) for v in labels)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new()
+            self._lookup[labels] = child
+        return child
+
+class Counter(_Family):
+    """Bộ đếm tăng dần theo bộ nhãn: c.inc("telegram", "SCENARIO")."""
+
+    def _new(self) -> list:
+        return [0]
+
+    def inc(self, *labels, amount: float = 1):
+        child = self._child(labels)
+        with self._lock:
+            child[0] += amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = [[list(k), v[0]] for k, v in self._children.items()]
+        return {"help": self.help, "labels": list(self.labelnames), "samples": samples}
+
+class Histogram(_Family):
+    """Histogram bucket cố định theo bộ nhãn; snapshot lưu số mẫu từng bucket (không cộng dồn) + sum + count."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new(self) -> list:
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def observe(self, value: float, *labels):
+        child = self._child(labels)
+        i = bisect.bisect_left(self.buckets, value)  # bucket "le" đầu tiên >= value; hết → +Inf
+        with self._lock:
+            child[0][i] += 1
+            child[1] += value
+            child[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = [[list(k), list(v[0]), v[1], v[2]] for k, v in self._children.items()]
+        return {"help": self.help, "labels": list(self.labelnames), "buckets": list(self.buckets), "samples": samples}
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families: Dict[str, _Family] = {}
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            fam = self._families.get(name)
+            if fam is None:
+                fam = self._families[name] = cls(name, *args, **kwargs)
+            elif not isinstance(fam, cls):
+                raise ValueError(f"metric {name} đã được khai báo với kiểu khác")
+            return fam
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labelnames, buckets)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            fams = list(self._families.values())
+        return {
+            "counters": {f.name: f.snapshot() for f in fams if isinstance(f, Counter)},
+            "histograms": {f.name: f.snapshot() for f in fams if isinstance(f, Histogram)},
+        }
+
+# Một registry cho cả process (bot.py, reminders/*, utils/pantry cùng import utils.metrics)
+REGISTRY = Registry()
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.counter(name, help, labelnames)
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.histogram(name, help, labelnames, buckets)
+
+def snapshot() -> dict:
+    return REGISTRY.snapshot()
+
+# --- Đọc snapshot (web UI) ---
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _fmt(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+def render_prometheus(snap: dict) -> str:
+    """Snapshot → Prometheus text exposition format 0.0.4."""
+    out: List[str] = []
+    for name, fam in sorted((snap.get("counters") or {}).items()):
+        out.append(f"# HELP {name} {fam.get('help', '')}")
+        out.append(f"# TYPE {name} counter")
+        for values, v in fam.get("samples", []):
+            out.append(f"{name}{_labels(fam['labels'], values)} {_fmt(v)}")
+    for name, fam in sorted((snap.get("histograms") or {}).items()):
+        out.append(f"# HELP {name} {fam.get('help', '')}")
+        out.append(f"# TYPE {name} histogram")
+        bounds = [_fmt(float(b)) for b in fam["buckets"]] + ["+Inf"]
+        for values, counts, total, count in fam.get("samples", []):
+            acc = 0
+            for le, c in zip(bounds, counts):
+                acc += c
+                out.append(f"{name}_bucket{_labels(fam['labels'], values, ('le', le))} {acc}")
+            out.append(f"{name}_sum{_labels(fam['labels'], values)} {_fmt(float(total))}")
+            out.append(f"{name}_count{_labels(fam['labels'], values)} {count}")
+    return "\n".join(out) + "\n"
+
+def quantile(q: float, buckets: Sequence[float], counts: Sequence[int]) -> Optional[float]:
+    """Ước lượng phân vị từ bucket (nội suy tuyến tính trong bucket, như histogram_quantile)."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank, acc = q * total, 0
+    for i, c in enumerate(counts):
+        if c and acc + c >= rank:
+            if i >= len(buckets):
+                return float(buckets[-1])  # rơi vào +Inf → chỉ biết là lớn hơn bucket cuối
+            lo = buckets[i - 1] if i else 0.0
+            return lo + (buckets[i] - lo) * (rank - acc) / c
+        acc += c
+    return float(buckets[-1])
+
+def summarize(snap: dict) -> List[dict]:
+    """Mỗi (histogram, bộ nhãn) một dòng: count, avg/p50/p95 (ms) — cho bảng trên dashboard."""
+    rows = []
+    for name, fam in sorted((snap.get("histograms") or {}).items()):
+        for values, counts, total, count in sorted(fam.get("samples", []), key=lambda s: s[0]):
+            p50, p95 = quantile(0.5, fam["buckets"], counts), quantile(0.95, fam["buckets"], counts)
+            rows.append({
+                "name": name,
+                "labels": ", ".join(f"{n}={v}" for n, v in zip(fam["labels"], values)),
+                "count": count,
+                "avg_ms": round(1000 * total / count, 1) if count else None,
+                "p50_ms": round(1000 * p50, 1) if p50 is not None else None,
+                "p95_ms": round(1000 * p95, 1) if p95 is not None else None,
+            })
+    return rows
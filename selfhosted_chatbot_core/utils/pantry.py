@@ -1,10 +1,32 @@
-import os, json, urllib.request
+import atexit, os, json, time, threading, urllib.request
+
+from . import metrics
+
+# Pantry lưu cả bot nhắc nhở trong MỘT document JSON. Bản trong process là bản chính
+# (write-back cache): đọc không gọi mạng, ghi chỉ đánh dấu dirty + ghi vào op log,
+# thread nền gộp các thay đổi và flush sau `FLUSH_DELAY` giây yên lặng (tối đa `FLUSH_MAX_DELAY`).
+# Pantry không có ETag/PUT có điều kiện → document mang trường "_rev"; trước khi PUT đọc lại `_rev`,
+# nếu process khác đã ghi thì lấy bản mới của họ và áp lại op log của mình lên đó (bản ghi họ đã xoá
+# thì không sửa lại), sau PUT đọc lại lần nữa: thay đổi của mình bị ghi đè thì làm lại.
+# Vẫn không phải compare-and-set thật (PUT của process khác có thể rơi sau lần đọc kiểm tra)
+# → thiết kế cho một process ghi chính; nhiều process thì dùng reminders.store = "sqlite".
 
 PANTRY_HOST = os.environ.get("PANTRY_HOST", "getpantry.cloud")
 BIN_ID = os.environ.get("PANTRY_BIN_ID")  # must be set
+# PANTRY_URL (tùy chọn) ghi đè toàn bộ URL của basket, ví dụ trỏ tới server giả lập khi thử
+PANTRY_URL = os.environ.get("PANTRY_URL")
 TIMEOUT = 10
+FLUSH_DELAY = float(os.environ.get("PANTRY_FLUSH_SECONDS", "2"))
+FLUSH_MAX_DELAY = float(os.environ.get("PANTRY_FLUSH_MAX_SECONDS", "10"))
+PUSH_ATTEMPTS = 3  # số lần PUT lại khi thay đổi bị process khác ghi đè
+COLLECTIONS = ("reminders", "cycles")
+REV_KEY = "_rev"
+ROUND_TRIP_SECONDS = metrics.histogram("pantry_request_seconds", "Thời gian một lần gọi Pantry (giây)",
+                                       ("op", "result"))
 
 def _bin_url():
+    if PANTRY_URL:
+        return PANTRY_URL
     if not BIN_ID:
         raise RuntimeError("PANTRY_BIN_ID is not set in environment")
     return f"https://{PANTRY_HOST}/apiv1/pantry/{BIN_ID}"
@@ -12,61 +34,322 @@ def _bin_url():
 def _headers():
     return {"Content-Type": "application/json"}
 
-def _get_json():
-    req = urllib.request.Request(_bin_url(), headers=_headers(), method="GET")
-    with urllib.request.urlopen(req, timeout=TIMEOUT) as r:
+class _timed:
+    """Đo một lần gọi Pantry (kể cả lỗi/timeout) vào ROUND_TRIP_SECONDS."""
+
+    def __init__(self, op):
+        self.op = op
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        ROUND_TRIP_SECONDS.observe(time.perf_counter() - self.started, self.op, "error" if exc_type else "ok")
+
+def _get_json(url=None):
+    req = urllib.request.Request(url or _bin_url(), headers=_headers(), method="GET")
+    with _timed("get"), urllib.request.urlopen(req, timeout=TIMEOUT) as r:
         body = r.read().decode("utf-8")
         try:
             data = json.loads(body) if body else {}
         except json.JSONDecodeError:
             data = {}
-    data.setdefault("reminders", {})
-    data.setdefault("cycles", {})
+    for name in COLLECTIONS:
+        data.setdefault(name, {})
     return data
 
-def _put_json(data: dict):
+def _put_json(data: dict, url=None):
     payload = json.dumps(data).encode("utf-8")
-    req = urllib.request.Request(_bin_url(), headers=_headers(), data=payload, method="PUT")
-    with urllib.request.urlopen(req, timeout=TIMEOUT) as r:
+    req = urllib.request.Request(url or _bin_url(), headers=_headers(), data=payload, method="PUT")
+    with _timed("put"), urllib.request.urlopen(req, timeout=TIMEOUT) as r:
         _ = r.read()
     return True
 
+def _copy_doc(data: dict) -> dict:
+    # reminder/cycle là dict phẳng → copy 2 tầng đủ để bên gọi sửa thoải mái, nhanh hơn deepcopy
+    out = {name: {k: dict(v) for k, v in data.get(name, {}).items()} for name in COLLECTIONS}
+    out[REV_KEY] = data.get(REV_KEY, 0)
+    return out
+
+def _diff(old: dict, new: dict):
+    """Các op ("add"/"set"/"del", collection, key, value) biến `old` thành `new`.
+    "add" = tạo bản ghi mới, "set" = sửa bản ghi đã có."""
+    ops = []
+    for name in COLLECTIONS:
+        a, b = old.get(name, {}), new.get(name, {})
+        for k, v in b.items():
+            if k not in a:
+                ops.append(("add", name, k, dict(v)))
+            elif a[k] != v:
+                ops.append(("set", name, k, dict(v)))
+        for k in a.keys() - b.keys():
+            ops.append(("del", name, k, None))
+    return ops
+
+def _apply(data: dict, ops, rebase: bool = False):
+    """rebase=True: áp op log lên bản của process khác — "set" vào bản ghi họ đã xoá thì bỏ qua
+    (xoá thắng), không tạo lại."""
+    for op, name, key, value in ops:
+        coll = data.setdefault(name, {})
+        if op == "del":
+            coll.pop(key, None)
+        elif op == "add" or not rebase or key in coll:
+            coll[key] = dict(value)
+
+def _applied(remote: dict, ops) -> bool:
+    """Bản trên Pantry đã chứa mọi thay đổi của `ops` chưa (chỉ xét các key bị đụng tới)."""
+    touched = {(name, key) for _, name, key, _ in ops}
+    sub = {name: {} for name in COLLECTIONS}
+    for name, key in touched:
+        if key in remote.get(name, {}):
+            sub[name][key] = remote[name][key]
+    want = {name: dict(coll) for name, coll in sub.items()}
+    _apply(want, ops, rebase=True)
+    return want == sub
+
+class PantryStore:
+    def __init__(self, url=None, flush_delay=FLUSH_DELAY, max_delay=FLUSH_MAX_DELAY):
+        self.url = url
+        self.flush_delay = flush_delay
+        self.max_delay = max(max_delay, flush_delay)
+        self._data = None
+        self._rev = 0
+        self._ops = []
+        self._first_dirty = None
+        self._last_dirty = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._closed = False
+        self._thr = None
+        self.stats = {"gets": 0, "puts": 0, "flushes": 0, "conflicts": 0, "ops_flushed": 0, "errors": 0}
+
+    # --- đọc ---
+    def _ensure_loaded(self):
+        # gọi khi đang giữ self._lock
+        if self._data is None:
+            data = _get_json(self.url)
+            self.stats["gets"] += 1
+            self._rev = int(data.get(REV_KEY, 0) or 0)
+            self._data = _copy_doc(data)
+
+    def load_all(self) -> dict:
+        with self._lock:
+            self._ensure_loaded()
+            return _copy_doc(self._data)
+
+    def get(self, name: str, key: str):
+        """Bản copy của một bản ghi (None nếu không có) — không copy cả document như load_all."""
+        with self._lock:
+            self._ensure_loaded()
+            value = self._data[name].get(key)
+            return dict(value) if value is not None else None
+
+    def select(self, name: str, where=None):
+        """[(key, bản copy)] các bản ghi thoả `where(value)`; lọc dưới lock, chỉ copy bản khớp.
+
+        `where` nhận bản trong cache → chỉ được đọc, không sửa, không gọi lại PantryStore.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return [(k, dict(v)) for k, v in self._data[name].items() if where is None or where(v)]
+
+    # --- ghi ---
+    def _record(self, ops):
+        # gọi khi đang giữ self._lock
+        if not ops:
+            return
+        _apply(self._data, ops)
+        self._ops.extend(ops)
+        now = time.monotonic()
+        self._first_dirty = self._first_dirty or now
+        self._last_dirty = now
+        self._start_flusher()
+        self._wake.notify()
+
+    def update(self, changes) -> bool:
+        """changes(doc) sửa tại chỗ hoặc trả về doc mới; chỉ phần khác biệt được ghi."""
+        with self._lock:
+            self._ensure_loaded()
+            doc = _copy_doc(self._data)
+            new = changes(doc) if callable(changes) else doc
+            ops = _diff(self._data, new if new is not None else doc)
+            self._record(ops)
+            return bool(ops)
+
+    def set(self, name: str, key: str, value: dict):
+        with self._lock:
+            self._ensure_loaded()
+            old = self._data[name].get(key)
+            if old != value:
+                self._record([("add" if old is None else "set", name, key, dict(value))])
+
+    def delete(self, name: str, keys):
+        with self._lock:
+            self._ensure_loaded()
+            self._record([("del", name, k, None) for k in keys if k in self._data[name]])
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._ops)
+
+    # --- flush ---
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+
+    def _push(self, base_rev: int, doc: dict, ops):
+        """GET `_rev` (khác `base_rev` → áp lại `ops` lên bản mới) → PUT → GET kiểm tra.
+        Trả về bản đọc được sau PUT (đã chứa `ops`)."""
+        remote = _get_json(self.url)
+        self._count("gets")
+        for _ in range(PUSH_ATTEMPTS):
+            remote_rev = int(remote.get(REV_KEY, 0) or 0)
+            if remote_rev != base_rev:
+                # Có process khác đã ghi: lấy bản của họ, áp lại thay đổi của mình
+                self._count("conflicts")
+                doc = _copy_doc(remote)
+                _apply(doc, ops, rebase=True)
+            doc[REV_KEY] = remote_rev + 1
+            _put_json(doc, self.url)
+            self._count("puts")
+            remote = _get_json(self.url)
+            self._count("gets")
+            if _applied(remote, ops):
+                return remote
+            base_rev = None  # bị ghi đè ngay sau PUT → lần sau chắc chắn rebase
+        raise RuntimeError(f"thay đổi bị ghi đè {PUSH_ATTEMPTS} lần liên tiếp")
+
+    def flush(self) -> bool:
+        """Đẩy op log lên Pantry (GET kiểm tra `_rev` + PUT + GET kiểm tra). Không có gì thay đổi → không gọi mạng."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._ops:
+                    return True
+                ops, self._ops = self._ops, []
+                first_dirty, self._first_dirty, self._last_dirty = self._first_dirty, None, None
+                base_rev = self._rev
+                doc = _copy_doc(self._data)
+            try:
+                remote = self._push(base_rev, doc, ops)
+            except Exception:
+                with self._lock:
+                    self.stats["errors"] += 1
+                    # Giữ lại op log để lần sau thử tiếp
+                    self._ops = ops + self._ops
+                    self._first_dirty = first_dirty
+                    self._last_dirty = time.monotonic()
+                raise
+            with self._lock:
+                remote_rev = int(remote.get(REV_KEY, 0) or 0)
+                if remote_rev != base_rev + 1 or _diff(doc, remote):
+                    # Bản chính = bản trên Pantry (có thay đổi của process khác) + các op phát sinh trong lúc flush
+                    data = _copy_doc(remote)
+                    _apply(data, self._ops)
+                    self._data = data
+                self._rev = remote_rev
+                self.stats["flushes"] += 1
+                self.stats["ops_flushed"] += len(ops)
+            return True
+
+    def _start_flusher(self):
+        if self._thr is None or not self._thr.is_alive():
+            self._thr = threading.Thread(target=self._run, name="pantry-flush", daemon=True)
+            self._thr.start()
+
+    def _due_in(self):
+        # gọi khi đang giữ self._lock; None = không có gì để flush
+        if not self._ops:
+            return None
+        now = time.monotonic()
+        return max(0.0, min(self._last_dirty + self.flush_delay, self._first_dirty + self.max_delay) - now)
+
+    def _run(self):
+        backoff = 1.0
+        while True:
+            with self._lock:
+                while not self._closed:
+                    due = self._due_in()
+                    if due is not None and due <= 0:
+                        break
+                    self._wake.wait(due)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+                backoff = 1.0
+            except Exception as e:
+                print("[pantry] flush failed:", e)
+                with self._lock:
+                    self._wake.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wake.notify_all()
+        if self._thr:
+            self._thr.join(timeout=1.0)
+        self.flush()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store() -> PantryStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PantryStore()
+                # Thread flush là daemon → thoát process phải tự đẩy nốt op log còn trong cache
+                atexit.register(_close_at_exit)
+    return _store
+
 def load_all():
-    return _get_json()
+    return get_store().load_all()
+
+def get_record(name: str, key: str):
+    return get_store().get(name, key)
+
+def select(name: str, where=None):
+    return get_store().select(name, where)
 
 def save_all(data: dict):
-    return _put_json(data)
+    # Chỉ ghi phần khác biệt so với bản cache → tick không đổi gì thì không gọi mạng
+    get_store().update(lambda _: data)
+    return True
 
 def upsert_reminder(reminder: dict):
-    data = _get_json()
-    rid = reminder["id"]
-    data["reminders"][rid] = reminder
-    _put_json(data)
+    get_store().set("reminders", reminder["id"], reminder)
     return True
 
 def delete_reminder(reminder_id: str):
-    data = _get_json()
-    if reminder_id in data["reminders"]:
-        del data["reminders"][reminder_id]
-    keys_to_del = [k for k in data.get("cycles", {}).keys() if k.startswith(reminder_id + "@")]
-    for k in keys_to_del:
-        del data["cycles"][k]
-    _put_json(data)
+    def changer(data):
+        data["reminders"].pop(reminder_id, None)
+        for k in [k for k in data["cycles"] if k.startswith(reminder_id + "@")]:
+            del data["cycles"][k]
+    get_store().update(changer)
     return True
 
 def upsert_cycle(key: str, item: dict):
-    data = _get_json()
-    data["cycles"][key] = item
-    _put_json(data)
+    get_store().set("cycles", key, item)
 
 def delete_cycle(key: str):
-    data = _get_json()
-    if key in data.get("cycles", {}):
-        del data["cycles"][key]
-        _put_json(data)
+    get_store().delete("cycles", [key])
 
 def bulk_update(changes):
-    data = _get_json()
-    newdata = changes(data) if callable(changes) else data
-    _put_json(newdata)
+    get_store().update(changes)
     return True
+
+def flush():
+    return get_store().flush()
+
+def close():
+    if _store is not None:
+        _store.close()
+
+def _close_at_exit():
+    try:
+        close()
+    except Exception as e:
+        print("[pantry] flush at exit failed:", e)
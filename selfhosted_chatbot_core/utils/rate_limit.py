@@ -0,0 +1,58 @@
+# utils/rate_limit.py
+# Token bucket thread-safe: `rate` token/giây, tối đa `capacity` token (cho phép burst).
+
+import threading
+import time
+from typing import Optional
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+        self._ts = now
+
+    def try_acquire(self, n: float = 1.0) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= n:
+                self._tokens -= n
+                return True
+            return False
+
+    def reserve(self, n: float = 1.0, max_wait: Optional[float] = None) -> Optional[float]:
+        """Giữ chỗ `n` token, trả về số giây phải chờ trước khi dùng (0 nếu có ngay).
+
+        Nếu phải chờ lâu hơn `max_wait` thì không giữ chỗ và trả về None.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= n:
+                self._tokens -= n
+                return 0.0
+            wait = (n - self._tokens) / self.rate if self.rate > 0 else float("inf")
+            if max_wait is not None and wait > max_wait:
+                return None
+            # Token âm = nợ: các lượt sau xếp hàng phía sau lượt này
+            self._tokens -= n
+            return wait
+
+    def acquire(self, n: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Chờ tới khi đủ token (tối đa `timeout` giây)."""
+        wait = self.reserve(n, max_wait=timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def penalize(self, seconds: float):
+        """Ngừng cấp token trong `seconds` giây (ví dụ server trả 429 kèm retry_after)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
@@ -1,57 +1,368 @@
 # utils/requests_shim.py
-# "Giả lập" giao diện tối thiểu của requests.get/post bằng urllib (stdlib)
+# Client HTTP tối thiểu (stdlib http.client) mang giao diện của requests, dùng khi chưa cài requests:
+# - Session giữ kết nối (keep-alive) theo từng host:port, nhiều thread dùng chung được
+# - adapters.HTTPAdapter(pool_maxsize, max_retries) + adapters.Retry (backoff, status_forcelist, Retry-After)
+# - tự gửi Accept-Encoding và giải nén gzip/deflate
+# - exceptions.{RequestException, ConnectionError, HTTPError, Timeout, ConnectTimeout, ReadTimeout, RetryError}
+# Không hỗ trợ: stream, proxy, redirect, cookie, upload file.
 
-import urllib.request, urllib.parse, json, ssl
+import gzip
+import http.client
+import json as _json
+import select
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+import zlib
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Tuple
 
-class _Resp:
-    def __init__(self, data, code=200):
-        self._data = data
-        self.status_code = code
-        self.text = json.dumps(data, ensure_ascii=False)
+DEFAULT_HEADERS = {
+    "User-Agent": "chatbot-requests-shim",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept": "*/*",
+    "Connection": "keep-alive",
+}
 
-    def json(self):
-        return self._data
+# --- exceptions (cùng tên, cùng quan hệ kế thừa với requests.exceptions) ---
+class RequestException(IOError):
+    def __init__(self, *args, request=None, response=None):
+        super().__init__(*args)
+        self.request = request
+        self.response = response
 
-class _RequestsShim:
-    def __init__(self):
+class ConnectionError(RequestException):  # noqa: A001 — trùng tên requests.exceptions.ConnectionError
+    pass
+
+class HTTPError(RequestException):
+    pass
+
+class Timeout(RequestException):
+    pass
+
+class ConnectTimeout(ConnectionError, Timeout):
+    pass
+
+class ReadTimeout(Timeout):
+    pass
+
+class RetryError(RequestException):
+    pass
+
+class _NewConnectionError(ConnectionError):
+    """Không mở được kết nối (request chưa được gửi) → thử lại an toàn với mọi method."""
+
+class Response:
+    def __init__(self, status_code: int, headers, content: bytes, url: str, reason: str = "", elapsed: float = 0.0):
+        self.status_code = status_code
+        self.headers = headers  # http.client.HTTPMessage: get() không phân biệt hoa thường
+        self.content = content
+        self.url = url
+        self.reason = reason
+        self.elapsed = elapsed
+
+    @property
+    def encoding(self) -> str:
+        ctype = self.headers.get("Content-Type", "")
+        for part in ctype.split(";")[1:]:
+            key, _, value = part.strip().partition("=")
+            if key.lower() == "charset" and value:
+                return value.strip('"')
+        return "utf-8"
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors="replace")
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self, **kw) -> Any:
+        return _json.loads(self.content.decode(self.encoding), **kw)
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            kind = "Client" if self.status_code < 500 else "Server"
+            raise HTTPError(f"{self.status_code} {kind} Error: {self.reason} for url: {self.url}", response=self)
+
+    def close(self):
+        return None
+
+# --- retry / pool ---
+class Retry:
+    """Tập con của urllib3 Retry: `total` lần thử lại, chờ backoff_factor * 2^(n-1) giây giữa các lần.
+    Lỗi mở kết nối: thử lại với mọi method; lỗi đọc và mã trong status_forcelist: chỉ allowed_methods."""
+    DEFAULT_ALLOWED_METHODS = frozenset({"HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE"})
+    BACKOFF_MAX = 120.0
+
+    def __init__(self, total: int = 10, backoff_factor: float = 0.0, status_forcelist=None,
+                 allowed_methods=DEFAULT_ALLOWED_METHODS, raise_on_status: bool = True,
+                 respect_retry_after_header: bool = True):
+        self.total = int(total or 0)
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = frozenset(status_forcelist or ())
+        self.allowed_methods = frozenset(m.upper() for m in allowed_methods) if allowed_methods else None
+        self.raise_on_status = raise_on_status
+        self.respect_retry_after_header = respect_retry_after_header
+
+    def is_retry_method(self, method: str) -> bool:
+        return self.allowed_methods is None or method in self.allowed_methods
+
+    def backoff(self, n: int) -> float:
+        return min(self.BACKOFF_MAX, self.backoff_factor * (2 ** (n - 1))) if n > 0 else 0.0
+
+    def sleep_for(self, resp: Optional[Response], n: int) -> float:
+        if resp is not None and self.respect_retry_after_header and resp.status_code in (413, 429, 503):
+            value = resp.headers.get("Retry-After")
+            if value and value.strip().isdigit():
+                return min(self.BACKOFF_MAX, float(value))
+        return self.backoff(n)
+
+class _HostPool:
+    """Các kết nối rảnh tới một host:port, dùng lại theo LIFO (kết nối vừa dùng ít bị server đóng nhất)."""
+
+    def __init__(self, scheme: str, host: str, port: int, maxsize: int, ctx: ssl.SSLContext):
+        self.scheme, self.host, self.port = scheme, host, port
+        self.maxsize = max(1, maxsize)
+        self._ctx = ctx
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def get(self) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                if not _dropped(conn):
+                    return conn, True
+                conn.close()
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, context=self._ctx), False
+        return http.client.HTTPConnection(self.host, self.port), False
+
+    def put(self, conn: http.client.HTTPConnection):
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+def _dropped(conn: http.client.HTTPConnection) -> bool:
+    # Kết nối rảnh mà đọc được (EOF hoặc dữ liệu lạ) → server đã đóng phía nó
+    if conn.sock is None:
+        return True
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+def _decode(content: bytes, encoding: Optional[str]) -> bytes:
+    encoding = (encoding or "").lower()
+    if encoding == "gzip":
+        return gzip.decompress(content)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(content)
+        except zlib.error:
+            return zlib.decompress(content, -zlib.MAX_WBITS)  # deflate thô, không header zlib
+    return content
+
+class HTTPAdapter:
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10, max_retries=0, pool_block: bool = False):
+        self.max_retries = max_retries if isinstance(max_retries, Retry) else Retry(total=int(max_retries or 0))
+        self.pool_connections = max(1, pool_connections)
+        self.pool_maxsize = pool_maxsize
+        self._pools: "OrderedDict[tuple, _HostPool]" = OrderedDict()
+        self._lock = threading.Lock()
         self._ctx = ssl.create_default_context()
 
-    def get(self, url, params=None, headers=None, timeout=15):
-        if params:
-            url += "?" + urllib.parse.urlencode(params)
-        req = urllib.request.Request(url, headers=headers or {})
-        with urllib.request.urlopen(req, timeout=timeout, context=self._ctx) as r:
-            body = r.read().decode("utf-8")
+    def _pool(self, scheme: str, host: str, port: int) -> _HostPool:
+        key = (scheme, host, port)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = _HostPool(scheme, host, port, self.pool_maxsize, self._ctx)
+                if len(self._pools) > self.pool_connections:
+                    self._pools.popitem(last=False)[1].close()
+            else:
+                self._pools.move_to_end(key)
+            return pool
+
+    def send(self, method: str, url: str, body: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None,
+             timeout=None) -> Response:
+        """Một lần gửi (không retry theo Retry — việc đó của Session)."""
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https") or not parts.hostname:
+            raise RequestException(f"URL không hợp lệ: {url}")
+        port = parts.port or (443 if scheme == "https" else 80)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        pool = self._pool(scheme, parts.hostname, port)
+        started = time.monotonic()
+        for attempt in (0, 1):
+            conn, reused = pool.get()
+            if conn.sock is None:
+                conn.timeout = connect_timeout
+                try:
+                    conn.connect()
+                except socket.timeout as e:
+                    conn.close()
+                    raise ConnectTimeout(e)
+                except OSError as e:
+                    conn.close()
+                    raise _NewConnectionError(e)
+            conn.sock.settimeout(read_timeout)
             try:
-                data = json.loads(body)
-            except Exception:
-                data = {"ok": False, "raw": body}
-            return _Resp(data, r.getcode())
+                conn.request(method, target, body=body, headers=headers or {})
+                r = conn.getresponse()
+                content = r.read()
+            except socket.timeout as e:
+                conn.close()
+                raise ReadTimeout(e)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                conn.close()
+                if reused and attempt == 0:
+                    continue  # server vừa đóng kết nối rảnh → mở kết nối mới, gửi lại một lần
+                raise ConnectionError(e)
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise ConnectionError(e)
+            if r.will_close:
+                conn.close()
+            else:
+                pool.put(conn)
+            try:
+                content = _decode(content, r.headers.get("Content-Encoding"))
+            except (OSError, zlib.error, EOFError) as e:
+                raise ConnectionError(f"giải nén lỗi: {e}")
+            return Response(r.status, r.headers, content, url, r.reason, time.monotonic() - started)
+        raise ConnectionError("không gửi được request")  # không tới được đây
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), OrderedDict()
+        for pool in pools:
+            pool.close()
 
-    def post(self, url, data=None, json=None, headers=None, timeout=15):
+class Session:
+    def __init__(self):
+        self.headers: Dict[str, str] = dict(DEFAULT_HEADERS)
+        self.proxies: Dict[str, str] = {}  # giữ để tương thích, shim không dùng proxy
+        self.adapters: "OrderedDict[str, HTTPAdapter]" = OrderedDict()
+        self.mount("https://", HTTPAdapter())
+        self.mount("http://", HTTPAdapter())
+
+    def mount(self, prefix: str, adapter: HTTPAdapter):
+        self.adapters[prefix] = adapter
+        # prefix dài nhất khớp trước, như requests
+        for key in sorted(self.adapters, key=len, reverse=True):
+            self.adapters.move_to_end(key)
+
+    def get_adapter(self, url: str) -> HTTPAdapter:
+        lowered = url.lower()
+        for prefix, adapter in self.adapters.items():
+            if lowered.startswith(prefix.lower()):
+                return adapter
+        raise RequestException(f"không có adapter cho {url}")
+
+    def request(self, method: str, url: str, params=None, data=None, json=None, headers=None, timeout=None,
+                **_ignored) -> Response:
+        method = method.upper()
+        if params:
+            query = urllib.parse.urlencode(params, doseq=True)
+            url += ("&" if "?" in url else "?") + query
+        hdrs = dict(self.headers)
+        body = None
         if json is not None:
-            payload = json.dumps(json).encode("utf-8")
-            hdrs = {"Content-Type": "application/json"}
-        else:
-            if isinstance(data, dict):
-                payload = urllib.parse.urlencode(data).encode("utf-8")
-                hdrs = {"Content-Type": "application/x-www-form-urlencoded"}
-            elif isinstance(data, (bytes, bytearray)):
-                payload = data
-                hdrs = {}
-            else:
-                payload = (data or "").encode("utf-8")
-                hdrs = {"Content-Type": "application/x-www-form-urlencoded"}
+            body = _json.dumps(json, ensure_ascii=False).encode("utf-8")
+            hdrs["Content-Type"] = "application/json"
+        elif isinstance(data, dict):
+            body = urllib.parse.urlencode(data, doseq=True).encode("utf-8")
+            hdrs["Content-Type"] = "application/x-www-form-urlencoded"
+        elif isinstance(data, str):
+            body = data.encode("utf-8")
+        elif data is not None:
+            body = bytes(data)
+        if body is None and method in ("POST", "PUT", "PATCH"):
+            body = b""
         if headers:
             hdrs.update(headers)
-        req = urllib.request.Request(url, data=payload, headers=hdrs)
-        with urllib.request.urlopen(req, timeout=timeout, context=self._ctx) as r:
-            body = r.read().decode("utf-8")
+        adapter = self.get_adapter(url)
+        retry = adapter.max_retries
+        n = 0
+        while True:
             try:
-                data = json.loads(body)
-            except Exception:
-                data = {"ok": False, "raw": body}
-            return _Resp(data, r.getcode())
+                resp = adapter.send(method, url, body, hdrs, timeout)
+            except (ConnectionError, Timeout) as e:
+                safe = isinstance(e, (_NewConnectionError, ConnectTimeout)) or retry.is_retry_method(method)
+                if n >= retry.total or not safe:
+                    raise
+                n += 1
+                time.sleep(retry.backoff(n))
+                continue
+            if resp.status_code in retry.status_forcelist and retry.is_retry_method(method):
+                if n < retry.total:
+                    n += 1
+                    time.sleep(retry.sleep_for(resp, n))
+                    continue
+                if retry.raise_on_status:
+                    raise RetryError(f"hết {retry.total} lần thử lại, lần cuối {resp.status_code}", response=resp)
+            return resp
+
+    def get(self, url, params=None, **kw) -> Response:
+        return self.request("GET", url, params=params, **kw)
+
+    def post(self, url, data=None, json=None, **kw) -> Response:
+        return self.request("POST", url, data=data, json=json, **kw)
+
+    def close(self):
+        for adapter in self.adapters.values():
+            adapter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class _RequestsShim:
+    """Thay cho module requests: requests.get/post (dùng chung một Session giữ kết nối),
+    requests.Session, requests.exceptions.*, requests.adapters.{HTTPAdapter, Retry}."""
+    Session = Session
+    Response = Response
+    exceptions = SimpleNamespace(RequestException=RequestException, ConnectionError=ConnectionError,
+                                 HTTPError=HTTPError, Timeout=Timeout, ConnectTimeout=ConnectTimeout,
+                                 ReadTimeout=ReadTimeout, RetryError=RetryError)
+    adapters = SimpleNamespace(HTTPAdapter=HTTPAdapter, Retry=Retry)
+
+    def __init__(self):
+        self._session: Optional[Session] = None
+        self._lock = threading.Lock()
+
+    def _shared(self) -> Session:
+        with self._lock:
+            if self._session is None:
+                self._session = Session()
+            return self._session
+
+    def request(self, method, url, **kw) -> Response:
+        return self._shared().request(method, url, **kw)
+
+    def get(self, url, params=None, **kw) -> Response:
+        return self._shared().get(url, params=params, **kw)
+
+    def post(self, url, data=None, json=None, **kw) -> Response:
+        return self._shared().post(url, data=data, json=json, **kw)
 
 # export "requests" biến tương thích
 requests = _RequestsShim()
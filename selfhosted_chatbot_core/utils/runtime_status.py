@@ -0,0 +1,64 @@
+# utils/runtime_status.py
+# Bot và web UI là hai process riêng → bot định kỳ ghi số liệu vận hành (cache AI,
+# hàng đợi, ...) ra một file JSON nhỏ; dashboard đọc file đó qua config cache.
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+STATUS_PATH = os.path.join(BASE_DIR, "data", "runtime_status.json")
+
+class StatusPublisher:
+    def __init__(self, path: str = STATUS_PATH, interval: float = 5.0, logger=None):
+        self.path = path
+        self.interval = interval
+        self._log = logger
+        self._providers: Dict[str, Callable[[], Any]] = {}
+        self._stop = threading.Event()
+        self._thr = None
+
+    def register(self, name: str, provider: Callable[[], Any]):
+        self._providers[name] = provider
+
+    def snapshot(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"updated_at": time.strftime("%Y-%m-%d %H:%M:%S"), "pid": os.getpid()}
+        for name, provider in list(self._providers.items()):
+            try:
+                data[name] = provider()
+            except Exception as e:
+                data[name] = {"error": str(e)}
+        return data
+
+    def publish(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=1, default=str)
+        os.replace(tmp, self.path)
+
+    def start(self):
+        if self._thr and self._thr.is_alive():
+            return
+        self._stop.clear()
+        self._thr = threading.Thread(target=self._run, name="status-publisher", daemon=True)
+        self._thr.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.publish()
+            except Exception as e:
+                if self._log:
+                    self._log.debug("Không ghi được runtime status: %s", e)
+
+    def stop(self):
+        self._stop.set()
+        if self._thr:
+            self._thr.join(timeout=1.0)
+        try:
+            self.publish()
+        except Exception:
+            pass
@@ -0,0 +1,46 @@
+# utils/textnorm.py
+# Chuẩn hoá văn bản tiếng Việt: chữ thường, bỏ dấu (kể cả đ → d), gộp khoảng trắng.
+# Bảng dịch được dựng một lần lúc import → mỗi lần gọi chỉ là một lượt str.translate.
+
+import unicodedata
+from functools import lru_cache
+
+# Chuỗi ngắn (lời chào, "giá", keyword...) lặp lại rất nhiều → cache LRU có giới hạn
+CACHE_SIZE = 4096
+CACHE_MAX_LEN = 64
+
+def _build_table() -> dict:
+    table = {}
+    # Dấu kết hợp rời (input dạng NFD, ví dụ gõ từ macOS) → xoá
+    for cp in range(0x0300, 0x0370):
+        table[cp] = None
+    # Latin-1 Supplement, Latin Extended-A/B và Latin Extended Additional (chứa toàn bộ ạ..ỹ)
+    for lo, hi in ((0x00C0, 0x0250), (0x1E00, 0x1F00)):
+        for cp in range(lo, hi):
+            ch = chr(cp)
+            base = "".join(c for c in unicodedata.normalize("NFD", ch.lower())
+                           if unicodedata.category(c) != "Mn")
+            if base != ch:
+                table[cp] = base
+    # đ/Đ không có dạng phân rã nên NFD + bỏ Mn không xử lý được
+    table[ord("đ")] = "d"
+    table[ord("Đ")] = "d"
+    return table
+
+_TABLE = _build_table()
+
+def _fold(s: str) -> str:
+    return " ".join(s.lower().translate(_TABLE).split())
+
+_fold_cached = lru_cache(maxsize=CACHE_SIZE)(_fold)
+
+def normalize(s: str) -> str:
+    """Chữ thường, bỏ dấu tiếng Việt, gộp/cắt khoảng trắng: "  Chào   BẠN " → "chao ban"."""
+    if not s:
+        return ""
+    if len(s) <= CACHE_MAX_LEN:
+        return _fold_cached(s)
+    return _fold(s)
+
+def cache_info():
+    return _fold_cached.cache_info()
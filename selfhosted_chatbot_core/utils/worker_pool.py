@@ -0,0 +1,62 @@
+# utils/worker_pool.py
+# Pool N thread, mỗi thread một hàng đợi có giới hạn. Việc được chia shard theo key
+# (thread_id) → cùng một chat luôn vào cùng worker nên giữ đúng thứ tự trả lời,
+# còn các chat khác nhau chạy song song. Hàng đợi đầy → submit() chờ (backpressure).
+
+import queue
+import threading
+import zlib
+from typing import Any, Callable, List, Optional
+
+_STOP = object()
+
+class ShardedWorkerPool:
+    def __init__(self, workers: int, queue_size: int = 100, name: str = "worker", logger=None):
+        self.workers = max(1, int(workers))
+        self._log = logger
+        self._closed = False
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=max(1, int(queue_size))) for _ in range(self.workers)]
+        self._threads: List[threading.Thread] = []
+        for i, q in enumerate(self._queues):
+            t = threading.Thread(target=self._run, args=(q,), name=f"{name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _shard(self, key: str) -> int:
+        # crc32 thay vì hash(): ổn định giữa các lần chạy, không phụ thuộc PYTHONHASHSEED
+        return zlib.crc32(str(key).encode("utf-8")) % self.workers
+
+    def submit(self, key: str, fn: Callable[..., Any], *args, timeout: Optional[float] = None):
+        """Đưa việc vào shard của `key`. Chặn khi hàng đợi đầy; raise queue.Full nếu quá `timeout`."""
+        if self._closed:
+            raise RuntimeError("worker pool đã dừng")
+        self._queues[self._shard(key)].put((fn, args), timeout=timeout)
+
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def _run(self, q: queue.Queue):
+        while True:
+            item = q.get()
+            if item is _STOP:
+                return
+            fn, args = item
+            try:
+                fn(*args)
+            except Exception:
+                if self._log:
+                    self._log.exception("Lỗi trong worker")
+
+    def stop(self, drain: bool = True, timeout: Optional[float] = 30.0):
+        """Ngừng nhận việc; drain=True thì xử lý nốt việc đang chờ rồi mới dừng."""
+        self._closed = True
+        for q in self._queues:
+            if not drain:
+                try:
+                    while True:
+                        q.get_nowait()
+                except queue.Empty:
+                    pass
+            q.put(_STOP)
+        for t in self._threads:
+            t.join(timeout=timeout)
@@ -1,18 +1,40 @@
 import os
+import hmac
 import json
-from flask import Flask, request, render_template, redirect, url_for, session, flash, send_file
+import tempfile
+from flask import Flask, Response, request, render_template, redirect, url_for, session, flash, send_file, jsonify
 from functools import wraps
 
+from utils.config_cache import load_cached
+from utils.log_reader import LogIndex, follow, parse_line, tail_lines
+from utils.metrics import render_prometheus, summarize
+from utils.runtime_status import STATUS_PATH
+
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 CONFIG_DIR = os.path.join(BASE_DIR, "config")
+LOG_PATH = os.path.join(BASE_DIR, "logs", "bot.log")
+LOG_INDEX_PATH = os.path.join(BASE_DIR, "data", "log_index.sqlite")
 
 def load_json(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 def save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    # Ghi ra file tạm rồi os.replace: bot đang hot-reload không bao giờ đọc phải file ghi dở.
+    # Tên tạm riêng cho mỗi lần ghi (Flask chạy đa luồng: hai request lưu cùng lúc không ghi đè file tạm của nhau)
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        if os.path.exists(path):
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)  # mkstemp tạo 0600, giữ quyền của file cũ
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("WEB_SECRET_KEY", "devsecret")
@@ -27,7 +49,7 @@ def require_login(f):
 
 @app.route("/login", methods=["GET","POST"])
 def login():
-    settings = load_json(os.path.join(CONFIG_DIR, "settings.json"))
+    settings = load_cached(os.path.join(CONFIG_DIR, "settings.json"))
     if request.method == "POST":
         pwd = request.form.get("password")
         if pwd == settings.get("admin_password"):
@@ -44,16 +66,12 @@ def logout():
 @app.route("/")
 @require_login
 def dashboard():
-    # Basic status from logs
-    log_path = os.path.join(BASE_DIR, "logs", "bot.log")
-    last_lines = []
-    try:
-        with open(log_path, "r", encoding="utf-8") as f:
-            last_lines = f.readlines()[-50:]
-    except FileNotFoundError:
-        pass
-    settings = load_json(os.path.join(CONFIG_DIR, "settings.json"))
-    return render_template("dashboard.html", logs=last_lines, settings=settings)
+    # Basic status from logs (đọc ngược từ cuối file, không đọc cả log)
+    last_lines = tail_lines(LOG_PATH, 50)
+    settings = load_cached(os.path.join(CONFIG_DIR, "settings.json"))
+    status = load_cached(STATUS_PATH, default={})
+    timings = summarize(status.get("metrics") or {})
+    return render_template("dashboard.html", logs=last_lines, settings=settings, status=status, timings=timings)
 
 @app.route("/config/replies", methods=["GET","POST"])
 @require_login
@@ -100,10 +118,74 @@ def config_credentials():
     content = json.dumps(load_json(path), ensure_ascii=False, indent=2)
     return render_template("config_editor.html", title="credentials.json", content=content, filename="credentials.json")
 
+_log_index = None
+
+def get_log_index() -> LogIndex:
+    global _log_index
+    if _log_index is None:
+        _log_index = LogIndex(LOG_PATH, LOG_INDEX_PATH)
+    return _log_index
+
+@app.route("/logs/stream")
+@require_login
+def logs_stream():
+    """Server-Sent Events: mỗi dòng log mới là một event (id = offset trong file).
+    Trình duyệt tự kết nối lại với Last-Event-ID → không mất dòng; ?chat_id=... chỉ gửi dòng của chat đó."""
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("from")
+    offset = int(last_id) if last_id and last_id.isdigit() else None
+    chat_id = request.args.get("chat_id") or None
+
+    def events():
+        yield "retry: 2000\n\n"
+        current = None  # chat_id của dòng có timestamp gần nhất (để giữ traceback đi kèm)
+        for pos, line in follow(LOG_PATH, offset):
+            if line is None:
+                yield ": ping\n\n"
+                continue
+            line = line.rstrip("\r")
+            if chat_id:
+                ts, chat = parse_line(line)
+                if ts is not None:
+                    current = chat
+                if current != chat_id:
+                    continue
+            yield f"id: {pos}\ndata: {line}\n\n"
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/logs/search")
+@require_login
+def logs_search():
+    """?chat_id=&since=&until=&q=&limit=&after= — since/until dạng "YYYY-mm-dd[ HH[:MM[:SS]]]"."""
+    args = request.args
+    try:
+        limit = max(1, min(1000, int(args.get("limit", 200))))
+        after = int(args.get("after", 0))
+    except ValueError:
+        return jsonify({"error": "limit/after phải là số"}), 400
+    result = get_log_index().search(chat_id=args.get("chat_id") or None, since=args.get("since") or None,
+                                    until=args.get("until") or None, q=args.get("q") or None,
+                                    limit=limit, after=after)
+    return jsonify(result)
+
+@app.route("/metrics")
+def metrics():
+    """Số liệu bot dạng text Prometheus (từ data/runtime_status.json → trễ tối đa status_interval_seconds).
+    Prometheus không đăng nhập được → nhận thêm header "Authorization: Bearer <metrics_token>" (settings.json)."""
+    if not session.get("admin"):
+        token = load_cached(os.path.join(CONFIG_DIR, "settings.json")).get("metrics_token") or ""
+        auth = request.headers.get("Authorization", "")
+        if not token or not hmac.compare_digest(auth.encode(), f"Bearer {token}".encode()):
+            return "Unauthorized", 401
+    status = load_cached(STATUS_PATH, default={})
+    return Response(render_prometheus(status.get("metrics") or {}),
+                    content_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.route("/download/log")
 @require_login
 def download_log():
-    path = os.path.join(BASE_DIR, "logs", "bot.log")
+    path = LOG_PATH
     if not os.path.exists(path):
         return "No log yet", 404
     return send_file(path, as_attachment=True)